@@ -0,0 +1,187 @@
+"""Offline benchmarks for the config, table construction and mock query paths.
+
+Generates a YAML config and items of the requested size, so nothing talks to
+DynamoDB. Reports ops/sec (best of --repeat runs) and, on Python 3, the peak
+memory allocated while running each benchmark.
+
+    python benchmarks/run.py --tables 300 --items 20000
+    python benchmarks/run.py --save-baseline benchmarks/baseline.json
+    python benchmarks/run.py --baseline benchmarks/baseline.json  # exits 1 on regressions
+
+Baselines are machine specific: save one on the CI machine that compares against it.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+import mock
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cc_dynamodb  # noqa
+from cc_dynamodb.mocks import mock_query_2, TableWithQuery2  # noqa
+
+
+TABLE_NAME = 'table_0'
+
+
+def generate_config(tables, indexes, columns):
+    """A config with `tables` tables, each with `indexes` GSIs and `columns` columns."""
+    config = dict(schemas={}, global_indexes={}, indexes={}, columns={},
+                  default_throughput=dict(read=10, write=10))
+    for table_number in range(tables):
+        table_name = 'table_%s' % table_number
+        config['schemas'][table_name] = [
+            dict(type='HashKey', name='id', data_type='NUMBER'),
+            dict(type='RangeKey', name='time', data_type='NUMBER'),
+        ]
+        config['global_indexes'][table_name] = [
+            dict(name='Index%s' % index_number, type='GlobalAllIndex',
+                 throughput=dict(read=5, write=5),
+                 parts=[dict(type='HashKey', name='group_%s' % index_number, data_type='NUMBER'),
+                        dict(type='RangeKey', name='time', data_type='NUMBER')])
+            for index_number in range(indexes)
+        ]
+        config['indexes'][table_name] = [
+            dict(name='LocalIndex', type='AllIndex',
+                 parts=[dict(type='HashKey', name='id', data_type='NUMBER'),
+                        dict(type='RangeKey', name='column_0', data_type='NUMBER')]),
+        ]
+        config['columns'][table_name] = dict(('column_%s' % column_number, 'NUMBER')
+                                             for column_number in range(columns))
+    return config
+
+
+def generate_raw_items(items, indexes, groups=20):
+    """Wire format items for TABLE_NAME, spread over `groups` values of each index hash key."""
+    raw_items = []
+    for item_number in range(items):
+        raw_item = {'id': {'N': str(item_number)}, 'time': {'N': str(items - item_number)},
+                    'column_0': {'N': str(item_number % 7)}}
+        for index_number in range(indexes):
+            raw_item['group_%s' % index_number] = {'N': str(item_number % groups)}
+        raw_items.append(raw_item)
+    return raw_items
+
+
+def measure(func, number, repeat):
+    """Return (best ops/sec, peak KiB allocated or None)."""
+    best = min(timeit.repeat(func, number=number, repeat=repeat))
+    peak_kib = None
+    if tracemalloc is not None:
+        tracemalloc.start()
+        for _ in range(number):
+            func()
+        peak_kib = tracemalloc.get_traced_memory()[1] / 1024.0
+        tracemalloc.stop()
+    return number / best, peak_kib
+
+
+def load_config(config_path, config_cache=None):
+    cc_dynamodb.set_config(table_config=config_path, namespace='bench_', config_cache=config_cache,
+                           aws_access_key_id='<KEY>', aws_secret_access_key='<SECRET>')
+
+
+def benchmarks(args, config_path):
+    cache_path = config_path + '.cache'
+    connection = mock.Mock()
+    connection.scan.return_value = {'Items': generate_raw_items(args.items, args.indexes)}
+
+    def query_table():
+        return TableWithQuery2(cc_dynamodb.get_table_name(TABLE_NAME), connection=connection,
+                               **cc_dynamodb._get_table_metadata(TABLE_NAME))
+
+    def mock_query():
+        return list(query_table().query_2(group_0__eq=3, time__gt=args.items // 2, index='Index0'))
+
+    def mock_query_filtered():
+        return list(query_table().query_2(group_0__eq=3, time__between=(1, args.items // 2), index='Index0',
+                                          query_filter={'column_0__in': [1, 2, 3]}, max_page_size=100))
+
+    def mock_query_count():
+        return query_table().query_count(group_0__eq=3, index='Index0')
+
+    return [
+        ('get_config', cc_dynamodb.get_config, 10000),
+        ('get_table_name', lambda: cc_dynamodb.get_table_name(TABLE_NAME), 10000),
+        ('get_table_index', lambda: cc_dynamodb.get_table_index(TABLE_NAME, 'Index0'), 10000),
+        ('get_table_columns', lambda: cc_dynamodb.get_table_columns(TABLE_NAME), 2000),
+        ('_get_table_metadata', lambda: cc_dynamodb._get_table_metadata(TABLE_NAME), 2000),
+        ('get_table', lambda: cc_dynamodb.get_table(TABLE_NAME, connection=connection), 2000),
+        ('mock_query_2_with_index', mock_query, 200),
+        ('mock_query_2_with_filter', mock_query_filtered, 200),
+        ('mock_query_count_with_index', mock_query_count, 200),
+        # Last, since they drop everything derived from the config.
+        ('set_config', lambda: load_config(config_path), 5),
+        ('set_config_cached', lambda: load_config(config_path, cache_path), 5),
+    ]
+
+
+def compare(results, baseline, tolerance):
+    """Return the names of benchmarks more than `tolerance` slower than the baseline."""
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        expected = baseline[name]['ops_per_sec']
+        if result['ops_per_sec'] < expected * (1 - tolerance):
+            print('REGRESSION %s: %.0f ops/sec, baseline %.0f' % (name, result['ops_per_sec'], expected))
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tables', type=int, default=200)
+    parser.add_argument('--indexes', type=int, default=3)
+    parser.add_argument('--columns', type=int, default=20)
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', help='JSON file to compare against, exits 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown compared to the baseline (default 0.25, i.e. 25%%)')
+    parser.add_argument('--save-baseline', help='write the results to this JSON file')
+    args = parser.parse_args(argv)
+
+    config_dir = tempfile.mkdtemp()
+    try:
+        config_path = os.path.join(config_dir, 'dynamodb.yml')
+        with open(config_path, 'w') as config_file:
+            yaml.safe_dump(generate_config(args.tables, args.indexes, args.columns), config_file)
+        load_config(config_path)
+
+        results = {}
+        with mock_query_2():
+            for name, func, number in benchmarks(args, config_path):
+                ops_per_sec, peak_kib = measure(func, number, args.repeat)
+                results[name] = dict(ops_per_sec=ops_per_sec, peak_kib=peak_kib)
+                print('%-30s %12.0f ops/sec %12s KiB peak' % (
+                    name, ops_per_sec, '-' if peak_kib is None else '%.1f' % peak_kib))
+    finally:
+        shutil.rmtree(config_dir)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            if compare(results, json.load(baseline_file), args.tolerance):
+                return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,34 +1,102 @@
-import copy
+import importlib
 import os
+import sys
+import threading
 import time
+from types import ModuleType
 
-from boto import dynamodb2
-from boto.dynamodb2 import fields  # AllIndex, GlobalAllIndex, HashKey, RangeKey
-from boto.dynamodb2 import table
-from boto.dynamodb2 import types
-from boto.exception import JSONResponseError
-from bunch import Bunch
-import yaml
-
+from . import connections, metrics, throttle
+from .config import AttributeDict, compile_config, file_signature, load_yaml, ReadOnlyConfigError, thaw  # noqa
 from .log import create_logger
 
 
 logger = create_logger()
 UPDATE_INDEX_RETRIES = 60
+UPDATE_TABLE_TIMEOUT = 60 * 60  # seconds
+# Adaptive polling of the table status, in seconds.
+POLL_MIN_DELAY = 0.1
+POLL_MAX_DELAY = 10
 
 # Cache to avoid parsing YAML file repeatedly.
 _cached_config = None
+# file_signature() of the YAML file when it was loaded, see reload_config().
+_config_signature = None
+_reload_lock = threading.Lock()
+
+# boto is only imported on first use, so `import cc_dynamodb` stays cheap for
+# short-lived processes. These names are still available as module attributes.
+_LAZY_MODULES = {
+    'dynamodb2': ('boto.dynamodb2', None),
+    'fields': ('boto.dynamodb2.fields', None),  # AllIndex, GlobalAllIndex, HashKey, RangeKey
+    'table': ('boto.dynamodb2.table', None),
+    'types': ('boto.dynamodb2.types', None),
+    'JSONResponseError': ('boto.exception', 'JSONResponseError'),
+}
+
+
+class _LazyModule(ModuleType):
+    """Stands in for this module in sys.modules and imports _LAZY_MODULES on first access.
+
+    Every other attribute is read from and written to the real module, so
+    mock.patch('cc_dynamodb.get_config') still patches what the functions see.
+    (A module level __getattr__ would need Python 3.7.)
+    """
+
+    def __init__(self, module):
+        super(_LazyModule, self).__init__(module.__name__, module.__doc__)
+        self.__dict__['_module'] = module
+
+    def __getattr__(self, name):
+        module = self.__dict__['_module']
+        try:
+            return getattr(module, name)
+        except AttributeError:
+            pass
+        try:
+            module_name, attribute = _LAZY_MODULES[name]
+        except KeyError:
+            raise AttributeError("module 'cc_dynamodb' has no attribute %r" % name)
+        lazy_module = importlib.import_module(module_name)
+        return getattr(lazy_module, attribute) if attribute else lazy_module
+
+    def __setattr__(self, name, value):
+        setattr(self.__dict__['_module'], name, value)
+
+    def __delattr__(self, name):
+        delattr(self.__dict__['_module'], name)
+
+    def __dir__(self):
+        return sorted(set(dir(self.__dict__['_module'])) | set(_LAZY_MODULES))
 
 
 def set_config(table_config, namespace=None, aws_access_key_id=False, aws_secret_access_key=False,
-               host=None, port=None, is_secure=None):
-    global _cached_config
+               host=None, port=None, is_secure=None, config_cache=None):
+    """Load the YAML table config and connection settings, see the README.
+
+    :param config_cache: optional path of a cache of the parsed YAML, reused
+        while the YAML file is unchanged (also CC_DYNAMODB_CONFIG_CACHE)
+    """
+    global _cached_config, _config_signature
+
+    signature = file_signature(table_config)
+    # Compiled once into a read-only snapshot, so get_config() never needs to copy it.
+    _cached_config = build_config(table_config, namespace=namespace, aws_access_key_id=aws_access_key_id,
+                                  aws_secret_access_key=aws_secret_access_key, host=host, port=port,
+                                  is_secure=is_secure, config_cache=config_cache)
+    _config_signature = signature
+    logger.info('cc_dynamodb.set_config', extra=dict(status='config loaded'))
+
 
-    with open(table_config) as config_file:
-        yaml_config = yaml.load(config_file)
+def build_config(table_config, namespace=None, aws_access_key_id=False, aws_secret_access_key=False,
+                 host=None, port=None, is_secure=None, config_cache=None):
+    """Load and validate a config like set_config(), and return it without making it the global one."""
+    config_cache = config_cache or os.environ.get('CC_DYNAMODB_CONFIG_CACHE')
+    yaml_config = load_yaml(table_config, config_cache)
 
-    _cached_config = Bunch({
+    config = AttributeDict({
         'yaml': yaml_config,
+        'table_config': table_config,
+        'config_cache': config_cache,
         'namespace': namespace or os.environ.get('CC_DYNAMODB_NAMESPACE'),
         'aws_access_key_id': aws_access_key_id if aws_access_key_id is not False else
                              os.environ.get('CC_DYNAMODB_ACCESS_KEY_ID', False),
@@ -39,37 +107,67 @@ def set_config(table_config, namespace=None, aws_access_key_id=False, aws_secret
         'is_secure': is_secure or os.environ.get('CC_DYNAMODB_IS_SECURE'),
     })
 
-    if not _cached_config.namespace:
+    if not config.namespace:
         msg = 'Missing namespace kwarg OR environment variable CC_DYNAMODB_NAMESPACE'
         logger.error('ConfigurationError: ' + msg)
         raise ConfigurationError(msg)
-    if _cached_config.aws_access_key_id is False:
+    if config.aws_access_key_id is False:
         msg = 'Missing aws_access_key_id kwarg OR environment variable CC_DYNAMODB_ACCESS_KEY_ID'
         logger.error('ConfigurationError: ' + msg)
         raise ConfigurationError(msg)
-    if _cached_config.aws_secret_access_key is False:
+    if config.aws_secret_access_key is False:
         msg = 'Missing aws_secret_access_key kwarg OR environment variable CC_DYNAMODB_SECRET_ACCESS_KEY'
         logger.error('ConfigurationError: ' + msg)
         raise ConfigurationError(msg)
-    if _cached_config.port:
+    if config.port:
         try:
-            _cached_config.port = int(_cached_config.port)
+            config.port = int(config.port)
         except ValueError:
             msg = ('Integer value expected for port '
-                   'OR environment variable CC_DYNAMODB_PORT. Got %s' % _cached_config.port)
+                   'OR environment variable CC_DYNAMODB_PORT. Got %s' % config.port)
             logger.error('ConfigurationError: ' + msg)
             raise ConfigurationError(msg)
 
-    logger.info('cc_dynamodb.set_config', extra=dict(status='config loaded'))
+    return compile_config(config)
 
 
-def get_config(**kwargs):
-    global _cached_config
+def reload_config():
+    """Reload the YAML file passed to set_config(), if it changed since it was loaded.
+
+    The other settings (namespace, credentials...) are kept. The new config
+    replaces the old one in a single assignment, so a caller sees one or the
+    other, never a mix. Derived data (table metadata, item caches, rate
+    limiters) is kept for the tables whose configuration did not change.
+    See cc_dynamodb.watcher to reload periodically.
+
+    :return: sorted names of the added, changed and removed tables,
+        or None if the file did not change
+    """
+    global _cached_config, _config_signature
+
+    with _reload_lock:
+        previous = get_config()
+        signature = file_signature(previous.table_config)
+        if signature == _config_signature:
+            return None
+
+        config = dict(previous)
+        config['yaml'] = load_yaml(previous.table_config, previous.config_cache)
+        compiled = compile_config(config)
+        changed = sorted(compiled.reuse_tables(previous))
 
+        _cached_config = compiled
+        _config_signature = signature
+    logger.info('cc_dynamodb.reload_config', extra=dict(status='config reloaded', changed_tables=changed))
+    return changed
+
+
+def get_config(**kwargs):
+    """Returns the cached, read-only config. Use config.toDict() for a mutable copy."""
     if not _cached_config:
         set_config(**kwargs)
 
-    return Bunch(copy.deepcopy(_cached_config.toDict()))
+    return _cached_config
 
 
 class ConfigurationError(Exception):
@@ -77,6 +175,7 @@ class ConfigurationError(Exception):
 
 
 def _build_key(key_details):
+    from boto.dynamodb2 import fields, types
     key_details = key_details.copy()
     key_type = getattr(fields, key_details.pop('type'))
     key_details['data_type'] = getattr(types, key_details['data_type'])
@@ -89,6 +188,7 @@ def _build_keys(keys_config):
 
 
 def _build_secondary_index(index_details, is_global):
+    from boto.dynamodb2 import fields
     index_details = index_details.copy()
     index_type = getattr(fields, index_details.pop('type'))
 
@@ -109,29 +209,34 @@ def _build_secondary_indexes(indexes_config, is_global):
             for index_details in indexes_config]
 
 
-def _get_table_metadata(table_name):
-    config = get_config().yaml
-
+def _get_table_config(table_name):
+    config = get_config()
     try:
-        keys_config = config['schemas'][table_name]
+        return config.tables[table_name]
     except KeyError:
         logger.exception('cc_dynamodb.UnknownTable', extra=dict(table_name=table_name,
-                                                                config=config,
+                                                                config=config.yaml,
                                                                 DTM_EVENT='cc_dynamodb.UnknownTable'))
         raise UnknownTableException('Unknown table: %s' % table_name)
 
-    schema = _build_keys(keys_config)
-
-    global_indexes_config = config.get('global_indexes', {}).get(table_name, [])
-    indexes_config = config.get('indexes', {}).get(table_name, [])
 
+def _build_table_metadata(table_config):
     return dict(
-        schema=schema,
-        global_indexes=_build_secondary_indexes(global_indexes_config, is_global=True),
-        indexes=_build_secondary_indexes(indexes_config, is_global=False),
+        schema=_build_keys(table_config.schema),
+        global_indexes=_build_secondary_indexes(table_config.global_indexes, is_global=True),
+        indexes=_build_secondary_indexes(table_config.indexes, is_global=False),
     )
 
 
+def _get_table_metadata(table_name):
+    """Boto keys and indexes for a table, built once per config.
+
+    The key and index objects are shared, only the lists are new on each call.
+    """
+    metadata = _get_table_config(table_name).memoize('metadata', _build_table_metadata)
+    return dict((key, list(value)) for key, value in metadata.items())
+
+
 def get_table_name(table_name):
     '''Prefixes the table name for the different environments/settings.'''
     return get_config().namespace + table_name
@@ -145,20 +250,24 @@ def get_reverse_table_name(table_name):
 
 def get_table_index(table_name, index_name):
     """Given a table name and an index name, return the index."""
-    config = get_config()
-    all_indexes = (config.yaml.get('indexes', {}).items() +
-                   config.yaml.get('global_indexes', {}).items())
-    for config_table_name, table_indexes in all_indexes:
-        if config_table_name == table_name:
-            for index in table_indexes:
-                if index['name'] == index_name:
-                    return index
+    table_config = get_config().tables.get(table_name)
+    if table_config is not None:
+        return table_config.indexes_by_name.get(index_name)
 
 
-def get_connection():
-    """Returns a DynamoDBConnection even if credentials are invalid."""
-    config = get_config()
+def get_table_index_keys(table_name, index_name):
+    """Given a table name and an index name, return (hash key names, range key names)."""
+    table_config = get_config().tables.get(table_name)
+    if table_config is not None:
+        return table_config.index_keys.get(index_name)
 
+
+def _create_connection(config, region, throttle_config=None):
+    """A new instrumented connection. throttle_config: see throttle.instrument()."""
+    return throttle.instrument(metrics.instrument(_connect(config, region)), throttle_config)
+
+
+def _connect(config, region):
     if config.host:
         from boto.dynamodb2.layer1 import DynamoDBConnection
         return DynamoDBConnection(
@@ -168,25 +277,43 @@ def get_connection():
             port=config.port,                           # DynamoDB Local port (8000 is the default)
             is_secure=config.is_secure or False)        # For DynamoDB Local, disable secure connections
 
+    from boto import dynamodb2
     return dynamodb2.connect_to_region(
-        os.environ.get('CC_AWS_REGION', 'us-west-2'),
+        region,
         aws_access_key_id=config.aws_access_key_id,
         aws_secret_access_key=config.aws_secret_access_key,
     )
 
 
+def get_connection():
+    """Returns a DynamoDBConnection even if credentials are invalid.
+
+    Connections are pooled per thread, see cc_dynamodb.connections,
+    report each request to the cc_dynamodb.metrics sinks and
+    are rate limited when cc_dynamodb.throttle is enabled.
+    """
+    return _get_connection(get_config(), os.environ.get('CC_AWS_REGION', 'us-west-2'), connections.registry)
+
+
+def _get_connection(config, region, registry, throttle_config=None):
+    key = (region, config.host, config.port, config.is_secure,
+           config.aws_access_key_id, config.aws_secret_access_key)
+    return registry.get(key, lambda: _create_connection(config, region, throttle_config))
+
+
 def get_table_columns(table_name):
     """Return known columns for a table and their data type."""
     # TODO: see if table.describe() can return what dynamodb knows instead.
-    config = get_config().yaml
-    try:
-        return dict(
-            (column_name, getattr(types, column_type))
-                for column_name, column_type in config['columns'][table_name].items())
-    except KeyError:
-        logger.exception('UnknownTable: %s' % table_name, extra=dict(config=config,
-                                                                     DTM_EVENT='cc_dynamodb.UnknownTable'))
+    from boto.dynamodb2 import types
+    config = get_config()
+    table_config = config.tables.get(table_name)
+    if table_config is None or table_config.columns is None:
+        logger.error('UnknownTable: %s' % table_name, extra=dict(config=config.yaml,
+                                                                 DTM_EVENT='cc_dynamodb.UnknownTable'))
         raise UnknownTableException('Unknown table: %s' % table_name)
+    return dict(
+        (column_name, getattr(types, column_type))
+            for column_name, column_type in table_config.columns.items())
 
 
 def get_table(table_name, connection=None):
@@ -198,6 +325,7 @@ def get_table(table_name, connection=None):
     This function avoids additional lookups when using a table.
     The columns included are only the optional columns you may find in some of the items.
     '''
+    from boto.dynamodb2 import table
     return table.Table(
         get_table_name(table_name),
         connection=connection or get_connection(),
@@ -221,7 +349,8 @@ def _get_table_init_data(table_name, connection, throughput):
     init_data = dict(
         table_name=get_table_name(table_name),
         connection=connection or get_connection(),
-        throughput=_get_or_default_throughput(throughput),
+        # A mutable copy: boto's describe() writes the upstream throughput into it.
+        throughput=thaw(_get_or_default_throughput(throughput)),
     )
     init_data.update(_get_table_metadata(table_name))
     return init_data
@@ -229,6 +358,8 @@ def _get_table_init_data(table_name, connection, throughput):
 
 def create_table(table_name, connection=None, throughput=False):
     """Create table. Throws an error if table already exists."""
+    from boto.dynamodb2 import table
+    from boto.exception import JSONResponseError
     try:
         db_table = table.Table.create(**_get_table_init_data(table_name, connection=connection, throughput=throughput))
         logger.info('cc_dynamodb.create_table: %s' % table_name, extra=dict(status='created table'))
@@ -264,7 +395,83 @@ def _validate_schema(schema, table_metadata):
         raise UpdateTableException(msg)
 
 
-def update_table(table_name, connection=None, throughput=False):
+def _diff_global_indexes(global_indexes, table_metadata):
+    """Compare local GSIs (boto index objects) with the upstream describe() result.
+
+    :return: (indexes to create, {index name: throughput} to update, index names to delete)
+    """
+    local_global_indexes_by_name = dict((index.name, index) for index in global_indexes)
+    upstream_global_indexes_by_name = dict((index['IndexName'], index)
+                                           for index in table_metadata['Table'].get('GlobalSecondaryIndexes', []))
+
+    create_indexes = []
+    throughput_updates = {}
+    for index_name, index in local_global_indexes_by_name.items():
+        if index_name not in upstream_global_indexes_by_name:
+            create_indexes.append(index)
+            continue
+        upstream_throughput = upstream_global_indexes_by_name[index_name]['ProvisionedThroughput']
+        upstream_throughput = {
+            'write': upstream_throughput['WriteCapacityUnits'],
+            'read': upstream_throughput['ReadCapacityUnits'],
+        }
+        if upstream_throughput != index.throughput:
+            throughput_updates[index_name] = index.throughput
+
+    delete_index_names = [index_name for index_name in upstream_global_indexes_by_name
+                          if index_name not in local_global_indexes_by_name]
+    return create_indexes, throughput_updates, delete_index_names
+
+
+def _is_active(table_metadata):
+    """True if the table and all its global secondary indexes are ACTIVE."""
+    return (table_metadata['Table'].get('TableStatus', 'ACTIVE') == 'ACTIVE' and
+            all(index.get('IndexStatus', 'ACTIVE') == 'ACTIVE'
+                for index in table_metadata['Table'].get('GlobalSecondaryIndexes', [])))
+
+
+def wait_until_active(db_table, timeout=UPDATE_TABLE_TIMEOUT):
+    """Poll describe() until the table and its indexes are ACTIVE.
+
+    Starts polling quickly and backs off up to POLL_MAX_DELAY seconds between calls.
+    Raises UpdateTableException after timeout seconds.
+    """
+    delay = POLL_MIN_DELAY
+    deadline = time.time() + timeout
+    while True:
+        table_metadata = db_table.describe()
+        if _is_active(table_metadata):
+            return table_metadata
+        if time.time() + delay > deadline:
+            msg = 'Timed out waiting for %s to become ACTIVE' % db_table.table_name
+            logger.warn(msg)
+            raise UpdateTableException(msg)
+        time.sleep(delay)
+        delay = min(delay * 2, POLL_MAX_DELAY)
+
+
+def _update_index_when_active(db_table, update, done_marker, timeout):
+    """Run update() once the table is ACTIVE, retrying while DynamoDB rejects it as busy.
+
+    Only one index can be created or deleted at a time, so each attempt first waits
+    for the previous index operation to finish. Returns when the update was accepted
+    or its error body contains done_marker.
+    """
+    from boto.exception import JSONResponseError
+    for attempt in range(UPDATE_INDEX_RETRIES + 1):
+        wait_until_active(db_table, timeout=timeout)
+        try:
+            update()
+            return
+        except JSONResponseError as e:
+            if done_marker in str(e.body):
+                return
+            if attempt == UPDATE_INDEX_RETRIES:
+                raise
+            time.sleep(min(POLL_MIN_DELAY * 2 ** attempt, POLL_MAX_DELAY))
+
+
+def update_table(table_name, connection=None, throughput=False, timeout=UPDATE_TABLE_TIMEOUT):
     """
     Update existing table.
 
@@ -274,65 +481,47 @@ def update_table(table_name, connection=None, throughput=False):
     :param table_name: unprefixed table name
     :param connection: optional dynamodb connection, to avoid creating one
     :param throughput: a dict, e.g. {'read': 10, 'write': 10}
+    :param timeout: seconds to wait for the table to be ACTIVE before each index creation/deletion
     :return: the updated boto Table
     """
+    from boto.dynamodb2 import table
+    from boto.exception import JSONResponseError
     db_table = table.Table(**_get_table_init_data(table_name, connection=connection, throughput=throughput))
-    local_global_indexes_by_name = dict((index.name, index) for index in db_table.global_indexes)
+    # describe() fills in upstream indexes when none are configured, so keep the local ones first.
+    local_global_indexes = list(db_table.global_indexes)
     try:
         table_metadata = db_table.describe()
     except JSONResponseError as e:
         if e.status == 400 and e.error_code == 'ResourceNotFoundException':
             raise UnknownTableException('Unknown table: %s' % table_name)
+        raise
 
     _validate_schema(schema=db_table.schema, table_metadata=table_metadata)
 
-    # Update existing primary index throughput
-    db_table.update(throughput=throughput)
+    create_indexes, throughput_updates, delete_index_names = _diff_global_indexes(
+        local_global_indexes, table_metadata)
 
-    upstream_global_indexes_by_name = dict((index['IndexName'], index)
-                                           for index in table_metadata['Table'].get('GlobalSecondaryIndexes', []))
-    for index_name, index in local_global_indexes_by_name.items():
-        if index_name not in upstream_global_indexes_by_name:
-            logger.info('Creating GSI %s for %s' % (index_name, table_name))
-            for i in range(UPDATE_INDEX_RETRIES + 1):
-                try:
-                    db_table.create_global_secondary_index(index)
-                except JSONResponseError as e:
-                    if 'already exists' in str(e.body):
-                        break
-
-                    if i < UPDATE_INDEX_RETRIES:
-                        time.sleep(1)
-                    else:
-                        raise
-        else:
-            throughput = {
-                'write': upstream_global_indexes_by_name[index_name]['ProvisionedThroughput']['WriteCapacityUnits'],
-                'read': upstream_global_indexes_by_name[index_name]['ProvisionedThroughput']['ReadCapacityUnits'],
-            }
-            if throughput == index.throughput:
-                continue
-            # Update throughput
-            # TODO: this could be done in a single call with multiple indexes
-            db_table.update_global_secondary_index(global_indexes={
-                index_name: index.throughput
-            })
-            logger.info('Updating GSI %s throughput for %s to %s' % (index_name, table_name, index.throughput))
-
-    for index_name in upstream_global_indexes_by_name.keys():
-        if index_name not in local_global_indexes_by_name:
-            logger.info('Deleting GSI %s for %s' % (index_name, table_name))
-            for i in range(UPDATE_INDEX_RETRIES + 1):
-                try:
-                    db_table.delete_global_secondary_index(index_name)
-                except JSONResponseError as e:
-                    if 'ResourceNotFoundException' in str(e.body):
-                        break
-
-                    if i < UPDATE_INDEX_RETRIES:
-                        time.sleep(1)
-                    else:
-                        raise
+    upstream_throughput = table_metadata['Table']['ProvisionedThroughput']
+    if throughput and throughput == {'read': upstream_throughput['ReadCapacityUnits'],
+                                     'write': upstream_throughput['WriteCapacityUnits']}:
+        throughput = None
+
+    # Throughput changes for the table and all existing indexes go out in a single call:
+    # the table is UPDATING afterwards, and a second UpdateTable would be rejected.
+    if throughput or throughput_updates:
+        db_table.update(throughput=throughput or None, global_indexes=throughput_updates or None)
+        logger.info('Updating throughput for %s to %s, GSI throughput to %s' % (
+            table_name, throughput, throughput_updates))
+
+    for index in create_indexes:
+        logger.info('Creating GSI %s for %s' % (index.name, table_name))
+        _update_index_when_active(db_table, lambda: db_table.create_global_secondary_index(index),
+                                  done_marker='already exists', timeout=timeout)
+
+    for index_name in delete_index_names:
+        logger.info('Deleting GSI %s for %s' % (index_name, table_name))
+        _update_index_when_active(db_table, lambda: db_table.delete_global_secondary_index(index_name),
+                                  done_marker='ResourceNotFoundException', timeout=timeout)
 
     logger.info('cc_dynamodb.update_table: %s' % table_name, extra=dict(status='updated table'))
     return db_table
@@ -349,3 +538,6 @@ class TableAlreadyExistsException(Exception):
 
 class UpdateTableException(Exception):
     pass
+
+
+sys.modules[__name__] = _LazyModule(sys.modules[__name__])
@@ -0,0 +1,93 @@
+"""asyncio interface (Python 3 only).
+
+boto has no non-blocking transport, so each call runs on a shared thread pool
+(using that thread's pooled connection, see cc_dynamodb.connections) and returns
+an awaitable future. The event loop is never blocked; up to `max_workers`
+requests run at the same time and the rest wait in the executor's queue.
+
+    from cc_dynamodb import aio
+    item = await aio.get_item('nps_survey', agency_id=1669, profile_id=2616346)
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import os
+
+import cc_dynamodb
+from . import batch
+
+
+DEFAULT_MAX_WORKERS = 64
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=int(os.environ.get('CC_DYNAMODB_AIO_WORKERS', DEFAULT_MAX_WORKERS)))
+    return _executor
+
+
+def set_executor(executor):
+    """Use a custom concurrent.futures executor for all calls."""
+    global _executor
+    _executor = executor
+
+
+def run(func, *args, **kwargs):
+    """Run a blocking call on the executor. Returns an awaitable future."""
+    loop = asyncio.get_event_loop()
+    return loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+
+def _table_call(table_name, method_name, args, kwargs):
+    return getattr(cc_dynamodb.get_table(table_name), method_name)(*args, **kwargs)
+
+
+def _table_call_list(table_name, method_name, args, kwargs):
+    return list(_table_call(table_name, method_name, args, kwargs))
+
+
+def get_item(table_name, **kwargs):
+    return run(_table_call, table_name, 'get_item', (), kwargs)
+
+
+def put_item(table_name, data, overwrite=False):
+    return run(_table_call, table_name, 'put_item', (data,), dict(overwrite=overwrite))
+
+
+def delete_item(table_name, **kwargs):
+    return run(_table_call, table_name, 'delete_item', (), kwargs)
+
+
+def query(table_name, **kwargs):
+    """Like table.query_2(**kwargs), resolves to a list of all the matching Items."""
+    return run(_table_call_list, table_name, 'query_2', (), kwargs)
+
+
+def query_count(table_name, **kwargs):
+    return run(_table_call, table_name, 'query_count', (), kwargs)
+
+
+def scan(table_name, **kwargs):
+    """Like table.scan(**kwargs), resolves to a list of all the Items."""
+    return run(_table_call_list, table_name, 'scan', (), kwargs)
+
+
+def batch_write(table_name, items, **kwargs):
+    return run(batch.batch_write, table_name, items, **kwargs)
+
+
+def batch_get(table_name, keys, **kwargs):
+    return run(batch.batch_get, table_name, keys, **kwargs)
+
+
+def create_table(table_name, throughput=False):
+    return run(cc_dynamodb.create_table, table_name, throughput=throughput)
+
+
+def update_table(table_name, throughput=False):
+    return run(cc_dynamodb.update_table, table_name, throughput=throughput)
@@ -0,0 +1,269 @@
+from collections import OrderedDict
+import itertools
+from multiprocessing.pool import ThreadPool
+import random
+import threading
+import time
+
+import cc_dynamodb
+from boto.dynamodb2.items import Item
+from boto.dynamodb2.types import Dynamizer
+
+from .log import create_logger
+
+
+logger = create_logger('batch')
+
+BATCH_WRITE_SIZE = 25
+BATCH_GET_SIZE = 100
+DEFAULT_CONCURRENCY = 8
+MAX_RETRIES = 8
+BACKOFF_BASE = 0.05  # seconds
+BACKOFF_CAP = 5
+
+# Stateless, so shared by all tables and threads.
+_dynamizer = Dynamizer()
+
+
+def backoff(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """Seconds to wait before retry number `attempt`: exponential, with full jitter."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def chunked(iterable, size):
+    """Lazily split an iterable into lists of at most size items."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def consumed_capacity(response):
+    """Total CapacityUnits reported in a response with ReturnConsumedCapacity=TOTAL."""
+    return sum(capacity.get('CapacityUnits', 0)
+               for capacity in response.get('ConsumedCapacity') or [])
+
+
+def primary_key_names(table_name):
+    """Names of the primary key attributes (hash, then range) from the configured schema."""
+    return tuple(key['name'] for key in cc_dynamodb._get_table_config(table_name).schema)
+
+
+def run_bounded(func, jobs, concurrency):
+    """Run func over jobs on a thread pool, keeping at most 2 * concurrency jobs queued.
+
+    Yields the results as they complete. jobs may be a lazy iterable of any size.
+    """
+    slots = threading.Semaphore(concurrency * 2)
+    stopped = []
+
+    def throttled_jobs():
+        for job in jobs:
+            slots.acquire()
+            if stopped:
+                return
+            yield job
+
+    def run(job):
+        try:
+            return func(job)
+        finally:
+            slots.release()
+
+    pool = ThreadPool(concurrency)
+    try:
+        for result in pool.imap_unordered(run, throttled_jobs()):
+            yield result
+        pool.close()
+    finally:
+        # Wake up the pool's task feeder if it is waiting for a slot, so it can exit.
+        stopped.append(True)
+        slots.release()
+        pool.terminate()
+        pool.join()
+
+
+class BatchStats(object):
+    """Thread-safe counters for a batch operation."""
+
+    def __init__(self, table_name):
+        self.table_name = table_name
+        self.items = 0
+        self.requests = 0
+        self.retries = 0
+        self.consumed_capacity = 0
+        self.elapsed = 0
+        self._started = time.time()
+        self._lock = threading.Lock()
+
+    def record(self, items=0, requests=0, retries=0, consumed_capacity=0):
+        with self._lock:
+            self.items += items
+            self.requests += requests
+            self.retries += retries
+            self.consumed_capacity += consumed_capacity
+
+    def finish(self):
+        self.elapsed = time.time() - self._started
+        return self
+
+    @property
+    def items_per_second(self):
+        if not self.elapsed:
+            return 0
+        return self.items / float(self.elapsed)
+
+    def as_dict(self):
+        return dict(table_name=self.table_name, items=self.items, requests=self.requests,
+                    retries=self.retries, consumed_capacity=self.consumed_capacity,
+                    elapsed=self.elapsed, items_per_second=self.items_per_second)
+
+
+class BatchGetException(Exception):
+    def __init__(self, msg, unprocessed_keys):
+        super(BatchGetException, self).__init__(msg)
+        self.unprocessed_keys = unprocessed_keys
+
+
+class BatchWriteException(Exception):
+    def __init__(self, msg, unprocessed_items):
+        super(BatchWriteException, self).__init__(msg)
+        self.unprocessed_items = unprocessed_items
+
+
+def _dedupe(items, key_names):
+    """Keep the last write per primary key, DynamoDB rejects duplicates within one request.
+
+    Done over the whole input rather than per request: requests run concurrently, so
+    two writes of one key in different requests could land in either order.
+    """
+    by_key = OrderedDict()
+    for item in items:
+        by_key[tuple(item.get(key_name) for key_name in key_names)] = item
+    return by_key.values()
+
+
+def _write_requests(table_name, requests, stats, max_retries):
+    """Send up to 25 PutRequests/DeleteRequests in one BatchWriteItem, retrying UnprocessedItems."""
+    namespaced_name = cc_dynamodb.get_table_name(table_name)
+    request_items = {namespaced_name: requests}
+    written = len(requests)
+    connection = cc_dynamodb.get_connection()
+
+    for attempt in range(max_retries + 1):
+        response = connection.batch_write_item(request_items, return_consumed_capacity='TOTAL')
+        stats.record(requests=1, retries=1 if attempt else 0,
+                     consumed_capacity=consumed_capacity(response))
+        request_items = response.get('UnprocessedItems') or {}
+        if not request_items:
+            stats.record(items=written)
+            return
+        if attempt < max_retries:
+            time.sleep(backoff(attempt))
+
+    unprocessed = sum(len(requests) for requests in request_items.values())
+    stats.record(items=written - unprocessed)
+    raise BatchWriteException('%s items still unprocessed for %s after %s retries' % (
+        unprocessed, table_name, max_retries), unprocessed_items=request_items)
+
+
+def _write_chunk(table_name, items, dynamizer, stats, max_retries):
+    requests = [{'PutRequest': {'Item': dict((key, dynamizer.encode(value)) for key, value in item.items())}}
+                for item in items]
+    _write_requests(table_name, requests, stats, max_retries)
+
+
+def batch_write(table_name, items, concurrency=DEFAULT_CONCURRENCY, max_retries=MAX_RETRIES):
+    """Put items (an iterable of dicts) into a configured table, using parallel BatchWriteItem calls.
+
+    Items are sent in requests of 25, on `concurrency` threads; if a primary key appears
+    more than once, only its last item is written. Unprocessed items are retried with
+    jittered exponential backoff, raising BatchWriteException once `max_retries` is exhausted.
+
+    :param table_name: unprefixed table name
+    :return: BatchStats, with items_per_second and consumed_capacity
+    """
+    key_names = primary_key_names(table_name)
+    stats = BatchStats(table_name)
+
+    def write(chunk):
+        _write_chunk(table_name, chunk, _dynamizer, stats, max_retries)
+
+    for _ in run_bounded(write, chunked(_dedupe(items, key_names), BATCH_WRITE_SIZE), concurrency):
+        pass
+
+    stats.finish()
+    logger.info('cc_dynamodb.batch.batch_write: %s' % table_name, extra=stats.as_dict())
+    return stats
+
+
+def _get_chunk(table_name, keys, dynamizer, attributes, consistent, stats, max_retries):
+    namespaced_name = cc_dynamodb.get_table_name(table_name)
+    request = {
+        'Keys': [dict((key, dynamizer.encode(value)) for key, value in item_key.items())
+                 for item_key in keys],
+        'ConsistentRead': consistent,
+    }
+    if attributes:
+        request['AttributesToGet'] = attributes
+    request_items = {namespaced_name: request}
+    connection = cc_dynamodb.get_connection()
+    raw_items = []
+
+    for attempt in range(max_retries + 1):
+        response = connection.batch_get_item(request_items, return_consumed_capacity='TOTAL')
+        found = response.get('Responses', {}).get(namespaced_name, [])
+        raw_items.extend(found)
+        stats.record(items=len(found), requests=1, retries=1 if attempt else 0,
+                     consumed_capacity=consumed_capacity(response))
+        request_items = response.get('UnprocessedKeys') or {}
+        if not request_items:
+            return raw_items
+        if attempt < max_retries:
+            time.sleep(backoff(attempt))
+
+    raise BatchGetException('%s keys still unprocessed for %s after %s retries' % (
+        len(request_items[namespaced_name]['Keys']), table_name, max_retries), unprocessed_keys=request_items)
+
+
+def batch_get(table_name, keys, attributes=None, consistent=False,
+              concurrency=DEFAULT_CONCURRENCY, max_retries=MAX_RETRIES):
+    """Get items by primary key from a configured table, using parallel BatchGetItem calls.
+
+    Duplicate keys are fetched once, in requests of 100 keys on `concurrency` threads.
+    UnprocessedKeys are retried with jittered exponential backoff, raising
+    BatchGetException once `max_retries` is exhausted.
+
+    :param table_name: unprefixed table name
+    :param keys: iterable of dicts with the primary key values, e.g. {'agency_id': 1, 'profile_id': 2}
+    :param attributes: optional list of attributes to fetch (the primary key is always included)
+    :return: list of boto Items in the same order as keys, with None for keys not found
+    """
+    key_names = primary_key_names(table_name)
+    db_table = cc_dynamodb.get_table(table_name)
+    if attributes:
+        attributes = list(key_names) + [name for name in attributes if name not in key_names]
+    stats = BatchStats(table_name)
+
+    def key_of(item):
+        return tuple(item.get(key_name) for key_name in key_names)
+
+    keys = list(keys)
+    unique_keys = OrderedDict((key_of(item_key), dict((name, item_key[name]) for name in key_names))
+                              for item_key in keys)
+
+    def get(chunk):
+        return _get_chunk(table_name, chunk, _dynamizer, attributes, consistent, stats, max_retries)
+
+    items_by_key = {}
+    for raw_items in run_bounded(get, chunked(unique_keys.values(), BATCH_GET_SIZE), concurrency):
+        for raw_item in raw_items:
+            item = Item(db_table)
+            item.load({'Item': raw_item})
+            items_by_key[key_of(item)] = item
+
+    stats.finish()
+    logger.info('cc_dynamodb.batch.batch_get: %s' % table_name, extra=stats.as_dict())
+    return [items_by_key.get(key_of(item_key)) for item_key in keys]
@@ -0,0 +1,169 @@
+from collections import OrderedDict
+import threading
+import time
+
+from boto.dynamodb2.exceptions import ItemNotFound
+from boto.dynamodb2.items import Item
+
+import cc_dynamodb
+from .log import create_logger
+
+
+logger = create_logger('cache')
+
+DEFAULT_TTL = 60  # seconds
+DEFAULT_MAX_SIZE = 1000
+
+
+class LRUCache(object):
+    """Thread-safe LRU cache whose entries expire after ttl seconds."""
+
+    def __init__(self, ttl=DEFAULT_TTL, max_size=DEFAULT_MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        # key -> generation, bumped by invalidate(). Keys not in it (or evicted from it) are at _floor.
+        self._generations = OrderedDict()
+        self._counter = 0
+        self._floor = 0
+        self._lock = threading.Lock()
+        self._stats = dict(hits=0, misses=0, evictions=0, expirations=0, invalidations=0)
+
+    def get(self, key):
+        """Return the cached value, or None."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            value, expires = entry
+            if expires < time.time():
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return None
+            # Re-insert to mark as most recently used.
+            self._entries[key] = entry
+            self._stats['hits'] += 1
+            return value
+
+    def generation(self, key):
+        """Changes whenever key is invalidated, see set()."""
+        with self._lock:
+            return self._generations.get(key, self._floor)
+
+    def set(self, key, value, generation=None):
+        """Cache value. With a generation() taken before reading value, only if key was not invalidated since."""
+        with self._lock:
+            if generation is not None and self._generations.get(key, self._floor) != generation:
+                return
+            self._entries.pop(key, None)
+            self._entries[key] = (value, time.time() + self.ttl)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._counter += 1
+            self._generations.pop(key, None)
+            self._generations[key] = self._counter
+            # Oldest first, so the floor only goes up and an evicted key still reads as changed.
+            while len(self._generations) > self.max_size:
+                self._floor = self._generations.popitem(last=False)[1]
+            if self._entries.pop(key, None) is not None:
+                self._stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._counter += 1
+            self._floor = self._counter
+            self._generations.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, size=len(self._entries))
+
+
+def _build_item_cache(table_config):
+    if table_config.cache is None:
+        return None
+    return LRUCache(ttl=table_config.cache.get('ttl', DEFAULT_TTL),
+                    max_size=table_config.cache.get('max_size', DEFAULT_MAX_SIZE))
+
+
+def get_item_cache(table_name):
+    """The table's shared LRUCache, or None if it has no `cache:` config."""
+    return cc_dynamodb._get_table_config(table_name).memoize('item_cache', _build_item_cache)
+
+
+class CachedTable(object):
+    """Wraps a boto Table with a read-through item cache.
+
+    get_item() is served from the cache when possible. put_item() and delete_item()
+    invalidate the written key; call invalidate() after writing in other ways
+    (e.g. Item.save()). Everything else is passed through to the boto Table.
+    Tables without a `cache:` config are passed through entirely.
+    """
+
+    def __init__(self, table_name, connection=None):
+        self.table = cc_dynamodb.get_table(table_name, connection=connection)
+        self.item_cache = get_item_cache(table_name)
+        self.key_names = tuple(key['name'] for key in cc_dynamodb._get_table_config(table_name).schema)
+
+    def __getattr__(self, name):
+        return getattr(self.table, name)
+
+    def _key(self, data):
+        return tuple(data.get(key_name) for key_name in self.key_names)
+
+    def get_item(self, consistent=False, attributes=None, **kwargs):
+        # Partial items would poison the cache, so projections always bypass it.
+        if self.item_cache is None or attributes:
+            return self.table.get_item(consistent=consistent, attributes=attributes, **kwargs)
+
+        key = self._key(kwargs)
+        raw_item = None if consistent else self.item_cache.get(key)
+        if raw_item is None:
+            # Taken before reading, so an item read before a concurrent write is not cached after it.
+            generation = self.item_cache.generation(key)
+            response = self.table.connection.get_item(
+                self.table.table_name,
+                self.table._encode_keys(kwargs),
+                consistent_read=consistent,
+            )
+            if 'Item' not in response:
+                raise ItemNotFound('Item %s couldn\'t be found.' % kwargs)
+            raw_item = response['Item']
+            self.item_cache.set(key, raw_item, generation)
+
+        item = Item(self.table)
+        item.load({'Item': raw_item})
+        return item
+
+    def put_item(self, data, overwrite=False):
+        try:
+            return self.table.put_item(data, overwrite=overwrite)
+        finally:
+            self.invalidate(**data)
+
+    def delete_item(self, *args, **kwargs):
+        try:
+            return self.table.delete_item(*args, **kwargs)
+        finally:
+            self.invalidate(**kwargs)
+
+    def invalidate(self, **kwargs):
+        """Drop the cached item for the given primary key (extra attributes are ignored)."""
+        if self.item_cache is not None:
+            self.item_cache.invalidate(self._key(kwargs))
+
+    def cache_stats(self):
+        """Hit/miss/eviction counters, or None if the table is not cached."""
+        if self.item_cache is not None:
+            return self.item_cache.stats()
+
+
+def get_cached_table(table_name, connection=None):
+    """Like cc_dynamodb.get_table, with the read-through item cache from the `cache:` config."""
+    return CachedTable(table_name, connection=connection)
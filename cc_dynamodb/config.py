@@ -0,0 +1,208 @@
+import os
+import pickle
+import tempfile
+
+from .log import create_logger
+
+
+logger = create_logger('config')
+
+
+class ReadOnlyConfigError(TypeError):
+    pass
+
+
+def _read_only(*args, **kwargs):
+    raise ReadOnlyConfigError('cc_dynamodb config is read-only. Use toDict() for a mutable copy, '
+                              'or call set_config() to load a new one.')
+
+
+class AttributeDict(dict):
+    """A dict whose keys are also attributes, like bunch.Bunch (which would import PyYAML)."""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+    def __delattr__(self, name):
+        try:
+            del self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def toDict(self):
+        """Return a copy, with plain dicts and lists."""
+        return thaw(self)
+
+
+class FrozenBunch(AttributeDict):
+    """An AttributeDict that cannot be changed after it was built.
+
+    Shared by every caller of get_config(), so it is never copied.
+    """
+    __setitem__ = __delitem__ = __setattr__ = __delattr__ = _read_only
+    clear = pop = popitem = setdefault = update = __ior__ = _read_only
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (type(self), (dict(self),))
+
+    def toDict(self):
+        """Return a mutable copy, with plain dicts and lists."""
+        return thaw(self)
+
+
+def freeze(value):
+    if isinstance(value, dict):
+        return FrozenBunch((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value):
+    if isinstance(value, dict):
+        return dict((key, thaw(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return [thaw(item) for item in value]
+    return value
+
+
+def _keys_by_role(parts):
+    """Split key parts into (hash key names, range key names)."""
+    return (tuple(part['name'] for part in parts if part['type'] == 'HashKey'),
+            tuple(part['name'] for part in parts if part['type'] == 'RangeKey'))
+
+
+class TableConfig(object):
+    """Precomputed, read-only view of a single table's configuration.
+
+    `derived` memoizes data built from this view (e.g. boto key objects).
+    It lives and dies with the TableConfig: set_config() invalidates it, while
+    reload_config() keeps the TableConfigs of tables whose `source` is unchanged.
+    """
+    __slots__ = ('name', 'schema', 'global_indexes', 'indexes', 'columns', 'cache',
+                 'indexes_by_name', 'index_keys', 'source', 'derived')
+
+    def __init__(self, name, yaml_config):
+        set_slot = super(TableConfig, self).__setattr__
+        set_slot('name', name)
+        set_slot('schema', yaml_config['schemas'][name])
+        set_slot('global_indexes', (yaml_config.get('global_indexes') or {}).get(name, ()))
+        set_slot('indexes', (yaml_config.get('indexes') or {}).get(name, ()))
+        set_slot('columns', (yaml_config.get('columns') or {}).get(name))
+        set_slot('cache', (yaml_config.get('cache') or {}).get(name))
+
+        # Local indexes win over global ones of the same name.
+        indexes_by_name = {}
+        for index in self.indexes + self.global_indexes:
+            indexes_by_name.setdefault(index['name'], index)
+        set_slot('indexes_by_name', indexes_by_name)
+        set_slot('index_keys', dict((index_name, _keys_by_role(index.get('parts', ())))
+                                    for index_name, index in indexes_by_name.items()))
+        # Everything derived data may depend on, to tell whether a reload changed the table.
+        set_slot('source', (self.schema, self.global_indexes, self.indexes, self.columns, self.cache,
+                            yaml_config.get('default_throughput')))
+        set_slot('derived', {})
+
+    def memoize(self, key, build):
+        """Return derived[key], calling build(self) to fill it on first use."""
+        try:
+            return self.derived[key]
+        except KeyError:
+            return self.derived.setdefault(key, build(self))
+
+    __setattr__ = __delattr__ = _read_only
+
+
+class Config(FrozenBunch):
+    """The compiled result of set_config(). Also holds a TableConfig per table."""
+
+    def __init__(self, *args, **kwargs):
+        super(Config, self).__init__(*args, **kwargs)
+        schemas = self.yaml.get('schemas') or {}
+        object.__setattr__(self, 'tables', dict(
+            (table_name, TableConfig(table_name, self.yaml)) for table_name in schemas))
+
+    def reuse_tables(self, previous):
+        """Take over previous's TableConfigs (and their derived data) for unchanged tables.
+
+        Only called before the Config is shared. Returns the names of the tables
+        that were added, changed or removed.
+        """
+        changed = set(previous.tables) - set(self.tables)
+        for table_name, table_config in self.tables.items():
+            previous_table_config = previous.tables.get(table_name)
+            if previous_table_config is not None and previous_table_config.source == table_config.source:
+                self.tables[table_name] = previous_table_config
+            else:
+                changed.add(table_name)
+        return changed
+
+
+def compile_config(config):
+    """Build the read-only Config from a plain dict (as assembled by set_config)."""
+    return Config((key, freeze(value)) for key, value in config.items())
+
+
+def file_signature(path):
+    """Cheap fingerprint of a file, changed whenever it is rewritten or replaced."""
+    stat = os.stat(path)
+    return (stat.st_ino, stat.st_size, stat.st_mtime)
+
+
+def _parse_yaml(path):
+    import yaml
+    # The C loader (PyYAML built with libyaml) parses several times faster.
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    with open(path) as config_file:
+        return yaml.load(config_file, Loader=loader)
+
+
+def load_yaml(path, cache_path=None):
+    """Parse the YAML config file at path.
+
+    With cache_path, the parsed config is also pickled there, along with the
+    path, size and mtime of the YAML file, and loaded from there instead of
+    parsing while those are unchanged. Only use a cache_path that no one else
+    can write to: loading a pickle can run arbitrary code.
+    """
+    if not cache_path:
+        return _parse_yaml(path)
+
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    cache_key = (path, stat.st_size, stat.st_mtime)
+    try:
+        with open(cache_path, 'rb') as cache_file:
+            cached_key, yaml_config = pickle.load(cache_file)
+        if cached_key == cache_key:
+            return yaml_config
+    except (IOError, OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+        pass
+
+    yaml_config = _parse_yaml(path)
+    try:
+        # Written to a temporary file first, so concurrent readers never see a partial cache.
+        cache_dir = os.path.dirname(os.path.abspath(cache_path))
+        fd, temp_path = tempfile.mkstemp(dir=cache_dir, prefix='.cc_dynamodb_config')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                pickle.dump((cache_key, yaml_config), temp_file, pickle.HIGHEST_PROTOCOL)
+            os.rename(temp_path, cache_path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+    except (IOError, OSError) as e:
+        logger.warn('cc_dynamodb.config: could not write config cache %s: %s' % (cache_path, e))
+    return yaml_config
@@ -0,0 +1,83 @@
+import os
+import threading
+import time
+
+from .log import create_logger
+
+
+logger = create_logger('connections')
+DEFAULT_KEEP_ALIVE = 60
+
+
+class ConnectionRegistry(object):
+    """Process-wide registry of DynamoDB connections.
+
+    Connections are keyed by region/host/port/credentials and kept per thread,
+    since boto connections are not thread-safe. A connection unused for longer
+    than `keep_alive` seconds is replaced. The registry resets itself in a
+    forked child (gunicorn/celery workers), so sockets are never shared
+    between processes.
+    """
+
+    def __init__(self, keep_alive=None):
+        if keep_alive is None:
+            keep_alive = float(os.environ.get('CC_DYNAMODB_KEEP_ALIVE', DEFAULT_KEEP_ALIVE))
+        self.keep_alive = keep_alive
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Drop all connections and stats."""
+        with self._lock:
+            self._pid = os.getpid()
+            self._local = threading.local()
+            self._stats = dict(created=0, reused=0, expired=0, resets=0)
+
+    def _after_fork(self):
+        # The parent's lock may have been held by another thread while forking.
+        self._lock = threading.Lock()
+        self.reset()
+        self._stats['resets'] = 1
+        logger.info('cc_dynamodb.connections: fork detected, connections reset')
+
+    def _connections(self):
+        if self._pid != os.getpid():
+            self._after_fork()
+        try:
+            return self._local.connections
+        except AttributeError:
+            self._local.connections = {}
+            return self._local.connections
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def get(self, key, factory):
+        """Return this thread's connection for key, calling factory() to create one."""
+        connections = self._connections()
+        now = time.time()
+        cached = connections.get(key)
+        if cached is not None:
+            connection, last_used = cached
+            if self.keep_alive is None or now - last_used <= self.keep_alive:
+                connections[key] = (connection, now)
+                self._count('reused')
+                return connection
+            self._count('expired')
+
+        connection = factory()
+        connections[key] = (connection, now)
+        self._count('created')
+        return connection
+
+    def stats(self):
+        """Counters of created, reused and expired connections, and fork resets."""
+        with self._lock:
+            return dict(self._stats)
+
+
+registry = ConnectionRegistry()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=registry._after_fork)
@@ -0,0 +1,107 @@
+"""Independent config contexts, for using several namespaces in one process.
+
+The top-level functions use the single global config from set_config(). A
+ConfigContext has its own namespace, credentials, region, connections and
+cached table metadata, so contexts can be used side by side from any thread:
+
+    from cc_dynamodb import contexts
+
+    contexts.register('shard_1', table_config='dynamodb.yml', namespace='staging1_')
+    contexts.register('eu', table_config='dynamodb.yml', namespace='prod_', region='eu-west-1')
+
+    contexts.get_context('eu').get_table('nps_survey').get_item(agency_id=1, profile_id=2)
+"""
+import os
+import threading
+
+import cc_dynamodb
+from .connections import ConnectionRegistry
+from .log import create_logger
+
+
+logger = create_logger('contexts')
+
+_contexts = {}
+_contexts_lock = threading.Lock()
+
+
+class UnknownContextException(Exception):
+    pass
+
+
+class ConfigContext(object):
+    """A config and connection registry of its own, with the table helpers bound to them.
+
+    Takes the same arguments as set_config(), plus the AWS `region` (default:
+    CC_AWS_REGION or us-west-2). The config is read-only and loaded once.
+    """
+
+    def __init__(self, table_config, region=None, **kwargs):
+        self.config = cc_dynamodb.build_config(table_config, **kwargs)
+        self.region = region or os.environ.get('CC_AWS_REGION', 'us-west-2')
+        self.connections = ConnectionRegistry()
+
+    @property
+    def namespace(self):
+        return self.config.namespace
+
+    def get_table_name(self, table_name):
+        return self.config.namespace + table_name
+
+    def get_reverse_table_name(self, table_name):
+        return table_name[len(self.config.namespace):]
+
+    def list_table_names(self):
+        return list(self.config.tables)
+
+    def get_table_config(self, table_name):
+        try:
+            return self.config.tables[table_name]
+        except KeyError:
+            raise cc_dynamodb.UnknownTableException('Unknown table: %s' % table_name)
+
+    def get_table_metadata(self, table_name):
+        """Like cc_dynamodb._get_table_metadata, cached in this context."""
+        metadata = self.get_table_config(table_name).memoize('metadata', cc_dynamodb._build_table_metadata)
+        return dict((key, list(value)) for key, value in metadata.items())
+
+    def get_connection(self):
+        """This thread's connection for the context's region and credentials, rate limited per context."""
+        return cc_dynamodb._get_connection(self.config, self.region, self.connections, throttle_config=self.config)
+
+    def get_table(self, table_name, connection=None):
+        """Like cc_dynamodb.get_table, for the context's namespace and connection."""
+        from boto.dynamodb2 import table
+        return table.Table(
+            self.get_table_name(table_name),
+            connection=connection or self.get_connection(),
+            **self.get_table_metadata(table_name)
+        )
+
+    def __repr__(self):
+        return '<ConfigContext namespace=%r region=%r>' % (self.config.namespace, self.region)
+
+
+def register(name, table_config, **kwargs):
+    """Create a ConfigContext (see its arguments) and register it as name, replacing any previous one."""
+    context = ConfigContext(table_config, **kwargs)
+    with _contexts_lock:
+        _contexts[name] = context
+    logger.info('cc_dynamodb.contexts: registered %s as %r' % (name, context))
+    return context
+
+
+def unregister(name):
+    with _contexts_lock:
+        _contexts.pop(name, None)
+
+
+def get_context(name):
+    try:
+        return _contexts[name]
+    except KeyError:
+        raise UnknownContextException('Unknown context: %s' % name)
+
+
+def list_contexts():
+    return sorted(_contexts)
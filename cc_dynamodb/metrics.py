@@ -0,0 +1,221 @@
+"""Per-request instrumentation of the connections returned by get_connection().
+
+Register one or more sinks; each DynamoDB API call is then reported to them as a
+RequestMetrics. Without sinks the instrumentation is a single check per call.
+
+    from cc_dynamodb import metrics
+    metrics.add_sink(metrics.StatsdSink('localhost', 8125, prefix='myapp.dynamodb'))
+"""
+from bisect import bisect_left
+from collections import namedtuple
+import json
+import socket
+import threading
+import time
+
+from .log import create_logger
+
+
+logger = create_logger('metrics')
+
+# Operations that accept ReturnConsumedCapacity, and whether they consume read or write units.
+READ_OPERATIONS = frozenset(['GetItem', 'Query', 'Scan', 'BatchGetItem'])
+WRITE_OPERATIONS = frozenset(['PutItem', 'UpdateItem', 'DeleteItem', 'BatchWriteItem'])
+
+RequestMetrics = namedtuple('RequestMetrics', [
+    'operation',        # e.g. 'Query'
+    'table',            # namespaced table name, None for e.g. ListTables
+    'index',            # IndexName, or None
+    'latency',          # seconds, including retries
+    'retries',
+    'throttles',        # ProvisionedThroughputExceededException responses
+    'consumed_read',    # capacity units
+    'consumed_write',
+    'error',            # exception class name, or None
+])
+
+_sinks = []
+_sinks_lock = threading.Lock()
+
+
+def add_sink(sink):
+    """Register sink, a callable taking a RequestMetrics."""
+    with _sinks_lock:
+        _sinks.append(sink)
+
+
+def remove_sink(sink):
+    with _sinks_lock:
+        _sinks.remove(sink)
+
+
+def _table_name(params):
+    if 'TableName' in params:
+        return params['TableName']
+    request_items = params.get('RequestItems')
+    if request_items:
+        # Batch calls may span tables, report them under the first one.
+        return sorted(request_items)[0]
+
+
+def _consumed_capacity(operation, response):
+    consumed = response.get('ConsumedCapacity') if response else None
+    if not consumed:
+        return 0, 0
+    if isinstance(consumed, dict):
+        consumed = [consumed]
+    units = sum(capacity.get('CapacityUnits', 0) for capacity in consumed)
+    if operation in WRITE_OPERATIONS:
+        return 0, units
+    return units, 0
+
+
+def _emit(request_metrics):
+    for sink in list(_sinks):
+        try:
+            sink(request_metrics)
+        except Exception:
+            logger.exception('cc_dynamodb.metrics: sink %r failed' % sink)
+
+
+def instrument(connection):
+    """Wrap a boto DynamoDBConnection's make_request to report RequestMetrics to the sinks.
+
+    Consumed capacity is requested (ReturnConsumedCapacity=TOTAL) when the caller did not.
+    """
+    make_request = connection.make_request
+    retry_handler = connection._retry_handler
+    retries = [0]
+
+    def counting_retry_handler(response, i, next_sleep):
+        status = retry_handler(response, i, next_sleep)
+        if status is not None:
+            retries[0] += 1
+        return status
+
+    def instrumented_make_request(action, body):
+        if not _sinks:
+            return make_request(action, body)
+
+        params = json.loads(body) if body else {}
+        if (action in READ_OPERATIONS or action in WRITE_OPERATIONS) and 'ReturnConsumedCapacity' not in params:
+            params['ReturnConsumedCapacity'] = 'TOTAL'
+            body = json.dumps(params)
+
+        retries[0] = 0
+        throttles = getattr(connection, 'throughput_exceeded_events', 0)
+        response = error = None
+        started = time.time()
+        try:
+            response = make_request(action, body)
+            return response
+        except Exception as e:
+            error = e.__class__.__name__
+            raise
+        finally:
+            consumed_read, consumed_write = _consumed_capacity(action, response)
+            _emit(RequestMetrics(
+                operation=action,
+                table=_table_name(params),
+                index=params.get('IndexName'),
+                latency=time.time() - started,
+                retries=retries[0],
+                throttles=getattr(connection, 'throughput_exceeded_events', 0) - throttles,
+                consumed_read=consumed_read,
+                consumed_write=consumed_write,
+                error=error,
+            ))
+
+    connection.make_request = instrumented_make_request
+    connection._retry_handler = counting_retry_handler
+    return connection
+
+
+class StatsdSink(object):
+    """Sends timings and counters to StatsD over UDP.
+
+    Metric names are `<prefix>.<table>.<operation>[.<index>].<metric>`.
+    """
+
+    def __init__(self, host='localhost', port=8125, prefix='cc_dynamodb'):
+        self.address = (host, port)
+        self.prefix = prefix
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def _name(self, request_metrics):
+        parts = [self.prefix, request_metrics.table or '_', request_metrics.operation]
+        if request_metrics.index:
+            parts.append(request_metrics.index)
+        return '.'.join(parts)
+
+    def __call__(self, request_metrics):
+        name = self._name(request_metrics)
+        lines = [
+            '%s.latency:%.3f|ms' % (name, request_metrics.latency * 1000),
+            '%s.requests:1|c' % name,
+        ]
+        for metric in ('retries', 'throttles', 'consumed_read', 'consumed_write'):
+            value = getattr(request_metrics, metric)
+            if value:
+                lines.append('%s.%s:%s|c' % (name, metric, value))
+        if request_metrics.error:
+            lines.append('%s.errors.%s:1|c' % (name, request_metrics.error))
+        try:
+            self.socket.sendto('\n'.join(lines).encode('utf-8'), self.address)
+        except socket.error:
+            pass
+
+
+class PrometheusSink(object):
+    """Keeps Prometheus-style counters and a latency histogram in process.
+
+    render() returns them in the Prometheus text exposition format, to be served
+    from the application's /metrics endpoint.
+    """
+    LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+    COUNTERS = ('requests', 'errors', 'retries', 'throttles', 'consumed_read', 'consumed_write')
+
+    def __init__(self, prefix='cc_dynamodb'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        # (table, operation, index) -> {counter: value, 'buckets': [...], 'latency_sum': seconds}
+        self._series = {}
+
+    def __call__(self, request_metrics):
+        labels = (request_metrics.table or '', request_metrics.operation, request_metrics.index or '')
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = dict((counter, 0) for counter in self.COUNTERS)
+                series['buckets'] = [0] * (len(self.LATENCY_BUCKETS) + 1)
+                series['latency_sum'] = 0.0
+                self._series[labels] = series
+            series['requests'] += 1
+            series['errors'] += 1 if request_metrics.error else 0
+            for counter in ('retries', 'throttles', 'consumed_read', 'consumed_write'):
+                series[counter] += getattr(request_metrics, counter)
+            series['buckets'][bisect_left(self.LATENCY_BUCKETS, request_metrics.latency)] += 1
+            series['latency_sum'] += request_metrics.latency
+
+    def render(self):
+        lines = []
+        with self._lock:
+            series_items = sorted(self._series.items())
+            for counter in self.COUNTERS:
+                lines.append('# TYPE %s_%s_total counter' % (self.prefix, counter))
+                for labels, series in series_items:
+                    lines.append('%s_%s_total{%s} %s' % (self.prefix, counter, self._labels(labels), series[counter]))
+            lines.append('# TYPE %s_latency_seconds histogram' % self.prefix)
+            for labels, series in series_items:
+                cumulative = 0
+                for bound, count in zip(self.LATENCY_BUCKETS + ('+Inf',), series['buckets']):
+                    cumulative += count
+                    lines.append('%s_latency_seconds_bucket{%s,le="%s"} %s' % (
+                        self.prefix, self._labels(labels), bound, cumulative))
+                lines.append('%s_latency_seconds_sum{%s} %s' % (self.prefix, self._labels(labels), series['latency_sum']))
+                lines.append('%s_latency_seconds_count{%s} %s' % (self.prefix, self._labels(labels), series['requests']))
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _labels(labels):
+        return 'table="%s",operation="%s",index="%s"' % labels
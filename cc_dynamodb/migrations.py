@@ -0,0 +1,325 @@
+import sys
+import time
+
+from boto.exception import JSONResponseError
+
+import cc_dynamodb
+from .batch import run_bounded
+from .log import create_logger
+
+
+logger = create_logger('migrations')
+
+DEFAULT_CONCURRENCY = 8
+# DynamoDB limits how many tables can be CREATING/UPDATING/DELETING at once.
+DEFAULT_PROVISION_CONCURRENCY = 10
+
+# The provisioning poller's sleep, a module attribute so it can be patched without patching time.sleep.
+_sleep = time.sleep
+
+
+class MigrationException(Exception):
+    def __init__(self, msg, errors):
+        super(MigrationException, self).__init__(msg)
+        self.errors = errors
+
+
+def run_per_table(func, table_names, concurrency=DEFAULT_CONCURRENCY):
+    """Call func(table_name) for each table on a thread pool.
+
+    Returns {table_name: result}. If any call failed, raises MigrationException
+    once all tables are done, with the exceptions by table name in `errors`.
+    """
+    def run(table_name):
+        try:
+            return table_name, func(table_name), None
+        except Exception:
+            return table_name, None, sys.exc_info()[1]
+
+    results = {}
+    errors = {}
+    for table_name, result, error in run_bounded(run, table_names, concurrency):
+        if error is not None:
+            logger.error('cc_dynamodb.migrations: %s failed: %s' % (table_name, error))
+            errors[table_name] = error
+        else:
+            results[table_name] = result
+
+    if errors:
+        raise MigrationException('Failed for tables: %s' % ', '.join(sorted(errors)), errors=errors)
+    return results
+
+
+def update_tables(table_names=None, concurrency=DEFAULT_CONCURRENCY, **kwargs):
+    """Run update_table for many tables (default: all configured tables) in parallel.
+
+    Each table is reconciled on its own thread and connection, so index changes
+    on different tables no longer wait on each other.
+
+    :return: {table_name: boto Table}
+    """
+    if table_names is None:
+        table_names = cc_dynamodb.list_table_names()
+    return run_per_table(lambda table_name: cc_dynamodb.update_table(table_name, **kwargs),
+                         table_names, concurrency=concurrency)
+
+
+class TablePlan(object):
+    """The changes needed to bring one table in line with the configuration."""
+
+    def __init__(self, table_name, create_table=False, schema_error=None, throughput=None,
+                 create_indexes=(), index_throughput=None, delete_indexes=()):
+        self.table_name = table_name
+        self.create_table = create_table
+        self.schema_error = schema_error
+        self.throughput = throughput
+        self.create_indexes = list(create_indexes)
+        self.index_throughput = index_throughput or {}
+        self.delete_indexes = list(delete_indexes)
+
+    @property
+    def has_changes(self):
+        return bool(self.create_table or self.throughput or self.create_indexes or
+                    self.index_throughput or self.delete_indexes)
+
+    def as_dict(self):
+        return dict(
+            table_name=self.table_name,
+            create_table=self.create_table,
+            schema_error=self.schema_error,
+            throughput=self.throughput,
+            create_indexes=self.create_indexes,
+            index_throughput=self.index_throughput,
+            delete_indexes=self.delete_indexes,
+        )
+
+    def __repr__(self):
+        return '<TablePlan %r>' % self.as_dict()
+
+
+def plan_table(table_name, throughput=False):
+    """Describe one table and compare it with the configuration. Makes no changes.
+
+    :param throughput: optional primary throughput to plan for, e.g. {'read': 10, 'write': 10}
+    """
+    db_table = cc_dynamodb.get_table(table_name)
+    local_global_indexes = list(db_table.global_indexes)
+    try:
+        table_metadata = db_table.describe()
+    except JSONResponseError as e:
+        if e.status == 400 and e.error_code == 'ResourceNotFoundException':
+            return TablePlan(table_name, create_table=True, throughput=throughput or None)
+        raise
+
+    try:
+        cc_dynamodb._validate_schema(schema=db_table.schema, table_metadata=table_metadata)
+    except cc_dynamodb.UpdateTableException as e:
+        return TablePlan(table_name, schema_error=str(e))
+
+    primary_throughput = None
+    if throughput:
+        upstream_throughput = table_metadata['Table']['ProvisionedThroughput']
+        if throughput != {'read': upstream_throughput['ReadCapacityUnits'],
+                          'write': upstream_throughput['WriteCapacityUnits']}:
+            primary_throughput = dict(throughput)
+
+    create_indexes, throughput_updates, delete_index_names = cc_dynamodb._diff_global_indexes(
+        local_global_indexes, table_metadata)
+    return TablePlan(
+        table_name,
+        throughput=primary_throughput,
+        create_indexes=[index.name for index in create_indexes],
+        index_throughput=dict((index_name, dict(index_throughput))
+                              for index_name, index_throughput in throughput_updates.items()),
+        delete_indexes=delete_index_names,
+    )
+
+
+def plan(table_names=None, throughput=False, concurrency=DEFAULT_CONCURRENCY):
+    """Describe tables (default: all configured) concurrently and diff them with the configuration.
+
+    :return: list of TablePlan, sorted by table name. Review it, then pass it to apply().
+    """
+    if table_names is None:
+        table_names = cc_dynamodb.list_table_names()
+    plans = run_per_table(lambda table_name: plan_table(table_name, throughput=throughput),
+                          table_names, concurrency=concurrency)
+    return [plans[table_name] for table_name in sorted(plans)]
+
+
+def _apply_table_plan(table_plan, timeout):
+    """Make exactly the changes in table_plan, rather than re-diffing the table like update_table would."""
+    table_name = table_plan.table_name
+    if table_plan.create_table:
+        return cc_dynamodb.create_table(table_name, throughput=table_plan.throughput or False)
+
+    db_table = cc_dynamodb.get_table(table_name)
+    local_global_indexes = dict((index.name, index) for index in db_table.global_indexes)
+
+    if table_plan.throughput or table_plan.index_throughput:
+        db_table.update(throughput=table_plan.throughput or None,
+                        global_indexes=table_plan.index_throughput or None)
+        logger.info('Updating throughput for %s to %s, GSI throughput to %s' % (
+            table_name, table_plan.throughput, table_plan.index_throughput))
+
+    for index_name in table_plan.create_indexes:
+        index = local_global_indexes[index_name]
+        logger.info('Creating GSI %s for %s' % (index_name, table_name))
+        cc_dynamodb._update_index_when_active(db_table, lambda: db_table.create_global_secondary_index(index),
+                                              done_marker='already exists', timeout=timeout)
+
+    for index_name in table_plan.delete_indexes:
+        logger.info('Deleting GSI %s for %s' % (index_name, table_name))
+        cc_dynamodb._update_index_when_active(db_table, lambda: db_table.delete_global_secondary_index(index_name),
+                                              done_marker='ResourceNotFoundException', timeout=timeout)
+    return db_table
+
+
+def apply(plans, concurrency=DEFAULT_CONCURRENCY, timeout=cc_dynamodb.UPDATE_TABLE_TIMEOUT):
+    """Apply the TablePlans that have changes, `concurrency` tables at a time.
+
+    Each plan is carried out as reviewed: the tables are not diffed again, so changes made
+    since plan() are not picked up. Nothing is applied if any plan has a schema_error:
+    a primary key cannot be changed.
+
+    :return: {table_name: boto Table} for the tables that were changed
+    """
+    schema_errors = dict((table_plan.table_name, cc_dynamodb.UpdateTableException(table_plan.schema_error))
+                         for table_plan in plans if table_plan.schema_error)
+    if schema_errors:
+        raise MigrationException('Mismatched schema for tables: %s' % ', '.join(sorted(schema_errors)),
+                                 errors=schema_errors)
+
+    plans_by_name = dict((table_plan.table_name, table_plan) for table_plan in plans if table_plan.has_changes)
+    for table_plan in plans_by_name.values():
+        logger.info('cc_dynamodb.migrations.apply: %r' % table_plan)
+    return run_per_table(lambda table_name: _apply_table_plan(plans_by_name[table_name], timeout),
+                         sorted(plans_by_name), concurrency=concurrency)
+
+
+def _provision(table_names, start, is_done, concurrency, timeout):
+    """Run start(table_name) for up to `concurrency` tables at a time, until is_done(table_name).
+
+    A single poller checks all the running tables in each round, starting the
+    next pending tables as others finish, and backs off while none finish.
+
+    :return: {table_name: seconds from start until done}
+    """
+    pending = list(table_names)
+    running = {}  # table_name -> time started
+    timings = {}
+    errors = {}
+    deadline = time.time() + timeout
+    delay = cc_dynamodb.POLL_MIN_DELAY
+    while pending or running:
+        while pending and len(running) < concurrency:
+            table_name = pending.pop(0)
+            try:
+                start(table_name)
+                running[table_name] = time.time()
+            except Exception:
+                errors[table_name] = sys.exc_info()[1]
+
+        finished = False
+        for table_name in sorted(running):
+            try:
+                done = is_done(table_name)
+            except Exception:
+                errors[table_name] = sys.exc_info()[1]
+                del running[table_name]
+                continue
+            if done:
+                timings[table_name] = time.time() - running.pop(table_name)
+                logger.info('cc_dynamodb.migrations: %s done in %.1fs' % (table_name, timings[table_name]))
+                finished = True
+
+        if not (pending or running):
+            break
+        if time.time() + delay > deadline:
+            for table_name in list(running) + pending:
+                errors[table_name] = cc_dynamodb.UpdateTableException('Timed out waiting for %s' % table_name)
+            break
+        delay = cc_dynamodb.POLL_MIN_DELAY if finished else min(delay * 2, cc_dynamodb.POLL_MAX_DELAY)
+        _sleep(delay)
+
+    if errors:
+        for table_name, error in sorted(errors.items()):
+            logger.error('cc_dynamodb.migrations: %s failed: %s' % (table_name, error))
+        raise MigrationException('Failed for tables: %s' % ', '.join(sorted(errors)), errors=errors)
+    return timings
+
+
+def _describe_or_none(connection, namespaced_table_name):
+    try:
+        return connection.describe_table(namespaced_table_name)
+    except JSONResponseError as e:
+        if e.status == 400 and e.error_code == 'ResourceNotFoundException':
+            return None
+        raise
+
+
+def create_all_tables(table_names=None, throughput=False, concurrency=DEFAULT_PROVISION_CONCURRENCY,
+                      timeout=cc_dynamodb.UPDATE_TABLE_TIMEOUT):
+    """Create tables (default: all configured) and wait until they are all ACTIVE.
+
+    At most `concurrency` tables are being created at once. Tables that already
+    exist are only waited on.
+
+    :return: {table_name: seconds until ACTIVE}
+    """
+    if table_names is None:
+        table_names = cc_dynamodb.list_table_names()
+    connection = cc_dynamodb.get_connection()
+
+    def start(table_name):
+        try:
+            cc_dynamodb.create_table(table_name, connection=connection, throughput=throughput)
+        except cc_dynamodb.TableAlreadyExistsException:
+            pass
+
+    def is_active(table_name):
+        table_metadata = _describe_or_none(connection, cc_dynamodb.get_table_name(table_name))
+        return table_metadata is not None and cc_dynamodb._is_active(table_metadata)
+
+    return _provision(sorted(table_names), start, is_active, concurrency, timeout)
+
+
+def list_namespace_tables(prefix=None):
+    """Names of the existing tables starting with prefix (default: the configured namespace)."""
+    if prefix is None:
+        prefix = cc_dynamodb.get_config().namespace
+    connection = cc_dynamodb.get_connection()
+    table_names = []
+    start_table_name = None
+    while True:
+        response = connection.list_tables(exclusive_start_table_name=start_table_name)
+        table_names.extend(name for name in response.get('TableNames', []) if name.startswith(prefix))
+        start_table_name = response.get('LastEvaluatedTableName')
+        if not start_table_name:
+            return table_names
+
+
+def delete_all_tables(prefix=None, concurrency=DEFAULT_PROVISION_CONCURRENCY, timeout=cc_dynamodb.UPDATE_TABLE_TIMEOUT):
+    """Delete every existing table starting with prefix (default: the configured namespace), and wait until gone.
+
+    Unlike the other functions here, this includes tables that are not configured.
+
+    :return: {namespaced table name: seconds until deleted}
+    """
+    if prefix is None:
+        prefix = cc_dynamodb.get_config().namespace
+    if not prefix:
+        raise ValueError('Refusing to delete all tables without a namespace prefix')
+    connection = cc_dynamodb.get_connection()
+
+    def start(table_name):
+        try:
+            connection.delete_table(table_name)
+        except JSONResponseError as e:
+            if not (e.status == 400 and e.error_code == 'ResourceNotFoundException'):
+                raise
+
+    def is_deleted(table_name):
+        return _describe_or_none(connection, table_name) is None
+
+    return _provision(list_namespace_tables(prefix), start, is_deleted, concurrency, timeout)
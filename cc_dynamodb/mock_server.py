@@ -0,0 +1,231 @@
+"""A local DynamoDB stand-in: an HTTP server speaking the DynamoDB JSON API, served from memory.
+
+The requests are handled by a MemoryConnection (see cc_dynamodb.mock_store), so
+index queries, filters and pagination are as fast as with the in-process mocks,
+but one server can be shared by several processes, e.g. pytest-xdist workers.
+Clients reach it through the usual CC_DYNAMODB_HOST / CC_DYNAMODB_PORT settings,
+each with its own namespace (worker_namespace()) so their tables do not collide.
+
+    # conftest.py
+    DATASET = MockDataset({'nps_survey': [...]})
+
+    def pytest_configure(config):
+        if not hasattr(config, 'workerinput'):  # xdist controller, or a run without xdist
+            cc_dynamodb.set_config(table_config=CONFIG_PATH, namespace='mock_server_', ...)
+            server = mock_server.start_server(dataset=DATASET)
+            os.environ['CC_DYNAMODB_HOST'] = server.host
+            os.environ['CC_DYNAMODB_PORT'] = str(server.port)
+
+    @pytest.fixture
+    def dynamodb():
+        cc_dynamodb.set_config(table_config=CONFIG_PATH, namespace=mock_server.worker_namespace(), ...)
+        mock_server.reset()  # a fresh copy of DATASET in this worker's namespace
+
+Or run it on its own:
+
+    python -m cc_dynamodb.mock_server --table-config dynamodb.yml --port 8000
+
+The server only knows the configured tables: a namespaced table name is matched
+to the longest configured name it ends with.
+"""
+import argparse
+import json
+import os
+import re
+import threading
+import zlib
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:  # Python 3
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+from boto.dynamodb2 import exceptions
+from boto.exception import JSONResponseError
+
+import cc_dynamodb
+from .log import create_logger
+from .mock_store import _error, MemoryConnection
+
+
+logger = create_logger('mock_server')
+
+OPERATIONS = frozenset([
+    'CreateTable', 'DescribeTable', 'UpdateTable', 'DeleteTable', 'ListTables',
+    'GetItem', 'PutItem', 'UpdateItem', 'DeleteItem', 'BatchGetItem', 'BatchWriteItem',
+    'Query', 'Scan',
+])
+RESET_OPERATION = 'ResetNamespace'  # not a DynamoDB operation, see reset()
+
+
+def _snake_case(name):
+    return re.sub(r'(?<!^)(?=[A-Z])', '_', name).lower()
+
+
+class ServerConnection(MemoryConnection):
+    """A MemoryConnection for the tables of any namespace.
+
+    With a MockDataset, each namespace starts with a copy-on-write snapshot of
+    its tables, taken on the first request for that namespace.
+    """
+
+    def __init__(self, store=None, dataset=None):
+        super(ServerConnection, self).__init__(store)
+        self.dataset = dataset
+        self.namespaces = set()
+
+    def split_table_name(self, table_name):
+        """(namespace, configured table name) of a namespaced table name."""
+        for name in sorted(cc_dynamodb.list_table_names(), key=len, reverse=True):
+            if table_name.endswith(name):
+                return table_name[:-len(name)], name
+        raise _error(exceptions.ResourceNotFoundException, 'Requested resource not found: Table: %s not found'
+                     % table_name)
+
+    def reverse_table_name(self, table_name):
+        return self.split_table_name(table_name)[1]
+
+    def _seed(self, namespace):
+        self.namespaces.add(namespace)
+        if self.dataset is None:
+            return
+        snapshot = self.dataset.snapshot()
+        for table_name in self.dataset.data:
+            self.store.tables[namespace + table_name] = snapshot[cc_dynamodb.get_table_name(table_name)].snapshot()
+
+    def reset_namespace(self, namespace):
+        """Drop the tables of a namespace, and seed it again from the dataset."""
+        for table_name in list(self.store.tables):
+            if self.split_table_name(table_name)[0] == namespace:
+                del self.store.tables[table_name]
+        self._seed(namespace)
+        return {}
+
+    def call(self, operation, params):
+        """Serve one request, the operation name (X-Amz-Target) and its JSON parameters."""
+        if operation == RESET_OPERATION:
+            return self.reset_namespace(params['Namespace'])
+        if operation not in OPERATIONS:
+            raise _error(exceptions.ValidationException, 'Operation not supported: %s' % operation)
+        for table_name in [params.get('TableName')] + sorted(params.get('RequestItems') or ()):
+            if table_name:
+                namespace = self.split_table_name(table_name)[0]
+                if namespace not in self.namespaces:
+                    self._seed(namespace)
+        kwargs = dict((_snake_case(name), value) for name, value in params.items())
+        return getattr(self, _snake_case(operation))(**kwargs)
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # boto keeps its connections alive
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        operation = (self.headers.get('X-Amz-Target') or '').rsplit('.', 1)[-1]
+        status, response = self.server.serve(operation, body)
+        payload = json.dumps(response).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/x-amz-json-1.0')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('x-amz-crc32', str(zlib.crc32(payload) & 0xffffffff))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        logger.debug('cc_dynamodb.mock_server: ' + format % args)
+
+
+class MockServer(ThreadingMixIn, HTTPServer):
+    """Serves the DynamoDB API on (host, port), port 0 picks a free one.
+
+    Requests are handled one at a time, the MemoryStore is not thread-safe.
+    """
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, dataset=None, store=None):
+        HTTPServer.__init__(self, (host, port), _RequestHandler)
+        self.connection = ServerConnection(store, dataset=dataset)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def host(self):
+        return self.server_address[0]
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def serve(self, operation, body):
+        """(HTTP status, JSON response) for a request."""
+        try:
+            params = json.loads(body.decode('utf-8')) if body else {}
+            with self._lock:
+                return 200, self.connection.call(operation, params)
+        except JSONResponseError as e:
+            return e.status, e.body
+        except cc_dynamodb.UnknownTableException as e:
+            error = _error(exceptions.ResourceNotFoundException, str(e))
+        except NotImplementedError as e:
+            error = _error(exceptions.ValidationException, str(e))
+        except Exception as e:
+            logger.exception('cc_dynamodb.mock_server: %s failed' % operation)
+            # Also a 400, so boto raises it at once instead of retrying.
+            error = _error(exceptions.ValidationException, '%s: %s' % (e.__class__.__name__, e))
+        return error.status, error.body
+
+    def start(self):
+        """Serve from a daemon thread, return self."""
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def start_server(host='127.0.0.1', port=0, dataset=None):
+    """Start a MockServer in a background thread of this process. The config must be set."""
+    return MockServer(host, port, dataset=dataset).start()
+
+
+def worker_namespace(prefix='test_'):
+    """A namespace per pytest-xdist worker ('test_gw0_'), or prefix when not run by xdist."""
+    worker = os.environ.get('PYTEST_XDIST_WORKER')
+    if worker:
+        return '%s%s_' % (prefix, worker)
+    return prefix
+
+
+def reset(namespace=None):
+    """Drop the server's tables of a namespace (default: the configured one), and re-seed its dataset."""
+    namespace = namespace or cc_dynamodb.get_config().namespace
+    cc_dynamodb.get_connection().make_request(RESET_OPERATION, json.dumps({'Namespace': namespace}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--table-config', required=True, help='dynamodb.yml of the clients')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+
+    # The namespace and credentials are the clients', these only satisfy set_config.
+    cc_dynamodb.set_config(table_config=args.table_config, namespace='mock_server_',
+                           aws_access_key_id='', aws_secret_access_key='')
+    server = MockServer(args.host, args.port)
+    logger.info('cc_dynamodb.mock_server: serving on %s:%s' % (server.host, server.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
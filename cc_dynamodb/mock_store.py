@@ -0,0 +1,648 @@
+"""In-memory, indexed tables, used by cc_dynamodb.mocks.
+
+Each index keeps, per hash key value, its items sorted by range key, so a query
+is a dict lookup plus a bisection instead of a scan, filter and sort. Filter
+conditions are compiled once per request into predicates, and evaluated a page
+at a time over columns of decoded attribute values.
+
+MemoryConnection serves the DynamoDB API calls boto makes from a MemoryStore,
+for mocked tables that do not go through moto at all (see mocks.MockDataset).
+"""
+from bisect import bisect_left, bisect_right
+from decimal import Decimal
+import operator
+
+from boto.dynamodb2 import exceptions, types
+from boto.dynamodb2.types import Dynamizer
+
+import cc_dynamodb
+
+
+_ORDERED_OPERATORS = {
+    'EQ': operator.eq,
+    'LT': operator.lt,
+    'LE': operator.le,
+    'GT': operator.gt,
+    'GE': operator.ge,
+}
+
+
+def _typed(compare, *operands):
+    def predicate(value):
+        if value is None:
+            return False
+        try:
+            return compare(value, *operands)
+        except (TypeError, AttributeError):
+            # The attribute has another type than the operands, e.g. a string and a number.
+            return False
+    return predicate
+
+
+def compile_condition(comparison_operator, values):
+    """Predicate on a decoded attribute value (None if missing) for a condition.
+
+    Any of boto's QUERY_OPERATORS or FILTER_OPERATORS, with decoded `values`.
+    """
+    if comparison_operator == 'NULL':
+        return lambda value: value is None
+    if comparison_operator == 'NOT_NULL':
+        return lambda value: value is not None
+    if comparison_operator == 'NE':
+        return lambda value: value != values[0]
+    if comparison_operator == 'IN':
+        return lambda value: value is not None and value in values
+    if comparison_operator in _ORDERED_OPERATORS:
+        return _typed(_ORDERED_OPERATORS[comparison_operator], values[0])
+    if comparison_operator == 'BETWEEN':
+        return _typed(lambda value, low, high: low <= value <= high, values[0], values[1])
+    if comparison_operator == 'BEGINS_WITH':
+        return _typed(lambda value, prefix: isinstance(value, type(prefix)) and value.startswith(prefix),
+                      values[0])
+    if comparison_operator == 'CONTAINS':
+        return _typed(lambda value, operand: operand in value, values[0])
+    if comparison_operator == 'NOT_CONTAINS':
+        return _typed(lambda value, operand: operand not in value, values[0])
+    raise NotImplementedError('Condition of type: %s not supported yet' % comparison_operator)
+
+
+def range_slice(range_values, comparison_operator, values):
+    """Return the (start, stop) of range_values (sorted) matching the condition."""
+    if comparison_operator == 'EQ':
+        return bisect_left(range_values, values[0]), bisect_right(range_values, values[0])
+    if comparison_operator == 'LT':
+        return 0, bisect_left(range_values, values[0])
+    if comparison_operator == 'LE':
+        return 0, bisect_right(range_values, values[0])
+    if comparison_operator == 'GT':
+        return bisect_right(range_values, values[0]), len(range_values)
+    if comparison_operator == 'GE':
+        return bisect_left(range_values, values[0]), len(range_values)
+    if comparison_operator == 'BETWEEN':
+        return bisect_left(range_values, values[0]), bisect_right(range_values, values[1])
+    if comparison_operator == 'BEGINS_WITH':
+        # Values with the prefix sort right after it, and before anything else greater than it.
+        start = stop = bisect_left(range_values, values[0])
+        while stop < len(range_values) and range_values[stop].startswith(values[0]):
+            stop += 1
+        return start, stop
+    raise NotImplementedError('Query of type: %s not supported yet' % comparison_operator)
+
+
+def _after(entries, sort_values, sort_value, primary_key, reverse):
+    """(start, stop) of the entries left after an exclusive start key, in the query direction."""
+    start, stop = bisect_left(sort_values, sort_value), bisect_right(sort_values, sort_value)
+    for position in range(start, stop):
+        if entries[position][1] == primary_key:
+            start, stop = position, position + 1
+            break
+    # When the item was deleted since, this continues after all items with its sort value.
+    if reverse:
+        return 0, start
+    return stop, len(entries)
+
+
+class SortedIndex(object):
+    """Maps hash key value -> primary keys, sorted by range key value.
+
+    Items missing the hash (or range) key are not in the index, like a sparse GSI.
+    Without a range key, items are kept in primary key order.
+    """
+
+    def __init__(self, hash_key, range_key=None):
+        self.hash_key = hash_key
+        self.range_key = range_key
+        # hash value -> ([(range value, primary key)], [range value]), kept in the same order
+        self.buckets = {}
+
+    def copy(self):
+        index = SortedIndex(self.hash_key, self.range_key)
+        index.buckets = dict((hash_value, (list(entries), list(range_values)))
+                             for hash_value, (entries, range_values) in self.buckets.items())
+        return index
+
+    def _sort_value(self, primary_key, keys):
+        if self.range_key is None:
+            return primary_key
+        return keys.get(self.range_key)
+
+    def add(self, primary_key, keys):
+        hash_value = keys.get(self.hash_key)
+        sort_value = self._sort_value(primary_key, keys)
+        if hash_value is None or sort_value is None:
+            return
+        entries, range_values = self.buckets.setdefault(hash_value, ([], []))
+        position = bisect_right(range_values, sort_value)
+        entries.insert(position, (sort_value, primary_key))
+        range_values.insert(position, sort_value)
+
+    def remove(self, primary_key, keys):
+        bucket = self.buckets.get(keys.get(self.hash_key))
+        sort_value = self._sort_value(primary_key, keys)
+        if bucket is None or sort_value is None:
+            return
+        entries, range_values = bucket
+        start, stop = bisect_left(range_values, sort_value), bisect_right(range_values, sort_value)
+        for position in range(start, stop):
+            if entries[position][1] == primary_key:
+                del entries[position]
+                del range_values[position]
+                break
+        if not entries:
+            del self.buckets[keys.get(self.hash_key)]
+
+    def _buckets(self, hash_condition):
+        if hash_condition is None:
+            return list(self.buckets.values())
+        comparison_operator, values = hash_condition
+        if comparison_operator == 'EQ':
+            bucket = self.buckets.get(values[0])
+            return [bucket] if bucket else []
+        matches = compile_condition(comparison_operator, values)
+        return [bucket for hash_value, bucket in self.buckets.items() if matches(hash_value)]
+
+    def _slices(self, hash_condition, range_condition):
+        for entries, range_values in self._buckets(hash_condition):
+            if range_condition is None:
+                yield entries, range_values
+            else:
+                start, stop = range_slice(range_values, *range_condition)
+                yield entries[start:stop], range_values[start:stop]
+
+    def entries(self, hash_condition=None, range_condition=None):
+        """([(sort value, primary key)], [sort value]) matching the conditions, in ascending order.
+
+        Conditions are (comparison operator, decoded values) tuples.
+        """
+        slices = list(self._slices(hash_condition, range_condition))
+        if len(slices) == 1:
+            return slices[0]
+        # Only when the hash key condition is not EQ, which DynamoDB itself does not allow.
+        entries = sorted((entry for entries, _ in slices for entry in entries), key=operator.itemgetter(0))
+        return entries, [sort_value for sort_value, _ in entries]
+
+    def primary_keys(self, hash_condition=None, range_condition=None, reverse=False):
+        entries, _ = self.entries(hash_condition, range_condition)
+        if reverse:
+            entries = reversed(entries)
+        return [primary_key for _, primary_key in entries]
+
+    def count(self, hash_condition=None, range_condition=None):
+        return sum(len(entries) for entries, _ in self._slices(hash_condition, range_condition))
+
+
+class MemoryTable(object):
+    """Raw (wire format) items of one table, plus a SortedIndex per configured index.
+
+    The index named None is the table's own primary key. Attributes used in
+    filters are also kept decoded, one {primary key: value} column per attribute.
+    """
+
+    def __init__(self, table_name, decode):
+        table_config = cc_dynamodb._get_table_config(table_name)
+        self.decode = decode
+        self.key_names = tuple(key['name'] for key in table_config.schema)
+        self.items = {}
+        self.indexes = {None: SortedIndex(self.key_names[0], self.key_names[1] if len(self.key_names) > 1 else None)}
+        key_attributes = set(self.key_names)
+        for index_name, (hash_keys, range_keys) in table_config.index_keys.items():
+            self.indexes[index_name] = SortedIndex(hash_keys[0] if hash_keys else None,
+                                                   range_keys[0] if range_keys else None)
+            key_attributes.update(hash_keys + range_keys)
+        self.key_attributes = tuple(key_attributes)
+        self.columns = {}
+        self._sorted_keys = None
+        self._shared = False
+
+    def snapshot(self):
+        """A copy sharing this table's data until either of them is written to. O(1)."""
+        snapshot = object.__new__(MemoryTable)
+        snapshot.__dict__.update(self.__dict__)
+        self._shared = snapshot._shared = True
+        return snapshot
+
+    def _before_write(self):
+        if self._shared:
+            self.items = dict(self.items)
+            self.indexes = dict((index_name, index.copy()) for index_name, index in self.indexes.items())
+            self.columns = {}  # rebuilt on use
+            self._shared = False
+        self._sorted_keys = None
+
+    def _keys(self, raw_item):
+        return dict((name, self.decode(raw_item[name])) for name in self.key_attributes if name in raw_item)
+
+    def _primary_key(self, keys):
+        return tuple(keys.get(name) for name in self.key_names)
+
+    def key_of(self, raw_item):
+        """The primary key tuple of a raw item (or raw key)."""
+        return self._primary_key(self._keys(raw_item))
+
+    def get(self, raw_key):
+        existing = self.items.get(self.key_of(raw_key))
+        return existing[0] if existing is not None else None
+
+    def put(self, raw_item):
+        keys = self._keys(raw_item)
+        primary_key = self._primary_key(keys)
+        self._before_write()
+        self.delete_key(primary_key)
+        self.items[primary_key] = (raw_item, keys)
+        for index in self.indexes.values():
+            index.add(primary_key, keys)
+        for name, column in self.columns.items():
+            if name in raw_item:
+                column[primary_key] = self.decode(raw_item[name])
+
+    def delete(self, raw_key):
+        self.delete_key(self._primary_key(self._keys(raw_key)))
+
+    def delete_key(self, primary_key):
+        if primary_key not in self.items:
+            return
+        self._before_write()
+        existing = self.items.pop(primary_key, None)
+        if existing is not None:
+            for index in self.indexes.values():
+                index.remove(primary_key, existing[1])
+            for column in self.columns.values():
+                column.pop(primary_key, None)
+
+    def column(self, name):
+        """{primary key: decoded value} of an attribute, for the items that have it."""
+        column = self.columns.get(name)
+        if column is None:
+            decode = self.decode
+            column = self.columns[name] = dict((primary_key, decode(raw_item[name]))
+                                               for primary_key, (raw_item, _) in self.items.items()
+                                               if name in raw_item)
+        return column
+
+    def filter_keys(self, primary_keys, conditions=None, conditional_operator=None):
+        """The primary keys, in order, of the items matching the filter conditions.
+
+        conditions is {attribute name: predicate}, see compile_condition. Each one is
+        evaluated over the whole batch of keys against the attribute's column,
+        so values are decoded once per item rather than once per comparison.
+        """
+        if not conditions:
+            return primary_keys
+        if conditional_operator == 'OR':
+            matched = set()
+            for name, predicate in conditions.items():
+                column = self.column(name)
+                matched.update(primary_key for primary_key in primary_keys if predicate(column.get(primary_key)))
+            return [primary_key for primary_key in primary_keys if primary_key in matched]
+        for name, predicate in conditions.items():
+            column = self.column(name)
+            primary_keys = [primary_key for primary_key in primary_keys if predicate(column.get(primary_key))]
+        return primary_keys
+
+    def _page(self, primary_keys, more, key_names, conditions, conditional_operator):
+        last_key = None
+        if more and primary_keys:
+            raw_item = self.items[primary_keys[-1]][0]
+            last_key = dict((name, raw_item[name]) for name in key_names if name in raw_item)
+        matched = self.filter_keys(primary_keys, conditions, conditional_operator)
+        return [self.items[primary_key][0] for primary_key in matched], len(primary_keys), last_key
+
+    def query_page(self, index_name, hash_condition=None, range_condition=None, reverse=False, limit=None,
+                   exclusive_start_key=None, conditions=None, conditional_operator=None):
+        """One page of a query: (raw items, count of items evaluated, raw last evaluated key or None).
+
+        As in DynamoDB, `limit` caps the items evaluated, before the filter
+        `conditions` (see filter_keys) are applied.
+        """
+        index = self.indexes[index_name]
+        entries, sort_values = index.entries(hash_condition, range_condition)
+        start, stop = 0, len(entries)
+        if exclusive_start_key:
+            keys = self._keys(exclusive_start_key)
+            primary_key = self._primary_key(keys)
+            start, stop = _after(entries, sort_values, index._sort_value(primary_key, keys), primary_key, reverse)
+        more = bool(limit) and stop - start > limit
+        if reverse:
+            page = entries[stop - limit:stop] if more else entries[start:stop]
+            page.reverse()
+        else:
+            page = entries[start:start + limit] if more else entries[start:stop]
+        key_names = self.key_names + tuple(name for name in (index.hash_key, index.range_key)
+                                           if name and name not in self.key_names)
+        return self._page([primary_key for _, primary_key in page], more, key_names,
+                          conditions, conditional_operator)
+
+    def scan_page(self, limit=None, exclusive_start_key=None, segment=None, total_segments=None,
+                  conditions=None, conditional_operator=None):
+        """One page of a scan, in primary key order; see query_page."""
+        if self._sorted_keys is None:
+            self._sorted_keys = sorted(self.items)
+        primary_keys = self._sorted_keys
+        if total_segments:
+            primary_keys = primary_keys[segment::total_segments]
+        start = 0
+        if exclusive_start_key:
+            start = bisect_right(primary_keys, self.key_of(exclusive_start_key))
+        more = bool(limit) and len(primary_keys) - start > limit
+        page = primary_keys[start:start + limit] if more else primary_keys[start:]
+        return self._page(page, more, self.key_names, conditions, conditional_operator)
+
+    def query(self, index_name, hash_condition=None, range_condition=None, reverse=False):
+        """Raw items from the index matching the conditions, sorted by range key."""
+        primary_keys = self.indexes[index_name].primary_keys(hash_condition, range_condition, reverse=reverse)
+        return [self.items[primary_key][0] for primary_key in primary_keys]
+
+    def count(self, index_name, hash_condition=None, range_condition=None):
+        return self.indexes[index_name].count(hash_condition, range_condition)
+
+
+class MemoryStore(object):
+    """MemoryTables for the mocked tables, loaded with a scan on first use.
+
+    While mock_query_2 is active, writes made through any DynamoDBConnection
+    update or invalidate the copy.
+    """
+
+    def __init__(self):
+        self.tables = {}
+
+    def get(self, db_table):
+        memory_table = self.tables.get(db_table.table_name)
+        if memory_table is None:
+            memory_table = self._load(db_table)
+            self.tables[db_table.table_name] = memory_table
+        return memory_table
+
+    def _load(self, db_table):
+        memory_table = MemoryTable(cc_dynamodb.get_reverse_table_name(db_table.table_name),
+                                   decode=db_table._dynamizer.decode)
+        start_key = None
+        while True:
+            response = db_table.connection.scan(db_table.table_name, exclusive_start_key=start_key)
+            for raw_item in response.get('Items', []):
+                memory_table.put(raw_item)
+            start_key = response.get('LastEvaluatedKey')
+            if not start_key:
+                return memory_table
+
+    def put(self, table_name, raw_item):
+        if table_name in self.tables:
+            self.tables[table_name].put(raw_item)
+
+    def delete(self, table_name, raw_key):
+        if table_name in self.tables:
+            self.tables[table_name].delete(raw_key)
+
+    def invalidate(self, table_name):
+        self.tables.pop(table_name, None)
+
+    def snapshot(self):
+        """Copy-on-write copies of all tables, see MemoryTable.snapshot."""
+        return dict((table_name, memory_table.snapshot()) for table_name, memory_table in self.tables.items())
+
+    def restore(self, snapshot):
+        self.tables = dict((table_name, memory_table.snapshot()) for table_name, memory_table in snapshot.items())
+
+
+def _error(exception_class, message):
+    return exception_class(400, 'Bad Request', body={
+        '__type': 'com.amazonaws.dynamodb.v20120810#%s' % exception_class.__name__,
+        'message': message,
+    })
+
+
+def _project(raw_item, attributes_to_get):
+    if not attributes_to_get:
+        return raw_item
+    return dict((name, value) for name, value in raw_item.items() if name in attributes_to_get)
+
+
+def _add(current, value):
+    """AttributeUpdates ADD of wire values: numbers are summed, sets are merged."""
+    if current is None:
+        return value
+    (value_type, operand), = value.items()
+    if value_type == 'N':
+        return {'N': str(Decimal(current['N']) + Decimal(operand))}
+    return {value_type: sorted(set(current[value_type]) | set(operand))}
+
+
+class MemoryConnection(object):
+    """Stands in for boto's DynamoDBConnection (layer1), serving requests from a MemoryStore.
+
+    Tables are configured tables only, referred to by namespaced name. Supports
+    what boto's Table and this package use: items, batches, and queries and
+    scans with all key conditions, filters, Limit and pagination.
+    """
+
+    def __init__(self, store=None):
+        self.store = store or MemoryStore()
+        self.dynamizer = Dynamizer()
+
+    def _table(self, table_name):
+        memory_table = self.store.tables.get(table_name)
+        if memory_table is None:
+            raise _error(exceptions.ResourceNotFoundException, 'Requested resource not found: Table: %s not found'
+                         % table_name)
+        return memory_table
+
+    def reverse_table_name(self, table_name):
+        """The configured table name of a namespaced one."""
+        return cc_dynamodb.get_reverse_table_name(table_name)
+
+    def add_table(self, table_name):
+        """Create an empty MemoryTable for a namespaced table name, and return it."""
+        memory_table = MemoryTable(self.reverse_table_name(table_name), decode=self.dynamizer.decode)
+        self.store.tables[table_name] = memory_table
+        return memory_table
+
+    # Tables
+
+    def create_table(self, table_name, *args, **kwargs):
+        if table_name in self.store.tables:
+            raise _error(exceptions.ResourceInUseException, 'Table already exists: %s' % table_name)
+        self.add_table(table_name)
+        return self.describe_table(table_name)
+
+    def describe_table(self, table_name):
+        memory_table = self._table(table_name)
+        table_config = cc_dynamodb._get_table_config(self.reverse_table_name(table_name))
+        default_throughput = cc_dynamodb.get_config().yaml.get('default_throughput') or {}
+
+        def key_schema(parts):
+            return [dict(AttributeName=part['name'], KeyType='HASH' if part['type'] == 'HashKey' else 'RANGE')
+                    for part in parts]
+
+        def throughput(configured):
+            configured = configured or default_throughput
+            return dict(ReadCapacityUnits=configured.get('read', 0), WriteCapacityUnits=configured.get('write', 0))
+
+        attribute_types = {}
+        for part in list(table_config.schema) + [part for index in table_config.indexes_by_name.values()
+                                                 for part in index.get('parts', ())]:
+            attribute_types[part['name']] = getattr(types, part['data_type'])
+        description = dict(
+            TableName=table_name,
+            TableStatus='ACTIVE',
+            ItemCount=len(memory_table.items),
+            KeySchema=key_schema(table_config.schema),
+            AttributeDefinitions=[dict(AttributeName=name, AttributeType=attribute_type)
+                                  for name, attribute_type in sorted(attribute_types.items())],
+            ProvisionedThroughput=throughput(None),
+        )
+        if table_config.global_indexes:
+            description['GlobalSecondaryIndexes'] = [
+                dict(IndexName=index['name'], IndexStatus='ACTIVE', KeySchema=key_schema(index['parts']),
+                     Projection=dict(ProjectionType='ALL'), ProvisionedThroughput=throughput(index.get('throughput')))
+                for index in table_config.global_indexes]
+        if table_config.indexes:
+            description['LocalSecondaryIndexes'] = [
+                dict(IndexName=index['name'], KeySchema=key_schema(index['parts']),
+                     Projection=dict(ProjectionType='ALL'))
+                for index in table_config.indexes]
+        return dict(Table=description)
+
+    def update_table(self, table_name, *args, **kwargs):
+        return self.describe_table(table_name)
+
+    def delete_table(self, table_name):
+        description = self.describe_table(table_name)
+        del self.store.tables[table_name]
+        return description
+
+    def list_tables(self, exclusive_start_table_name=None, limit=None):
+        return dict(TableNames=sorted(self.store.tables))
+
+    # Items
+
+    def get_item(self, table_name, key, attributes_to_get=None, consistent_read=None, **kwargs):
+        raw_item = self._table(table_name).get(key)
+        if raw_item is None:
+            return {}
+        return dict(Item=_project(raw_item, attributes_to_get))
+
+    def put_item(self, table_name, item, expected=None, conditional_operator=None, **kwargs):
+        memory_table = self._table(table_name)
+        self._check_expected(memory_table.get(item), expected, conditional_operator)
+        memory_table.put(item)
+        return {}
+
+    def update_item(self, table_name, key, attribute_updates=None, expected=None, conditional_operator=None,
+                    **kwargs):
+        memory_table = self._table(table_name)
+        existing = memory_table.get(key)
+        self._check_expected(existing, expected, conditional_operator)
+        raw_item = dict(existing or key)
+        for name, update in (attribute_updates or {}).items():
+            action = update.get('Action', 'PUT')
+            if action == 'PUT':
+                raw_item[name] = update['Value']
+            elif action == 'ADD':
+                raw_item[name] = _add(raw_item.get(name), update['Value'])
+            elif action == 'DELETE' and 'Value' in update and name in raw_item:
+                (value_type, operand), = update['Value'].items()
+                remaining = sorted(set(raw_item[name][value_type]) - set(operand))
+                if remaining:
+                    raw_item[name] = {value_type: remaining}
+                else:
+                    del raw_item[name]
+            else:
+                raw_item.pop(name, None)
+        memory_table.put(raw_item)
+        return {}
+
+    def delete_item(self, table_name, key, expected=None, conditional_operator=None, **kwargs):
+        memory_table = self._table(table_name)
+        self._check_expected(memory_table.get(key), expected, conditional_operator)
+        memory_table.delete(key)
+        return {}
+
+    def batch_get_item(self, request_items, **kwargs):
+        responses = {}
+        for table_name, request in request_items.items():
+            memory_table = self._table(table_name)
+            raw_items = (memory_table.get(key) for key in request['Keys'])
+            responses[table_name] = [_project(raw_item, request.get('AttributesToGet'))
+                                     for raw_item in raw_items if raw_item is not None]
+        return dict(Responses=responses, UnprocessedKeys={})
+
+    def batch_write_item(self, request_items, **kwargs):
+        for table_name, requests in request_items.items():
+            memory_table = self._table(table_name)
+            for request in requests:
+                if 'PutRequest' in request:
+                    memory_table.put(request['PutRequest']['Item'])
+                else:
+                    memory_table.delete(request['DeleteRequest']['Key'])
+        return dict(UnprocessedItems={})
+
+    # Queries
+
+    def _decoded_condition(self, condition):
+        if condition is None:
+            return None
+        return (condition['ComparisonOperator'],
+                [self.dynamizer.decode(value) for value in condition.get('AttributeValueList', [])])
+
+    def _check_expected(self, raw_item, expected, conditional_operator=None):
+        """The legacy Expected parameter: Exists/Value conditions, or ComparisonOperator ones like boto's."""
+        matches = []
+        for name, condition in (expected or {}).items():
+            value = raw_item.get(name) if raw_item else None
+            if 'ComparisonOperator' in condition:
+                predicate = compile_condition(*self._decoded_condition(condition))
+                matches.append(predicate(None if value is None else self.dynamizer.decode(value)))
+            elif condition.get('Exists') is False:
+                matches.append(value is None)
+            elif 'Value' in condition:
+                matches.append(value == condition['Value'])
+            else:
+                raise NotImplementedError('Expected condition %r not supported yet' % condition)
+        if matches and not (any(matches) if conditional_operator == 'OR' else all(matches)):
+            raise _error(exceptions.ConditionalCheckFailedException, 'The conditional request failed')
+
+    def _conditions(self, filters):
+        """Compile wire format filter conditions, once per request, into {attribute name: predicate}."""
+        return dict((name, compile_condition(*self._decoded_condition(condition)))
+                    for name, condition in (filters or {}).items())
+
+    def _response(self, page, select, attributes_to_get):
+        raw_items, scanned_count, last_key = page
+        response = dict(Count=len(raw_items), ScannedCount=scanned_count)
+        if select != 'COUNT':
+            response['Items'] = [_project(raw_item, attributes_to_get) for raw_item in raw_items]
+        if last_key:
+            response['LastEvaluatedKey'] = last_key
+        return response
+
+    def query(self, table_name, key_conditions=None, index_name=None, select=None, attributes_to_get=None,
+              limit=None, consistent_read=None, query_filter=None, conditional_operator=None,
+              scan_index_forward=None, exclusive_start_key=None, **kwargs):
+        memory_table = self._table(table_name)
+        index = memory_table.indexes.get(index_name)
+        if index is None:
+            raise _error(exceptions.ValidationException, 'The table does not have the specified index: %s'
+                         % index_name)
+        key_conditions = key_conditions or {}
+        if set(key_conditions) - set([index.hash_key, index.range_key]):
+            raise _error(exceptions.ValidationException, 'Query key condition not supported: %s'
+                         % ', '.join(sorted(key_conditions)))
+        hash_condition = self._decoded_condition(key_conditions.get(index.hash_key))
+        range_condition = self._decoded_condition(key_conditions.get(index.range_key))
+        if select == 'COUNT' and not (limit or query_filter or exclusive_start_key):
+            count = memory_table.count(index_name, hash_condition, range_condition)
+            return dict(Count=count, ScannedCount=count)
+        page = memory_table.query_page(index_name, hash_condition, range_condition,
+                                       reverse=scan_index_forward is False, limit=limit,
+                                       exclusive_start_key=exclusive_start_key,
+                                       conditions=self._conditions(query_filter),
+                                       conditional_operator=conditional_operator)
+        return self._response(page, select, attributes_to_get)
+
+    def scan(self, table_name, attributes_to_get=None, limit=None, select=None, scan_filter=None,
+             conditional_operator=None, exclusive_start_key=None, segment=None, total_segments=None, **kwargs):
+        page = self._table(table_name).scan_page(limit=limit, exclusive_start_key=exclusive_start_key,
+                                                 segment=segment, total_segments=total_segments,
+                                                 conditions=self._conditions(scan_filter),
+                                                 conditional_operator=conditional_operator)
+        return self._response(page, select, attributes_to_get)
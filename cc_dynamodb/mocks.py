@@ -1,19 +1,31 @@
-from decimal import Decimal
-import operator
+import functools
 
 from boto.dynamodb2 import table
-from boto.dynamodb2.types import QUERY_OPERATORS
+from boto.dynamodb2.layer1 import DynamoDBConnection
+from boto.dynamodb2.types import Dynamizer, QUERY_OPERATORS
 from mock import patch
 import moto.core.models
 
 import cc_dynamodb
+from .mock_store import MemoryConnection, MemoryStore
 
 
 __all__ = [
+    'MockDataset',
     'mock_query_2',
     'mock_table_with_data',
 ]
 
+# Indexed copy of the mocked tables, only while mock_query_2 is active.
+_memory_store = None
+
+# query_2 options, the other kwargs are key conditions.
+_QUERY_2_OPTIONS = ('limit', 'index', 'reverse', 'consistent', 'attributes', 'max_page_size', 'query_filter',
+                    'conditional_operator', 'scan_index_forward', 'exclusive_start_key')
+
+# boto's Table, before mock_query_2 patches it.
+_Table = table.Table
+
 
 def mock_table_with_data(table_name, data):
     '''Create a table and populate it with array of items from data.
@@ -33,61 +45,84 @@ def mock_table_with_data(table_name, data):
     return table
 
 
-class TableWithQuery2(table.Table):
-    @staticmethod
-    def _sorting_function(range_keys):
-        def sorter(obj):
-            return tuple([obj.get(range_key) for range_key in range_keys])
-        return sorter
-
-    @staticmethod
-    def _compare_func(a, b, comparison_operator, value_type):
-        operation = getattr(operator, comparison_operator.lower())
-        if value_type == 'N':
-            try:
-                a = Decimal(a)
-                b = Decimal(b)
-            except TypeError:
-                pass
-        return operation(a, b)
+def _put_item(table_name, item, *args, **kwargs):
+    _memory_store.put(table_name, item)
 
-    def _query_2_with_index(self, *args, **kwargs):
+
+def _delete_item(table_name, key, *args, **kwargs):
+    _memory_store.delete(table_name, key)
+
+
+def _update_item(table_name, key, *args, **kwargs):
+    _memory_store.invalidate(table_name)
+
+
+def _batch_write_item(request_items, *args, **kwargs):
+    # Unprocessed items may be retried later, so reload on the next query.
+    for table_name in request_items:
+        _memory_store.invalidate(table_name)
+
+
+# DynamoDBConnection writes, and how each one updates the memory copy (with the same arguments).
+_MEMORY_STORE_WRITES = {
+    'put_item': _put_item,
+    'delete_item': _delete_item,
+    'update_item': _update_item,
+    'batch_write_item': _batch_write_item,
+}
+
+
+def _synced_write(name):
+    """A DynamoDBConnection write method that also updates _memory_store once the write succeeded."""
+    write = getattr(DynamoDBConnection, name)
+    sync = _MEMORY_STORE_WRITES[name]
+
+    @functools.wraps(write)
+    def synced_write(self, *args, **kwargs):
+        result = write(self, *args, **kwargs)
+        if _memory_store is not None:
+            sync(*args, **kwargs)
+        return result
+    return synced_write
+
+
+class TableWithQuery2(table.Table):
+    def _memory_view(self):
+        """This table, served from the memory copy by a MemoryConnection."""
+        # Outside of mock_query_2 (e.g. the class used directly), load a throwaway copy.
+        store = _memory_store or MemoryStore()
+        store.get(self)
+        return _Table(self.table_name, schema=self.schema, indexes=self.indexes,
+                      global_indexes=self.global_indexes, connection=MemoryConnection(store))
+
+    def _check_index_query(self, kwargs):
         table_name = cc_dynamodb.get_reverse_table_name(self.table_name)
-        index = cc_dynamodb.get_table_index(table_name, kwargs.pop('index'))
-        valid_keys = [key['name'] for key in index['parts'] if key['type'] == 'HashKey']
-        if len(valid_keys) != 1:
-            raise ValueError('Need exactly 1 HashKey for table: %s, index: %s' % (table_name, index))
+        index_name = kwargs['index']
+        index_keys = cc_dynamodb.get_table_index_keys(table_name, index_name)
+        if index_keys is None:
+            raise ValueError('Unknown index for table: %s, index: %s' % (table_name, index_name))
+        hash_keys, range_keys = index_keys
+        if len(hash_keys) != 1:
+            raise ValueError('Need exactly 1 HashKey for table: %s, index: %s' % (
+                table_name, cc_dynamodb.get_table_index(table_name, index_name)))
 
-        range_keys = [key['name'] for key in index['parts'] if key['type'] == 'RangeKey']
-        valid_keys += range_keys
+        valid_keys = hash_keys + range_keys
 
-        # reverse is also not supported by moto
-        reverse = kwargs.pop('reverse', False)
         key_conditions = self._build_filters(
-            kwargs,
+            dict((key, value) for key, value in kwargs.items() if key not in _QUERY_2_OPTIONS),
             using=QUERY_OPERATORS
         )
         if set(key_conditions.keys()) - set(valid_keys):
             raise ValueError('Query by %s, only allowed %s' % (', '.join(key_conditions.keys()),
                                                                ', '.join(valid_keys)))
-        table = cc_dynamodb.get_table(table_name)
-        results = []
-        for obj in table.scan():
-            is_matching = True
-            for column, details in key_conditions.items():
-                if hasattr(operator, details['ComparisonOperator'].lower()):
-                    value = details['AttributeValueList'][0].values()[0]
-                    value_type = details['AttributeValueList'][0].keys()[0]
-                    if not self._compare_func(obj[column], value,
-                                              details['ComparisonOperator'], value_type):
-                        is_matching = False
-                else:
-                    raise NotImplementedError('Query of type: %s not supported yet' % details)
-            if is_matching:
-                results.append(obj)
-
-        for obj in sorted(results, key=self._sorting_function(range_keys=range_keys), reverse=reverse):
-            yield obj
+
+    def _query_2_with_index(self, *args, **kwargs):
+        # Neither are index queries, nor is reverse, supported by moto: boto's own
+        # query_2 (limit, query_filter, pagination) runs against the memory copy.
+        self._check_index_query(kwargs)
+        for item in self._memory_view().query_2(*args, **kwargs):
+            item.table = self
+            yield item
 
     def query_2(self, *args, **kwargs):
         """Implement query_2 for custom index.
@@ -108,7 +143,9 @@ class TableWithQuery2(table.Table):
         NOTE/WARNING/CAVEAT: This only works if there is only ONE index for a given name.
         """
         if 'index' in kwargs:
-            return len(list(self._query_2_with_index(*args, **kwargs)))
+            kwargs.pop('reverse', None)
+            self._check_index_query(kwargs)
+            return self._memory_view().query_count(*args, **kwargs)
         return super(TableWithQuery2, self).query_count(*args, **kwargs)
 
 
@@ -117,13 +154,31 @@ class MockQuery2(moto.core.models.MockAWS):
 
     def __init__(self, *args, **kwargs):
         self.patcher = patch('boto.dynamodb2.table.Table')
+        # Every write through a connection keeps the memory copy in sync: the mocked
+        # Tables', but also batch_write_item from cc_dynamodb.batch or a Table made earlier.
+        self.connection_patchers = [patch.object(DynamoDBConnection, name, _synced_write(name))
+                                    for name in sorted(_MEMORY_STORE_WRITES)]
 
     def start(self):
+        global _memory_store
+
         self.table = self.patcher.start()
         self.table.side_effect = TableWithQuery2
+        if MockQuery2.nested_count == 0:
+            _memory_store = MemoryStore()
+            for patcher in self.connection_patchers:
+                patcher.start()
+        MockQuery2.nested_count += 1
 
     def stop(self):
+        global _memory_store
+
         self.patcher.stop()
+        MockQuery2.nested_count -= 1
+        if MockQuery2.nested_count == 0:
+            _memory_store = None
+            for patcher in self.connection_patchers:
+                patcher.stop()
 
 
 def mock_query_2(func=None):
@@ -141,3 +196,78 @@ def mock_query_2(func=None):
         return MockQuery2()(func)
     else:
         return MockQuery2()
+
+
+class MockDataset(object):
+    """Populated mock tables, built once and restored in O(1) for each test.
+
+    data maps table names to lists of items, like mock_table_with_data. The
+    tables are built in memory on the first restore() (per namespace), and every
+    restore() then starts from a copy-on-write snapshot of them: a test only
+    pays for copying a table it writes to. Inside restore(), get_connection()
+    returns a MemoryConnection, so neither moto nor mock_query_2 is needed.
+
+        DATASET = MockDataset({'nps_survey': [...]})  # module level, shared by the session
+
+        @pytest.fixture
+        def dynamodb(fake_config):
+            with DATASET.restore() as connection:
+                yield connection
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self._snapshot = None
+        self._namespace = None
+
+    def _build(self):
+        connection = MemoryConnection()
+        dynamizer = Dynamizer()
+        for table_name, items in self.data.items():
+            memory_table = connection.add_table(cc_dynamodb.get_table_name(table_name))
+            for item_data in items:
+                memory_table.put(dict((key, dynamizer.encode(value)) for key, value in item_data.items()))
+        return connection.store.snapshot()
+
+    def snapshot(self):
+        """The tables as built, {namespaced table name: MemoryTable}. Do not write to them."""
+        namespace = cc_dynamodb.get_config().namespace
+        if self._snapshot is None or self._namespace != namespace:
+            self._snapshot = self._build()
+            self._namespace = namespace
+        return self._snapshot
+
+    def restore(self):
+        """Context manager and decorator, serving a fresh copy of the dataset."""
+        return RestoredDataset(self)
+
+
+class RestoredDataset(object):
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.patcher = None
+        self.connection = None
+
+    def start(self):
+        store = MemoryStore()
+        store.restore(self.dataset.snapshot())
+        self.connection = MemoryConnection(store)
+        self.patcher = patch('cc_dynamodb.get_connection', return_value=self.connection)
+        self.patcher.start()
+        return self.connection
+
+    def stop(self):
+        self.patcher.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self:
+                return func(*args, **kwargs)
+        return wrapper
@@ -0,0 +1,197 @@
+"""Query/scan iterators that prefetch the next page while the current one is consumed.
+
+    paginator = paginated_query('change_in_condition', saved_in_rdb__eq=0, index='SavedInRDB', limit=50)
+    items = list(paginator)
+    next_cursor = paginator.cursor  # None once there is nothing left
+
+    # Next request, in another process: continue after the last item returned.
+    items = list(paginated_query('change_in_condition', saved_in_rdb__eq=0, index='SavedInRDB', limit=50,
+                                 cursor=next_cursor))
+"""
+import base64
+import json
+import sys
+import threading
+
+try:
+    import Queue as queue
+except ImportError:  # Python 3
+    import queue
+
+from boto.dynamodb2.items import Item
+from boto.dynamodb2.types import FILTER_OPERATORS, QUERY_OPERATORS
+
+import cc_dynamodb
+from .log import create_logger
+from .scan import put_until_stopped
+
+
+logger = create_logger('pagination')
+
+DEFAULT_PREFETCH = 1  # pages fetched ahead of the consumer
+
+
+class InvalidCursorException(Exception):
+    pass
+
+
+def encode_cursor(key):
+    """Opaque, URL safe token for a wire format key (e.g. a LastEvaluatedKey)."""
+    return base64.urlsafe_b64encode(json.dumps(key, sort_keys=True).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    except (TypeError, ValueError, UnicodeError):
+        raise InvalidCursorException('Invalid cursor: %r' % cursor)
+    if not isinstance(key, dict):
+        raise InvalidCursorException('Invalid cursor: %r' % cursor)
+    return key
+
+
+class Paginator(object):
+    """Iterate the items of a query or scan of a configured table, page by page.
+
+    A background thread fetches up to `prefetch` pages ahead (0 fetches in the
+    calling thread), so the round trip for the next page overlaps with the
+    processing of the current one. Items are boto `Item` objects.
+
+    `limit` and `attributes` are sent to DynamoDB (Limit and AttributesToGet);
+    `page_size` caps the items per request. Filter kwargs are key conditions for
+    a query and scan filters for a scan, as for boto's query_2() and scan().
+
+    `cursor` is a token for the position after the last item (or page) yielded,
+    or None before the first page and once the results are exhausted. Pass it back as `cursor=` to continue; it
+    only holds key attributes, so it can be handed to web clients.
+    """
+
+    def __init__(self, table_name, operation='query', limit=None, page_size=None, attributes=None,
+                 index=None, reverse=False, consistent=False, query_filter=None, cursor=None,
+                 prefetch=DEFAULT_PREFETCH, **filter_kwargs):
+        if operation not in ('query', 'scan'):
+            raise ValueError('operation must be query or scan, got %r' % operation)
+        self.table_name = table_name
+        self.operation = operation
+        self.limit = limit
+        self.page_size = page_size
+        self.prefetch = prefetch
+        self.table = cc_dynamodb.get_table(table_name)
+
+        if operation == 'query':
+            self.request_kwargs = dict(
+                key_conditions=self.table._build_filters(filter_kwargs, using=QUERY_OPERATORS),
+                query_filter=self.table._build_filters(query_filter, using=FILTER_OPERATORS),
+                index_name=index,
+                scan_index_forward=not reverse,
+                consistent_read=consistent,
+            )
+        else:
+            self.request_kwargs = dict(
+                scan_filter=self.table._build_filters(filter_kwargs or None, using=FILTER_OPERATORS),
+            )
+        if attributes:
+            self.request_kwargs['attributes_to_get'] = attributes
+
+        table_config = cc_dynamodb._get_table_config(table_name)
+        key_names = [key['name'] for key in table_config.schema]
+        if index:
+            hash_keys, range_keys = table_config.index_keys[index]
+            key_names.extend(name for name in hash_keys + range_keys if name not in key_names)
+        self.key_names = key_names
+
+        self.start_key = decode_cursor(cursor) if cursor else None
+        self._position = self.start_key  # raw item or key of the last item yielded
+        self.count = 0
+        self._pages = queue.Queue(maxsize=max(prefetch, 1))
+        self._stopped = threading.Event()
+
+    def _request_limit(self, fetched):
+        limits = [limit for limit in (self.page_size, self.limit and self.limit - fetched) if limit]
+        return min(limits) if limits else None
+
+    def _fetch_pages(self, connection):
+        """Yield (raw_items, last_evaluated_key) until the results or the limit are exhausted."""
+        start_key = self.start_key
+        fetched = 0
+        while True:
+            request = getattr(connection, self.operation)
+            response = request(self.table.table_name, limit=self._request_limit(fetched),
+                               exclusive_start_key=start_key, **self.request_kwargs)
+            raw_items = response.get('Items', [])
+            start_key = response.get('LastEvaluatedKey')
+            fetched += len(raw_items)
+            yield raw_items, start_key
+            if not start_key or (self.limit and fetched >= self.limit):
+                return
+
+    def _prefetch(self):
+        try:
+            for raw_items, last_key in self._fetch_pages(cc_dynamodb.get_connection()):
+                if not put_until_stopped(self._pages, (raw_items, last_key, None), self._stopped):
+                    return
+            put_until_stopped(self._pages, None, self._stopped)
+        except Exception:
+            put_until_stopped(self._pages, (None, None, sys.exc_info()), self._stopped)
+
+    def _prefetched_pages(self):
+        fetcher = threading.Thread(target=self._prefetch)
+        fetcher.daemon = True
+        fetcher.start()
+        while True:
+            message = self._pages.get()
+            if message is None:
+                return
+            raw_items, last_key, error = message
+            if error:
+                logger.error('cc_dynamodb.pagination: %s of %s failed' % (self.operation, self.table_name))
+                raise error[1]
+            yield raw_items, last_key
+
+    def pages(self):
+        """Iterate lists of raw (wire format) items, one per page."""
+        if self.prefetch:
+            pages = self._prefetched_pages()
+        else:
+            pages = self._fetch_pages(cc_dynamodb.get_connection())
+        try:
+            for raw_items, last_key in pages:
+                truncated = bool(self.limit) and self.count + len(raw_items) > self.limit
+                if truncated:
+                    raw_items = raw_items[:self.limit - self.count]
+                self.count += len(raw_items)
+                if truncated or (last_key and self.limit and self.count >= self.limit):
+                    self._position = raw_items[-1] if raw_items else self._position
+                else:
+                    self._position = last_key
+                yield raw_items
+        finally:
+            self._stopped.set()
+
+    @property
+    def cursor(self):
+        """Token for the position after the last item yielded, None if there is none."""
+        if self._position is None:
+            return None
+        return encode_cursor(dict((name, self._position[name]) for name in self.key_names
+                                  if name in self._position))
+
+    def __iter__(self):
+        for raw_items in self.pages():
+            page_end = self._position
+            last = len(raw_items) - 1
+            for number, raw_item in enumerate(raw_items):
+                item = Item(self.table)
+                item.load({'Item': raw_item})
+                self._position = page_end if number == last else raw_item
+                yield item
+
+
+def paginated_query(table_name, **kwargs):
+    """Shortcut for Paginator(table_name, operation='query', **kwargs)."""
+    return Paginator(table_name, operation='query', **kwargs)
+
+
+def paginated_scan(table_name, **kwargs):
+    """Shortcut for Paginator(table_name, operation='scan', **kwargs)."""
+    return Paginator(table_name, operation='scan', **kwargs)
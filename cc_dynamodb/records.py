@@ -0,0 +1,152 @@
+"""Fast decoding of raw (wire format) items into compact records or columns.
+
+For large result sets (exports, reports) where boto `Item` objects, with their
+dicts and Decimal values, cost too much memory and CPU. Only the key attributes
+and the `columns` configured for the table are decoded; other attributes are
+dropped.
+
+    from cc_dynamodb.records import decode_columns, decode_records
+    from cc_dynamodb.scan import ParallelScan
+
+    for raw_items in ParallelScan('change_in_condition').pages():
+        records = decode_records('change_in_condition', raw_items)
+        records[0].carelog_id, records[0]['3_pain']
+
+NUMBER values become int, or float when they have a fraction or exponent,
+instead of Decimal. Precision beyond a float's is lost, use boto Items for those.
+"""
+from boto.dynamodb2 import types
+from boto.dynamodb2.types import Dynamizer
+
+try:
+    import numpy
+except ImportError:  # optional, decode_columns returns lists without it
+    numpy = None
+
+import cc_dynamodb
+
+
+def _number(value):
+    if value is None:
+        return None
+    try:
+        return int(value['N'])
+    except ValueError:
+        return float(value['N'])
+
+
+def _string(value):
+    if value is None:
+        return None
+    return value['S']
+
+
+def _dynamizer_decode(dynamizer):
+    def decode(value):
+        if value is None:
+            return None
+        return dynamizer.decode(value)
+    return decode
+
+
+class Record(tuple):
+    """An item as a tuple of the table's `fields`, None for missing attributes.
+
+    Values can be read by field name as items (record['3_pain']), attributes
+    (record.carelog_id, unless a tuple method has the same name) or with get().
+    Subclasses are built by record_class().
+    """
+    __slots__ = ()
+    fields = ()
+    _positions = {}
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, slice)):
+            return tuple.__getitem__(self, key)
+        return tuple.__getitem__(self, self._positions[key])
+
+    def __getattr__(self, name):
+        try:
+            return tuple.__getitem__(self, self._positions[name])
+        except KeyError:
+            raise AttributeError(name)
+
+    def get(self, name, default=None):
+        position = self._positions.get(name)
+        if position is None:
+            return default
+        value = tuple.__getitem__(self, position)
+        return default if value is None else value
+
+    def as_dict(self):
+        """The attributes that are set, as a dict."""
+        return dict((name, value) for name, value in zip(self.fields, self) if value is not None)
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, ', '.join(
+            '%s=%r' % (name, value) for name, value in zip(self.fields, self) if value is not None))
+
+
+def _field_types(table_config):
+    """[(attribute name, boto data type)]: primary key, index keys, then columns."""
+    field_types = []
+    seen = set()
+    parts = list(table_config.schema)
+    for index in table_config.indexes + table_config.global_indexes:
+        parts.extend(index.get('parts', ()))
+    columns = sorted((table_config.columns or {}).items())
+    for name, data_type in [(part['name'], part['data_type']) for part in parts] + columns:
+        if name not in seen:
+            seen.add(name)
+            field_types.append((name, getattr(types, data_type)))
+    return field_types
+
+
+def _build_decoder(table_config):
+    dynamizer_decode = _dynamizer_decode(Dynamizer())
+    converters = {types.NUMBER: _number, types.STRING: _string}
+    field_types = _field_types(table_config)
+    fields = tuple(name for name, _ in field_types)
+    record_type = type('%sRecord' % ''.join(part.title() for part in table_config.name.split('_')),
+                       (Record,),
+                       dict(__slots__=(), fields=fields,
+                            _positions=dict((name, position) for position, name in enumerate(fields))))
+    return dict(
+        record_class=record_type,
+        converters=tuple((name, converters.get(data_type, dynamizer_decode)) for name, data_type in field_types),
+        number_fields=frozenset(name for name, data_type in field_types if data_type == types.NUMBER),
+    )
+
+
+def _decoder(table_name):
+    return cc_dynamodb._get_table_config(table_name).memoize('record_decoder', _build_decoder)
+
+
+def record_class(table_name):
+    """The Record subclass for a configured table."""
+    return _decoder(table_name)['record_class']
+
+
+def decode_records(table_name, raw_items):
+    """Decode raw items, e.g. the 'Items' of a query or scan response, into Records."""
+    decoder = _decoder(table_name)
+    record_type = decoder['record_class']
+    converters = decoder['converters']
+    return [record_type([convert(raw_item.get(name)) for name, convert in converters])
+            for raw_item in raw_items]
+
+
+def decode_columns(table_name, raw_items, arrays=True):
+    """Decode raw items into {field: values}, one entry per raw item in each.
+
+    With `arrays` and NumPy installed, NUMBER fields are float64 arrays, with NaN
+    for missing values. Otherwise all fields are lists, with None for missing values.
+    """
+    decoder = _decoder(table_name)
+    columns = {}
+    for name, convert in decoder['converters']:
+        values = [convert(raw_item.get(name)) for raw_item in raw_items]
+        if arrays and numpy is not None and name in decoder['number_fields']:
+            values = numpy.array([numpy.nan if value is None else value for value in values], dtype=numpy.float64)
+        columns[name] = values
+    return columns
@@ -0,0 +1,135 @@
+import sys
+import threading
+
+try:
+    import Queue as queue
+except ImportError:  # Python 3
+    import queue
+
+from boto.dynamodb2.items import Item
+
+import cc_dynamodb
+from .log import create_logger
+
+
+logger = create_logger('scan')
+
+DEFAULT_SEGMENTS = 4
+DEFAULT_PAGES_BUFFERED = 8
+_PUT_TIMEOUT = 0.5  # seconds, how often a blocked producer checks if it was stopped
+
+
+def put_until_stopped(pages, message, stopped):
+    """Put `message` on the bounded `pages` queue, giving up once the `stopped` event is set.
+
+    Returns False if it gave up, so a producer thread never blocks forever on a
+    queue its consumer has abandoned.
+    """
+    while not stopped.is_set():
+        try:
+            pages.put(message, timeout=_PUT_TIMEOUT)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+class ParallelScan(object):
+    """Scan a configured table with `total_segments` workers, as a single iterator.
+
+    Each worker reads one Segment and pushes its pages to a queue of at most
+    `pages_buffered` pages, so memory stays bounded and workers wait when the
+    consumer falls behind. Items are boto `Item` objects, like table.scan().
+
+    `checkpoint` records, per segment, the LastEvaluatedKey of the last page whose
+    items have all been yielded (True once the segment is finished). It is JSON
+    serializable; pass it back as `checkpoint=` to resume a crashed scan.
+    `on_checkpoint(checkpoint)` is called after every page. Iterating the same
+    ParallelScan again resumes from its checkpoint, so a finished scan yields nothing.
+
+        scan = ParallelScan('change_in_condition', total_segments=8)
+        for item in scan:
+            export(item)
+            save(scan.checkpoint)  # or use on_checkpoint
+    """
+
+    def __init__(self, table_name, total_segments=DEFAULT_SEGMENTS, checkpoint=None, on_checkpoint=None,
+                 pages_buffered=DEFAULT_PAGES_BUFFERED, page_size=None, attributes=None):
+        self.table_name = table_name
+        self.table = cc_dynamodb.get_table(table_name)
+        if checkpoint:
+            total_segments = checkpoint['total_segments']
+            segments = dict((int(segment), key) for segment, key in checkpoint['segments'].items())
+        else:
+            segments = dict((segment, None) for segment in range(total_segments))
+        self.checkpoint = dict(total_segments=total_segments, segments=segments)
+        self.on_checkpoint = on_checkpoint
+        self.page_size = page_size
+        self.attributes = attributes
+        self.pages_buffered = pages_buffered
+
+    def _scan_segment(self, segment, start_key, pages, stopped):
+        try:
+            connection = cc_dynamodb.get_connection()
+            while not stopped.is_set():
+                response = connection.scan(
+                    self.table.table_name,
+                    attributes_to_get=self.attributes,
+                    limit=self.page_size,
+                    exclusive_start_key=start_key,
+                    segment=segment,
+                    total_segments=self.checkpoint['total_segments'],
+                )
+                start_key = response.get('LastEvaluatedKey')
+                page = (segment, response.get('Items', []), start_key, None)
+                if not put_until_stopped(pages, page, stopped):
+                    return
+                if not start_key:
+                    return
+        except Exception:
+            put_until_stopped(pages, (segment, None, None, sys.exc_info()), stopped)
+
+    def _save_checkpoint(self, segment, last_key):
+        self.checkpoint['segments'][segment] = last_key or True
+        if self.on_checkpoint:
+            self.on_checkpoint(self.checkpoint)
+
+    def pages(self):
+        """Iterate lists of raw (wire format) items, one per page, e.g. for cc_dynamodb.records."""
+        # Each iteration gets its own queue and stop event, so workers left over
+        # from an abandoned iteration can't feed this one.
+        pages = queue.Queue(maxsize=self.pages_buffered)
+        stopped = threading.Event()
+        pending = [segment for segment, key in sorted(self.checkpoint['segments'].items()) if key is not True]
+        workers = [threading.Thread(target=self._scan_segment,
+                                    args=(segment, self.checkpoint['segments'][segment], pages, stopped))
+                   for segment in pending]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+
+        remaining = len(workers)
+        try:
+            while remaining:
+                segment, raw_items, last_key, error = pages.get()
+                if error:
+                    logger.error('cc_dynamodb.scan: segment %s of %s failed' % (segment, self.table_name))
+                    raise error[1]
+                yield raw_items
+                self._save_checkpoint(segment, last_key)
+                if not last_key:
+                    remaining -= 1
+        finally:
+            stopped.set()
+
+    def __iter__(self):
+        for raw_items in self.pages():
+            for raw_item in raw_items:
+                item = Item(self.table)
+                item.load({'Item': raw_item})
+                yield item
+
+
+def parallel_scan(table_name, **kwargs):
+    """Shortcut for iter(ParallelScan(table_name, **kwargs))."""
+    return iter(ParallelScan(table_name, **kwargs))
@@ -0,0 +1,219 @@
+"""Client-side rate limiting, seeded from the configured throughput.
+
+Opt-in, for processes running bulk jobs (backfills, exports) that share tables
+with online traffic:
+
+    from cc_dynamodb import throttle
+    throttle.enable(fraction=0.5)  # use at most half the configured capacity
+
+Every request made through get_connection() connections then waits on a token
+bucket per table (or index) and per read/write, refilled at the configured
+`default_throughput` (or the GSI `throughput`) times `fraction`. The buckets are
+shared by all threads. Consumed capacity reported by DynamoDB is charged
+against them, and throttling responses halve the rate, which then recovers
+slowly up to the configured value.
+"""
+import json
+import threading
+import time
+
+import cc_dynamodb
+from .log import create_logger
+from .metrics import READ_OPERATIONS, WRITE_OPERATIONS
+
+
+logger = create_logger('throttle')
+
+MIN_RATE = 1  # capacity units per second
+DECREASE_FACTOR = 0.5
+INCREASE_FRACTION = 0.05  # of the configured rate, per successful request
+ESTIMATE_WEIGHT = 0.2  # for the moving average of consumed units per request
+
+_fraction = None  # None when disabled
+_lock = threading.Lock()
+
+
+class TokenBucket(object):
+    """Thread-safe token bucket with an adjustable rate (tokens per second).
+
+    The balance can go negative: requests are charged an estimate up front and
+    corrected once the actual consumed capacity is known.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self.tokens = self.burst
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.time()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, units):
+        """Wait until the balance is positive, then charge units."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens > 0:
+                    self.tokens -= units
+                    return
+                wait = -self.tokens / self.rate + 0.001
+            time.sleep(wait)
+
+    def adjust(self, units):
+        """Charge (or refund, if negative) units without waiting."""
+        with self._lock:
+            self.tokens -= units
+
+    def decrease(self):
+        with self._lock:
+            self.rate = max(MIN_RATE, self.rate * DECREASE_FACTOR)
+
+    def increase(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * INCREASE_FRACTION)
+
+
+class AdaptiveLimiter(object):
+    """A TokenBucket plus a moving average of consumed units per request, for one table/index."""
+
+    def __init__(self, rate):
+        self.bucket = TokenBucket(rate)
+        self.estimate = 1.0
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        """Wait for capacity, return the units charged."""
+        estimate = self.estimate
+        self.bucket.acquire(estimate)
+        return estimate
+
+    def after_request(self, charged, consumed, throttled):
+        if consumed is not None:
+            self.bucket.adjust(consumed - charged)
+            with self._lock:
+                self.estimate += ESTIMATE_WEIGHT * (max(consumed, 0.5) - self.estimate)
+        if throttled:
+            self.bucket.decrease()
+            logger.info('cc_dynamodb.throttle: throttled, rate now %s' % self.bucket.rate)
+        elif consumed is not None:
+            self.bucket.increase()
+
+
+def _configured_units(config, table_config, index_name, kind):
+    throughput = None
+    if index_name:
+        index = table_config.indexes_by_name.get(index_name)
+        throughput = index and index.get('throughput')
+    if not throughput:
+        throughput = config.yaml['default_throughput']
+    return throughput[kind]
+
+
+def _get_limiter(config, table_config, index_name, kind, fraction):
+    # Memoized on the TableConfig, so each config (global or ConfigContext) has its own buckets.
+    limiters = table_config.memoize('rate_limiters', lambda table_config: {})
+    key = (index_name, kind, fraction)
+    limiter = limiters.get(key)
+    if limiter is None:
+        with _lock:
+            limiter = limiters.get(key)
+            if limiter is None:
+                rate = max(MIN_RATE, _configured_units(config, table_config, index_name, kind) * fraction)
+                limiter = limiters[key] = AdaptiveLimiter(rate)
+    return limiter
+
+
+def get_limiter(table_name, index_name=None, kind='read'):
+    """The shared AdaptiveLimiter for a configured table (or index) and kind ('read'/'write').
+
+    Returns None while rate limiting is disabled.
+    """
+    fraction = _fraction
+    if fraction is None:
+        return None
+    config = cc_dynamodb.get_config()
+    return _get_limiter(config, cc_dynamodb._get_table_config(table_name), index_name, kind, fraction)
+
+
+def enable(fraction=1.0):
+    """Rate limit all requests to `fraction` of the configured throughput."""
+    global _fraction
+    _fraction = fraction
+
+
+def disable():
+    global _fraction
+    _fraction = None
+
+
+def _request_limiter(action, params, config, fraction):
+    if action in READ_OPERATIONS:
+        kind = 'read'
+    elif action in WRITE_OPERATIONS:
+        kind = 'write'
+    else:
+        return None
+    table_name = params.get('TableName')
+    if table_name is None and params.get('RequestItems'):
+        table_name = sorted(params['RequestItems'])[0]
+    if table_name is None or not table_name.startswith(config.namespace):
+        return None
+    table_config = config.tables.get(table_name[len(config.namespace):])
+    if table_config is None:
+        return None
+    return _get_limiter(config, table_config, params.get('IndexName'), kind, fraction)
+
+
+def _consumed_units(response):
+    consumed = response.get('ConsumedCapacity') if response else None
+    if not consumed:
+        return None
+    if isinstance(consumed, dict):
+        consumed = [consumed]
+    return sum(capacity.get('CapacityUnits', 0) for capacity in consumed)
+
+
+def instrument(connection, config=None):
+    """Wrap a boto DynamoDBConnection's make_request with the rate limiter (when enabled).
+
+    :param config: the config whose namespace and tables the connection is used
+        with, default: the global config at the time of each request
+    """
+    make_request = connection.make_request
+
+    def limited_make_request(action, body):
+        fraction = _fraction
+        if fraction is None:
+            return make_request(action, body)
+
+        params = json.loads(body) if body else {}
+        limiter = _request_limiter(action, params, config if config is not None else cc_dynamodb.get_config(),
+                                   fraction)
+        if limiter is None:
+            return make_request(action, body)
+
+        if 'ReturnConsumedCapacity' not in params:
+            params['ReturnConsumedCapacity'] = 'TOTAL'
+            body = json.dumps(params)
+
+        charged = limiter.before_request()
+        throttle_events = getattr(connection, 'throughput_exceeded_events', 0)
+        response = None
+        throttled = False
+        try:
+            response = make_request(action, body)
+            return response
+        except Exception as e:
+            throttled = e.__class__.__name__ == 'ProvisionedThroughputExceededException'
+            raise
+        finally:
+            throttled = throttled or getattr(connection, 'throughput_exceeded_events', 0) > throttle_events
+            limiter.after_request(charged, _consumed_units(response), throttled)
+
+    connection.make_request = limited_make_request
+    return connection
@@ -0,0 +1,66 @@
+"""Reload the YAML config in long-running processes when the file changes.
+
+    from cc_dynamodb import watcher
+    watcher.watch_config(interval=30)
+
+Each check is a stat() of the file; it is only parsed again when it changed.
+The watcher thread does not survive a fork, start it in each worker process.
+"""
+import threading
+
+import cc_dynamodb
+from .log import create_logger
+
+
+logger = create_logger('watcher')
+
+DEFAULT_INTERVAL = 10  # seconds
+
+
+class ConfigWatcher(object):
+    """Calls cc_dynamodb.reload_config() every `interval` seconds from a daemon thread.
+
+    `on_change(table_names)` is called after each reload, with the names of the
+    added, changed and removed tables. If the file cannot be loaded (e.g. invalid
+    YAML while it is being edited), the current config is kept and the next
+    check tries again.
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL, on_change=None):
+        self.interval = interval
+        self.on_change = on_change
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def check(self):
+        """Reload now if the file changed. Returns the changed table names, or None."""
+        try:
+            changed = cc_dynamodb.reload_config()
+        except Exception:
+            logger.exception('cc_dynamodb.watcher: could not reload config, keeping the current one')
+            return None
+        if changed is not None and self.on_change:
+            self.on_change(changed)
+        return changed
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.check()
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def watch_config(interval=DEFAULT_INTERVAL, on_change=None):
+    """Start and return a ConfigWatcher. get_config() must have been called (or set_config)."""
+    return ConfigWatcher(interval=interval, on_change=on_change).start()
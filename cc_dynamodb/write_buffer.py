@@ -0,0 +1,246 @@
+"""Write-behind buffer for items updated many times in a short window (counters, statuses).
+
+Writes are merged per primary key in memory, and a background thread sends them
+once `max_items` keys are pending or the oldest pending write is `max_delay`
+seconds old:
+
+    from cc_dynamodb.write_buffer import WriteBuffer
+
+    with WriteBuffer('change_in_condition', max_delay=0.5) as buffer:
+        buffer.update({'carelog_id': 1, 'time': 2}, add={'views': 1})
+        buffer.update({'carelog_id': 1, 'time': 2}, add={'views': 1}, values={'saved_in_rdb': 1})
+        buffer.put({'carelog_id': 3, 'time': 4, 'saved_in_rdb': 0})
+    # Leaving the block (close()) waits until everything is written.
+
+Puts and deletes go out in BatchWriteItem requests of 25, updates as one
+UpdateItem per key (PUT and ADD attribute updates). Writes are only durable once
+flush() or close() returns; close() is also called at interpreter exit.
+"""
+import atexit
+from collections import OrderedDict
+import threading
+import time
+import weakref
+
+import cc_dynamodb
+from . import batch
+from .log import create_logger
+
+
+logger = create_logger('write_buffer')
+
+DEFAULT_MAX_ITEMS = 100  # pending keys
+DEFAULT_MAX_DELAY = 0.5  # seconds
+
+# Buffers not closed yet, closed at interpreter exit. Weak, so a closed buffer can be freed.
+_open_buffers = weakref.WeakSet()
+
+
+@atexit.register
+def _close_open_buffers():
+    for buffer in list(_open_buffers):
+        buffer.close()
+
+
+class WriteBufferException(Exception):
+    def __init__(self, msg, unwritten=None):
+        super(WriteBufferException, self).__init__(msg)
+        self.unwritten = unwritten or {}
+
+
+class _Write(object):
+    """The merged pending write for one key: a put (item), a delete, or an update (values, add)."""
+    __slots__ = ('kind', 'item', 'values', 'add')
+
+    def __init__(self, kind, item=None, values=None, add=None):
+        self.kind = kind
+        self.item = item
+        self.values = values or {}
+        self.add = add or {}
+
+    def then(self, newer):
+        """The write equivalent to this one followed by newer."""
+        if newer.kind != 'update':
+            return newer
+        if self.kind == 'update':
+            values = dict(self.values, **newer.values)
+            add = dict((name, value) for name, value in self.add.items() if name not in newer.values)
+            for name, value in newer.add.items():
+                if name in values:
+                    values[name] += value
+                else:
+                    add[name] = add.get(name, 0) + value
+            return _Write('update', item=self.item, values=values, add=add)
+        # An update of a deleted item creates it, from its key (the update's item).
+        item = dict(self.item if self.kind == 'put' else newer.item, **newer.values)
+        for name, value in newer.add.items():
+            item[name] = item.get(name, 0) + value
+        return _Write('put', item=item)
+
+
+class WriteBuffer(object):
+    """Buffers puts, updates and deletes to one configured table, merged per primary key.
+
+    :param table_name: unprefixed table name
+    :param max_items: pending keys that trigger a flush
+    :param max_delay: seconds a write may wait before a flush is triggered
+    :param concurrency: requests in flight during a flush
+    """
+
+    def __init__(self, table_name, max_items=DEFAULT_MAX_ITEMS, max_delay=DEFAULT_MAX_DELAY,
+                 concurrency=batch.DEFAULT_CONCURRENCY, max_retries=batch.MAX_RETRIES):
+        self.table_name = table_name
+        self.key_names = tuple(part.name for part in cc_dynamodb._get_table_metadata(table_name)['schema'])
+        self.max_items = max_items
+        self.max_delay = max_delay
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.stats = batch.BatchStats(table_name)
+        self.merged = 0  # writes folded into a pending one for the same key
+        self._dynamizer = cc_dynamodb.get_table(table_name)._dynamizer
+        self._pending = OrderedDict()  # key tuple -> _Write
+        self._oldest = None  # time of the oldest pending write
+        self._closed = False
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()  # one flush at a time, so writes to a key stay in order
+        self._thread = None
+        _open_buffers.add(self)
+
+    def _key(self, item):
+        try:
+            return tuple(item[name] for name in self.key_names)
+        except KeyError:
+            raise ValueError('%s needs the primary key %s' % (self.table_name, ', '.join(self.key_names)))
+
+    def _add(self, key, write):
+        with self._condition:
+            if self._closed:
+                raise WriteBufferException('Write to %s after close()' % self.table_name)
+            existing = self._pending.get(key)
+            if existing is not None:
+                self._pending[key] = existing.then(write)
+                self.merged += 1
+                return
+            self._pending[key] = write
+            if len(self._pending) == 1:
+                self._oldest = time.time()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+            if len(self._pending) in (1, self.max_items):
+                self._condition.notify()
+
+    def put(self, item):
+        """Replace the whole item, like Table.put_item(item, overwrite=True)."""
+        self._add(self._key(item), _Write('put', item=dict(item)))
+
+    def update(self, key, values=None, add=None):
+        """Set attributes to `values` and add numbers to attributes (`add`), like UpdateItem."""
+        key = dict((name, key[name]) for name in self.key_names if name in key)
+        self._add(self._key(key), _Write('update', item=key, values=dict(values or {}), add=dict(add or {})))
+
+    def delete(self, key):
+        self._add(self._key(key), _Write('delete', item=dict((name, key[name]) for name in self.key_names)))
+
+    @property
+    def pending(self):
+        """Number of keys with a write not sent yet."""
+        return len(self._pending)
+
+    def _due(self):
+        if not self._pending:
+            return False
+        return len(self._pending) >= self.max_items or time.time() >= self._oldest + self.max_delay
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed and not self._due():
+                    self._condition.wait(self._oldest + self.max_delay - time.time() if self._pending else None)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except WriteBufferException:
+                logger.exception('cc_dynamodb.write_buffer: flush of %s failed, retrying' % self.table_name)
+                time.sleep(self.max_delay)
+
+    def _encode(self, attributes):
+        return dict((name, self._dynamizer.encode(value)) for name, value in attributes.items())
+
+    def _send(self, job):
+        """Write one job, (kind, keys, writes); return (job, the exception if it failed)."""
+        kind, keys, writes = job
+        try:
+            if kind == 'batch':
+                requests = [{'PutRequest': {'Item': self._encode(write.item)}} if write.kind == 'put' else
+                            {'DeleteRequest': {'Key': self._encode(write.item)}} for write in writes]
+                batch._write_requests(self.table_name, requests, self.stats, self.max_retries)
+            else:
+                write, = writes
+                attribute_updates = dict((name, {'Action': 'PUT', 'Value': self._dynamizer.encode(value)})
+                                         for name, value in write.values.items())
+                attribute_updates.update((name, {'Action': 'ADD', 'Value': self._dynamizer.encode(value)})
+                                         for name, value in write.add.items())
+                cc_dynamodb.get_connection().update_item(cc_dynamodb.get_table_name(self.table_name),
+                                                         self._encode(write.item), attribute_updates)
+                self.stats.record(items=1, requests=1)
+        except Exception as e:
+            return job, e
+        return job, None
+
+    def _jobs(self, entries):
+        puts_and_deletes = [(key, write) for key, write in entries.items() if write.kind != 'update']
+        for chunk in batch.chunked(puts_and_deletes, batch.BATCH_WRITE_SIZE):
+            yield 'batch', [key for key, _ in chunk], [write for _, write in chunk]
+        for key, write in entries.items():
+            if write.kind == 'update':
+                yield 'update', [key], [write]
+
+    def flush(self):
+        """Write everything buffered so far, blocking until done.
+
+        Writes that failed are put back in the buffer, merged under any newer
+        writes to the same keys, and WriteBufferException is raised.
+        """
+        with self._flush_lock:
+            with self._condition:
+                entries, self._pending = self._pending, OrderedDict()
+                self._oldest = None
+            if not entries:
+                return
+
+            unwritten = OrderedDict()
+            errors = []
+            for (_, keys, _), error in batch.run_bounded(self._send, self._jobs(entries), self.concurrency):
+                if error is not None:
+                    errors.append(error)
+                    unwritten.update((key, entries[key]) for key in keys)
+            if not errors:
+                return
+
+            with self._condition:
+                for key, write in unwritten.items():
+                    newer = self._pending.get(key)
+                    self._pending[key] = write.then(newer) if newer is not None else write
+                if self._pending and self._oldest is None:
+                    self._oldest = time.time()
+            raise WriteBufferException('%s of %s writes to %s failed: %s' % (
+                len(unwritten), len(entries), self.table_name, errors[0]), unwritten=unwritten)
+
+    def close(self):
+        """Stop the background thread and flush. Writes after close() raise WriteBufferException."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        _open_buffers.discard(self)
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -4,10 +4,12 @@ setup(
     name='cc_dynamodb',
     packages=find_packages(),
     install_requires=[
-        'bunch>=1.0.1',
         'boto>=2.31.1',
         'PyYAML==3.10',
     ],
+    extras_require={
+        'numpy': ['numpy'],  # cc_dynamodb.records.decode_columns arrays
+    },
     tests_require=['pytest', 'mock', 'factory_boy'],
     version='0.5.3',
     description='A dynamodb common configuration abstraction',
@@ -7,6 +7,11 @@ import pytest
 AWS_DYNAMODB_CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'dynamodb.yml')
 
 
+@pytest.fixture(scope='session')
+def table_config_path():
+    return AWS_DYNAMODB_CONFIG_PATH
+
+
 @pytest.fixture
 def fake_config():
     import cc_dynamodb
@@ -37,3 +42,19 @@ DYNAMODB_FIXTURES = {
         },
     ],
 }
+
+
+@pytest.fixture(scope='session')
+def dynamodb_fixtures():
+    return DYNAMODB_FIXTURES
+
+
+@pytest.fixture(scope='session')
+def dataset(dynamodb_fixtures):
+    """The nps_survey fixtures plus six change_in_condition logs, for MockDataset.restore()."""
+    from cc_dynamodb.mocks import MockDataset
+    return MockDataset(dict(
+        nps_survey=dynamodb_fixtures['nps_survey'],
+        change_in_condition=[dict(carelog_id=carelog_id, time=carelog_id * 10, saved_in_rdb=carelog_id % 2)
+                             for carelog_id in range(1, 7)],
+    ))
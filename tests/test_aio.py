@@ -0,0 +1,34 @@
+import mock
+import pytest
+
+asyncio = pytest.importorskip('asyncio')
+
+
+def _run(func, *args, **kwargs):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(func(*args, **kwargs))
+    finally:
+        loop.close()
+        asyncio.set_event_loop(None)
+
+
+@mock.patch('cc_dynamodb.get_table')
+def test_get_item_runs_table_call_on_executor(mock_get_table, fake_config):
+    from cc_dynamodb import aio
+
+    mock_get_table.return_value.get_item.return_value = 'item'
+
+    assert _run(aio.get_item, 'nps_survey', agency_id=1, profile_id=2) == 'item'
+    mock_get_table.assert_called_with('nps_survey')
+    mock_get_table.return_value.get_item.assert_called_with(agency_id=1, profile_id=2)
+
+
+@mock.patch('cc_dynamodb.get_table')
+def test_query_resolves_to_list(mock_get_table, fake_config):
+    from cc_dynamodb import aio
+
+    mock_get_table.return_value.query_2.return_value = iter(['a', 'b'])
+
+    assert _run(aio.query, 'nps_survey', agency_id__eq=1) == ['a', 'b']
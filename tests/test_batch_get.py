@@ -0,0 +1,38 @@
+import mock
+import pytest
+
+from cc_dynamodb import batch
+
+
+def _raw_item(profile_id):
+    return {'agency_id': {'N': '1'}, 'profile_id': {'N': str(profile_id)}, 'change': {'S': 'some change'}}
+
+
+@mock.patch('cc_dynamodb.batch.backoff', return_value=0)
+@mock.patch('cc_dynamodb.get_connection')
+def test_batch_get_dedupes_retries_and_keeps_order(mock_get_connection, mock_backoff, fake_config):
+    connection = mock_get_connection.return_value
+    unprocessed = {'dev_nps_survey': {'Keys': [{'agency_id': {'N': '1'}, 'profile_id': {'N': '2'}}]}}
+    connection.batch_get_item.side_effect = [
+        {'Responses': {'dev_nps_survey': [_raw_item(3)]}, 'UnprocessedKeys': unprocessed},
+        {'Responses': {'dev_nps_survey': [_raw_item(2)]}},
+    ]
+    keys = [{'agency_id': 1, 'profile_id': profile_id} for profile_id in (2, 3, 4, 2)]
+
+    items = batch.batch_get('nps_survey', keys, attributes=['change'])
+
+    assert [item and item['profile_id'] for item in items] == [2, 3, None, 2]
+    request = connection.batch_get_item.call_args_list[0][0][0]['dev_nps_survey']
+    assert len(request['Keys']) == 3
+    assert request['AttributesToGet'] == ['agency_id', 'profile_id', 'change']
+    mock_backoff.assert_called_once_with(0)
+
+
+@mock.patch('cc_dynamodb.batch.backoff', return_value=0)
+@mock.patch('cc_dynamodb.get_connection')
+def test_batch_get_raises_when_retries_exhausted(mock_get_connection, mock_backoff, fake_config):
+    unprocessed = {'dev_nps_survey': {'Keys': [{'agency_id': {'N': '1'}, 'profile_id': {'N': '2'}}]}}
+    mock_get_connection.return_value.batch_get_item.return_value = {'UnprocessedKeys': unprocessed}
+
+    with pytest.raises(batch.BatchGetException):
+        batch.batch_get('nps_survey', [{'agency_id': 1, 'profile_id': 2}], max_retries=1)
@@ -0,0 +1,67 @@
+import mock
+import pytest
+
+from cc_dynamodb import batch
+
+
+def _items(count):
+    return [{'agency_id': 1, 'profile_id': i, 'change': 'some change'} for i in range(count)]
+
+
+@mock.patch('cc_dynamodb.batch.backoff', return_value=0)
+@mock.patch('cc_dynamodb.get_connection')
+def test_batch_write_chunks_and_retries_unprocessed(mock_get_connection, mock_backoff, fake_config):
+    connection = mock_get_connection.return_value
+    unprocessed = {'dev_nps_survey': [{'PutRequest': {'Item': {}}}]}
+    responses = [{'UnprocessedItems': unprocessed, 'ConsumedCapacity': [{'CapacityUnits': 1}]}]
+    connection.batch_write_item.side_effect = lambda *args, **kwargs: (
+        responses.pop() if responses else {'ConsumedCapacity': [{'CapacityUnits': 2}]})
+
+    stats = batch.batch_write('nps_survey', iter(_items(60)), concurrency=2)
+
+    assert stats.items == 60
+    # 3 chunks of up to 25 items, plus one retry.
+    assert stats.requests == 4
+    assert stats.retries == 1
+    assert stats.consumed_capacity == 7
+    mock_backoff.assert_called_once_with(0)
+    request_items = connection.batch_write_item.call_args_list[0][0][0]
+    assert list(request_items.keys()) == ['dev_nps_survey']
+
+
+@mock.patch('cc_dynamodb.batch.backoff', return_value=0)
+@mock.patch('cc_dynamodb.get_connection')
+def test_batch_write_raises_when_retries_exhausted(mock_get_connection, mock_backoff, fake_config):
+    unprocessed = {'dev_nps_survey': [{'PutRequest': {'Item': {}}}]}
+    mock_get_connection.return_value.batch_write_item.return_value = {'UnprocessedItems': unprocessed}
+
+    with pytest.raises(batch.BatchWriteException) as exc_info:
+        batch.batch_write('nps_survey', _items(3), max_retries=2)
+    assert exc_info.value.unprocessed_items == unprocessed
+    assert [call[0][0] for call in mock_backoff.call_args_list] == [0, 1]
+
+
+@mock.patch('cc_dynamodb.get_connection')
+def test_batch_write_dedupes_keys_within_a_request(mock_get_connection, fake_config):
+    connection = mock_get_connection.return_value
+    connection.batch_write_item.return_value = {}
+
+    stats = batch.batch_write('nps_survey', _items(2) + _items(2))
+
+    assert stats.items == 2
+    request_items = connection.batch_write_item.call_args[0][0]
+    assert len(request_items['dev_nps_survey']) == 2
+
+
+@mock.patch('cc_dynamodb.get_connection')
+def test_batch_write_dedupes_keys_across_requests(mock_get_connection, fake_config):
+    connection = mock_get_connection.return_value
+    connection.batch_write_item.return_value = {}
+    items = _items(30) + [{'agency_id': 1, 'profile_id': 0, 'change': 'last change'}]
+
+    stats = batch.batch_write('nps_survey', items)
+
+    assert stats.items == 30
+    written = [request['PutRequest']['Item'] for call in connection.batch_write_item.call_args_list
+               for request in call[0][0]['dev_nps_survey']]
+    assert [item['change'] for item in written if item['profile_id'] == {'N': '0'}] == [{'S': 'last change'}]
@@ -0,0 +1,32 @@
+import os
+
+import mock
+
+import cc_dynamodb
+from cc_dynamodb.connections import ConnectionRegistry
+
+
+def test_get_connection_reuses_connection(fake_config):
+    stats = cc_dynamodb.connections.registry.stats()
+    assert cc_dynamodb.get_connection() is cc_dynamodb.get_connection()
+    assert cc_dynamodb.connections.registry.stats()['reused'] > stats['reused']
+
+
+def test_registry_expires_idle_connections():
+    registry = ConnectionRegistry(keep_alive=0)
+    first = registry.get('key', object)
+    with mock.patch('cc_dynamodb.connections.time.time', return_value=10 ** 10):
+        second = registry.get('key', object)
+
+    assert first is not second
+    assert registry.stats()['expired'] == 1
+
+
+def test_registry_resets_after_fork():
+    registry = ConnectionRegistry()
+    first = registry.get('key', object)
+    with mock.patch('cc_dynamodb.connections.os.getpid', return_value=os.getpid() + 1):
+        second = registry.get('key', object)
+
+    assert first is not second
+    assert registry.stats()['resets'] == 1
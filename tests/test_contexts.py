@@ -0,0 +1,78 @@
+import json
+
+import mock
+import pytest
+
+import cc_dynamodb
+from cc_dynamodb import contexts, throttle
+
+
+@pytest.fixture
+def register(table_config_path):
+    """contexts.register() with the test config and credentials."""
+    def register(name, namespace, **kwargs):
+        return contexts.register(name, table_config=table_config_path, namespace=namespace,
+                                 aws_access_key_id='<KEY>', aws_secret_access_key='<SECRET>', **kwargs)
+    return register
+
+
+def teardown_function(function):
+    for name in contexts.list_contexts():
+        contexts.unregister(name)
+
+
+def test_contexts_are_independent(fake_config, register):
+    staging = register('staging', 'staging_')
+    tenant = register('tenant', 'tenant_', region='eu-west-1')
+
+    assert contexts.get_context('staging') is staging
+    assert staging.get_table_name('nps_survey') == 'staging_nps_survey'
+    assert tenant.get_reverse_table_name('tenant_nps_survey') == 'nps_survey'
+    assert cc_dynamodb.get_table_name('nps_survey') == 'dev_nps_survey'
+
+    staging.get_table_metadata('nps_survey')
+    assert 'metadata' in staging.config.tables['nps_survey'].derived
+    assert 'metadata' not in tenant.config.tables['nps_survey'].derived
+
+
+@mock.patch('cc_dynamodb._create_connection')
+def test_context_connections_and_tables(mock_create_connection, fake_config, register):
+    tenant = register('tenant', 'tenant_', region='eu-west-1')
+
+    db_table = tenant.get_table('change_in_condition')
+
+    assert db_table.table_name == 'tenant_change_in_condition'
+    assert tenant.get_connection() is db_table.connection
+    mock_create_connection.assert_called_once_with(tenant.config, 'eu-west-1', tenant.config)
+    assert tenant.connections.stats()['created'] == 1
+    assert len(db_table.global_indexes) == 1
+
+
+def test_unknown_context_and_table(fake_config, register):
+    with pytest.raises(contexts.UnknownContextException):
+        contexts.get_context('missing')
+    with pytest.raises(cc_dynamodb.UnknownTableException):
+        register('staging', 'staging_').get_table_metadata('missing')
+
+
+@mock.patch('cc_dynamodb._cached_config', None)
+@mock.patch('cc_dynamodb._connect')
+def test_contexts_are_rate_limited_separately(mock_connect, register):
+    mock_connect.side_effect = lambda config, region: mock.Mock(
+        throughput_exceeded_events=0, make_request=mock.Mock(return_value={'ConsumedCapacity': {'CapacityUnits': 4}}))
+    # Namespaces of the same length, and no global config.
+    first = register('first', 'aaa_')
+    second = register('second', 'bbb_')
+
+    throttle.enable()
+    try:
+        first.get_connection().make_request('PutItem', json.dumps({'TableName': 'aaa_nps_survey'}))
+        second.get_connection().make_request('PutItem', json.dumps({'TableName': 'bbb_nps_survey'}))
+        second.get_connection().make_request('PutItem', json.dumps({'TableName': 'bbb_nps_survey'}))
+    finally:
+        throttle.disable()
+
+    first_limiter, = first.config.tables['nps_survey'].derived['rate_limiters'].values()
+    second_limiter, = second.config.tables['nps_survey'].derived['rate_limiters'].values()
+    assert 5.9 < first_limiter.bucket.tokens <= 6
+    assert second_limiter.bucket.tokens < 3
@@ -0,0 +1,13 @@
+import cc_dynamodb
+
+
+def test_get_table_index_finds_local_and_global_indexes(fake_config):
+    assert cc_dynamodb.get_table_index('change_in_condition', 'SavedInRDB')['type'] == 'GlobalAllIndex'
+    assert cc_dynamodb.get_table_index('change_in_condition', 'SessionId')['type'] == 'AllIndex'
+    assert cc_dynamodb.get_table_index('change_in_condition', 'Missing') is None
+    assert cc_dynamodb.get_table_index('invalid_table', 'SavedInRDB') is None
+
+
+def test_get_table_index_keys_splits_hash_and_range(fake_config):
+    assert cc_dynamodb.get_table_index_keys('change_in_condition', 'SavedInRDB') == (('saved_in_rdb',), ('time',))
+    assert cc_dynamodb.get_table_index_keys('change_in_condition', 'SessionId') == (('carelog_id',), ('session_id',))
@@ -0,0 +1,23 @@
+import cc_dynamodb
+from conftest import AWS_DYNAMODB_CONFIG_PATH
+
+
+def test_table_metadata_is_built_once_per_config(fake_config):
+    first = cc_dynamodb._get_table_metadata('change_in_condition')
+    second = cc_dynamodb._get_table_metadata('change_in_condition')
+
+    assert first['schema'] is not second['schema']
+    assert first['schema'][0] is second['schema'][0]
+    assert first['global_indexes'][0] is second['global_indexes'][0]
+
+
+def test_table_metadata_is_rebuilt_after_set_config(fake_config):
+    first = cc_dynamodb._get_table_metadata('change_in_condition')
+    cc_dynamodb.set_config(
+        table_config=AWS_DYNAMODB_CONFIG_PATH,
+        aws_access_key_id='<KEY>',
+        aws_secret_access_key='<SECRET>',
+        namespace='dev_')
+    second = cc_dynamodb._get_table_metadata('change_in_condition')
+
+    assert first['schema'][0] is not second['schema'][0]
@@ -0,0 +1,87 @@
+import mock
+
+from cc_dynamodb.cache import get_cached_table, LRUCache
+
+
+RAW_ITEM = {'agency_id': {'N': '1'}, 'profile_id': {'N': '2'}, 'change': {'S': 'some change'}}
+
+
+@mock.patch('cc_dynamodb.get_connection')
+def test_get_item_is_read_through_and_invalidated_by_writes(mock_get_connection, fake_config):
+    connection = mock_get_connection.return_value
+    connection.get_item.return_value = {'Item': RAW_ITEM}
+    table = get_cached_table('nps_survey')
+
+    assert table.get_item(agency_id=1, profile_id=2)['change'] == 'some change'
+    assert table.get_item(agency_id=1, profile_id=2)['change'] == 'some change'
+    assert connection.get_item.call_count == 1
+
+    table.put_item({'agency_id': 1, 'profile_id': 2, 'change': 'other change'}, overwrite=True)
+    table.get_item(agency_id=1, profile_id=2)
+    assert connection.get_item.call_count == 2
+
+    stats = table.cache_stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 2
+    assert stats['invalidations'] == 1
+
+
+@mock.patch('cc_dynamodb.get_connection')
+def test_get_item_racing_a_write_is_not_cached(mock_get_connection, fake_config):
+    connection = mock_get_connection.return_value
+    table = get_cached_table('nps_survey')
+
+    def get_item_during_put(*args, **kwargs):
+        # The item is read, then a put and its invalidation complete before the read returns.
+        table.put_item({'agency_id': 1, 'profile_id': 2, 'change': 'other change'}, overwrite=True)
+        return {'Item': RAW_ITEM}
+    connection.get_item.side_effect = get_item_during_put
+
+    assert table.get_item(agency_id=1, profile_id=2)['change'] == 'some change'
+    connection.get_item.side_effect = None
+    connection.get_item.return_value = {'Item': dict(RAW_ITEM, change={'S': 'other change'})}
+    assert table.get_item(agency_id=1, profile_id=2)['change'] == 'other change'
+    assert connection.get_item.call_count == 2
+
+
+@mock.patch('cc_dynamodb.get_connection')
+def test_tables_without_cache_config_are_passed_through(mock_get_connection, fake_config):
+    table = get_cached_table('change_in_condition')
+
+    assert table.item_cache is None
+    assert table.cache_stats() is None
+    assert table.table_name == 'dev_change_in_condition'
+
+
+def test_lru_cache_evicts_and_expires():
+    cache = LRUCache(ttl=60, max_size=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.stats()['evictions'] == 1
+
+    with mock.patch('cc_dynamodb.cache.time.time', return_value=10 ** 10):
+        assert cache.get('a') is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_lru_cache_set_skips_keys_invalidated_since_the_generation():
+    cache = LRUCache(ttl=60, max_size=1)
+    generation = cache.generation('a')
+    cache.invalidate('a')
+    cache.set('a', 1, generation)
+    assert cache.get('a') is None
+
+    # Still detected once the key's generation is evicted by newer invalidations.
+    generation = cache.generation('a')
+    cache.invalidate('a')
+    cache.invalidate('b')
+    cache.set('a', 1, generation)
+    assert cache.get('a') is None
+
+    cache.set('a', 1, cache.generation('a'))
+    assert cache.get('a') == 1
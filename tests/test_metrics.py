@@ -0,0 +1,58 @@
+import json
+
+import mock
+
+from cc_dynamodb import metrics
+
+
+def _instrumented_connection(response):
+    connection = mock.Mock(throughput_exceeded_events=0)
+    connection.make_request.return_value = response
+    return metrics.instrument(connection)
+
+
+def test_instrumented_connection_reports_request_metrics():
+    events = []
+    metrics.add_sink(events.append)
+    try:
+        connection = _instrumented_connection({'Items': [], 'ConsumedCapacity': {'CapacityUnits': 1.5}})
+        connection.make_request('Query', json.dumps({'TableName': 'dev_change_in_condition',
+                                                     'IndexName': 'SavedInRDB'}))
+    finally:
+        metrics.remove_sink(events.append)
+
+    assert len(events) == 1
+    event = events[0]
+    assert (event.operation, event.table, event.index) == ('Query', 'dev_change_in_condition', 'SavedInRDB')
+    assert (event.consumed_read, event.consumed_write, event.error) == (1.5, 0, None)
+
+
+def test_instrumented_connection_requests_consumed_capacity_only_with_sinks():
+    connection = mock.Mock(throughput_exceeded_events=0)
+    make_request = connection.make_request
+    make_request.return_value = {}
+    metrics.instrument(connection)
+    body = json.dumps({'TableName': 'dev_nps_survey'})
+
+    connection.make_request('PutItem', body)
+    assert make_request.call_args[0][1] == body
+
+    events = []
+    metrics.add_sink(events.append)
+    try:
+        connection.make_request('PutItem', body)
+    finally:
+        metrics.remove_sink(events.append)
+    assert json.loads(make_request.call_args[0][1])['ReturnConsumedCapacity'] == 'TOTAL'
+    assert len(events) == 1
+
+
+def test_prometheus_sink_renders_counters_and_histogram():
+    sink = metrics.PrometheusSink()
+    sink(metrics.RequestMetrics('Query', 'dev_nps_survey', None, 0.02, 1, 1, 2, 0, None))
+
+    rendered = sink.render()
+
+    assert 'cc_dynamodb_requests_total{table="dev_nps_survey",operation="Query",index=""} 1' in rendered
+    assert 'cc_dynamodb_throttles_total{table="dev_nps_survey",operation="Query",index=""} 1' in rendered
+    assert 'cc_dynamodb_latency_seconds_bucket{table="dev_nps_survey",operation="Query",index="",le="0.025"} 1' in rendered
@@ -0,0 +1,172 @@
+import mock
+import pytest
+
+from cc_dynamodb import migrations
+
+
+@mock.patch('cc_dynamodb.update_table')
+def test_update_tables_updates_all_configured_tables(mock_update_table, fake_config):
+    mock_update_table.side_effect = lambda table_name, **kwargs: table_name.upper()
+
+    results = migrations.update_tables()
+
+    assert results == {'nps_survey': 'NPS_SURVEY', 'change_in_condition': 'CHANGE_IN_CONDITION'}
+
+
+@mock.patch('cc_dynamodb.update_table')
+def test_update_tables_reports_failures_after_all_tables(mock_update_table, fake_config):
+    def update_table(table_name, **kwargs):
+        if table_name == 'nps_survey':
+            raise ValueError('boom')
+        return table_name
+    mock_update_table.side_effect = update_table
+
+    with pytest.raises(migrations.MigrationException) as exc_info:
+        migrations.update_tables()
+
+    assert list(exc_info.value.errors.keys()) == ['nps_survey']
+    assert mock_update_table.call_count == 2
+
+
+def _describe_result(global_indexes):
+    return {'Table': {
+        'TableStatus': 'ACTIVE',
+        'KeySchema': [{'KeyType': 'HASH', 'AttributeName': 'carelog_id'},
+                      {'KeyType': 'RANGE', 'AttributeName': 'time'}],
+        'AttributeDefinitions': [{'AttributeName': 'carelog_id', 'AttributeType': 'N'},
+                                 {'AttributeName': 'time', 'AttributeType': 'N'}],
+        'ProvisionedThroughput': {'ReadCapacityUnits': 10, 'WriteCapacityUnits': 10},
+        'GlobalSecondaryIndexes': global_indexes,
+    }}
+
+
+@mock.patch('cc_dynamodb.get_connection')
+@mock.patch('cc_dynamodb.table.Table.describe')
+def test_plan_table_diffs_indexes_and_throughput(mock_describe, mock_get_connection, fake_config):
+    mock_describe.return_value = _describe_result([
+        {'IndexName': 'SavedInRDB', 'IndexStatus': 'ACTIVE',
+         'ProvisionedThroughput': {'ReadCapacityUnits': 10, 'WriteCapacityUnits': 10}},
+        {'IndexName': 'SomeUpstreamIndex', 'IndexStatus': 'ACTIVE',
+         'ProvisionedThroughput': {'ReadCapacityUnits': 10, 'WriteCapacityUnits': 10}},
+    ])
+
+    table_plan = migrations.plan_table('change_in_condition', throughput={'read': 20, 'write': 10})
+
+    assert table_plan.as_dict() == dict(
+        table_name='change_in_condition',
+        create_table=False,
+        schema_error=None,
+        throughput={'read': 20, 'write': 10},
+        create_indexes=[],
+        index_throughput={'SavedInRDB': {'read': 15, 'write': 15}},
+        delete_indexes=['SomeUpstreamIndex'],
+    )
+
+
+@mock.patch('cc_dynamodb.get_connection')
+@mock.patch('cc_dynamodb.table.Table.describe')
+def test_apply_refuses_plans_with_schema_errors(mock_describe, mock_get_connection, fake_config):
+    mock_describe.return_value = _describe_result([])
+
+    # nps_survey has a different key schema than the one described.
+    plans = migrations.plan()
+
+    assert [table_plan.table_name for table_plan in plans] == ['change_in_condition', 'nps_survey']
+    assert plans[0].create_indexes == ['SavedInRDB']
+    assert plans[1].schema_error
+    with mock.patch('cc_dynamodb.update_table') as mock_update_table:
+        with pytest.raises(migrations.MigrationException):
+            migrations.apply(plans)
+    assert not mock_update_table.called
+
+
+@mock.patch('cc_dynamodb.wait_until_active')
+@mock.patch('cc_dynamodb.get_connection')
+@mock.patch('cc_dynamodb.table.Table.describe')
+def test_apply_makes_the_planned_changes_without_rediffing(mock_describe, mock_get_connection,
+                                                           mock_wait_until_active, fake_config):
+    # The table has changed since it was planned, apply() still does what was reviewed.
+    mock_describe.return_value = _describe_result([])
+    table_plan = migrations.TablePlan('change_in_condition', throughput={'read': 20, 'write': 10},
+                                      create_indexes=['SavedInRDB'], index_throughput={'Other': {'read': 5, 'write': 5}},
+                                      delete_indexes=['SomeUpstreamIndex'])
+
+    with mock.patch('cc_dynamodb.update_table') as mock_update_table, \
+            mock.patch('cc_dynamodb.table.Table.update') as mock_update, \
+            mock.patch('cc_dynamodb.table.Table.create_global_secondary_index') as mock_create_gsi, \
+            mock.patch('cc_dynamodb.table.Table.delete_global_secondary_index') as mock_delete_gsi:
+        migrations.apply([table_plan])
+
+    assert not mock_update_table.called
+    mock_update.assert_called_once_with(throughput={'read': 20, 'write': 10},
+                                        global_indexes={'Other': {'read': 5, 'write': 5}})
+    assert [call[0][0].name for call in mock_create_gsi.call_args_list] == ['SavedInRDB']
+    mock_delete_gsi.assert_called_once_with('SomeUpstreamIndex')
+
+
+class FakeProvisioningConnection(object):
+    """Tables become ACTIVE (or disappear) on the second describe_table after create/delete."""
+
+    def __init__(self, existing=()):
+        self.tables = dict((table_name, 'ACTIVE') for table_name in existing)
+        self.describes = {}
+        self.max_in_progress = 0
+
+    def _not_found(self):
+        from boto.exception import JSONResponseError
+        return JSONResponseError(400, 'Bad Request', body={'__type': 'ResourceNotFoundException'})
+
+    def _in_progress(self):
+        return sum(1 for status in self.tables.values() if status != 'ACTIVE')
+
+    def create_table(self, table_name, *args, **kwargs):
+        self.tables[table_name] = 'CREATING'
+        self.max_in_progress = max(self.max_in_progress, self._in_progress())
+        return {}
+
+    def delete_table(self, table_name):
+        self.tables[table_name] = 'DELETING'
+        self.max_in_progress = max(self.max_in_progress, self._in_progress())
+
+    def describe_table(self, table_name):
+        if table_name not in self.tables:
+            raise self._not_found()
+        self.describes[table_name] = self.describes.get(table_name, 0) + 1
+        if self.describes[table_name] >= 2 and self.tables[table_name] != 'ACTIVE':
+            if self.tables.pop(table_name) == 'DELETING':
+                raise self._not_found()
+            self.tables[table_name] = 'ACTIVE'
+        return {'Table': {'TableStatus': self.tables[table_name]}}
+
+    def list_tables(self, exclusive_start_table_name=None):
+        return {'TableNames': sorted(self.tables)}
+
+
+@mock.patch('cc_dynamodb.migrations._sleep')
+@mock.patch('cc_dynamodb.get_connection')
+def test_create_all_tables_waits_for_active(mock_get_connection, mock_sleep, fake_config):
+    connection = FakeProvisioningConnection()
+    mock_get_connection.return_value = connection
+
+    with mock.patch('cc_dynamodb.table.Table.create',
+                    side_effect=lambda table_name, **kwargs: connection.create_table(table_name)):
+        timings = migrations.create_all_tables(concurrency=1)
+
+    assert sorted(timings) == ['change_in_condition', 'nps_survey']
+    assert connection.tables == {'dev_change_in_condition': 'ACTIVE', 'dev_nps_survey': 'ACTIVE'}
+    assert connection.max_in_progress == 1
+    assert mock_sleep.call_count == 3
+
+
+@mock.patch('cc_dynamodb.migrations._sleep')
+@mock.patch('cc_dynamodb.get_connection')
+def test_delete_all_tables_only_deletes_the_namespace(mock_get_connection, mock_sleep, fake_config):
+    connection = FakeProvisioningConnection(existing=['dev_nps_survey', 'dev_extra', 'prod_nps_survey'])
+    mock_get_connection.return_value = connection
+
+    timings = migrations.delete_all_tables()
+
+    assert sorted(timings) == ['dev_extra', 'dev_nps_survey']
+    assert connection.tables == {'prod_nps_survey': 'ACTIVE'}
+    with pytest.raises(ValueError):
+        migrations.delete_all_tables(prefix='')
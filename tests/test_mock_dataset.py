@@ -0,0 +1,65 @@
+from decimal import Decimal
+
+import pytest
+
+import cc_dynamodb
+from cc_dynamodb import batch
+
+
+def test_restore_serves_the_dataset(fake_config, dataset):
+    with dataset.restore():
+        table = cc_dynamodb.get_table('nps_survey')
+        item = table.get_item(agency_id=1669, profile_id=2616346)
+        saved = cc_dynamodb.get_table('change_in_condition').query_2(saved_in_rdb__eq=1, time__gt=10,
+                                                                   index='SavedInRDB', reverse=True)
+
+        assert item['comments'] == 'No comment'
+        assert [item['carelog_id'] for item in saved] == [5, 3]
+        assert len(list(table.scan())) == 2
+        assert table.count() == 2
+
+
+def test_writes_do_not_leak_between_restores(fake_config, dataset):
+    with dataset.restore():
+        table = cc_dynamodb.get_table('nps_survey')
+        table.put_item(dict(agency_id=1669, profile_id=1, recommend_score='10'))
+        table.delete_item(agency_id=1669, profile_id=2616346)
+        item = table.get_item(agency_id=1669, profile_id=2616347)
+        item['recommend_score'] = '4'
+        item.partial_save()
+        batch.batch_write('change_in_condition', [dict(carelog_id=7, time=70, saved_in_rdb=1)])
+
+        assert sorted(item['profile_id'] for item in table.scan()) == [1, 2616347]
+        assert table.get_item(agency_id=1669, profile_id=2616347)['recommend_score'] == '4'
+        assert cc_dynamodb.get_table('change_in_condition').query_count(carelog_id__eq=7) == 1
+
+    with dataset.restore():
+        table = cc_dynamodb.get_table('nps_survey')
+        assert sorted(item['profile_id'] for item in table.scan()) == [2616346, 2616347]
+        assert table.get_item(agency_id=1669, profile_id=2616347)['recommend_score'] == '3'
+        assert cc_dynamodb.get_table('change_in_condition').query_count(carelog_id__eq=7) == 0
+
+
+def test_create_table_and_conditional_put(fake_config, dataset):
+    from boto.dynamodb2.exceptions import ConditionalCheckFailedException
+
+    with dataset.restore():
+        with pytest.raises(cc_dynamodb.TableAlreadyExistsException):
+            cc_dynamodb.create_table('nps_survey')
+        table = cc_dynamodb.get_table('nps_survey')
+        with pytest.raises(ConditionalCheckFailedException):
+            table.put_item(dict(agency_id=Decimal(1669), profile_id=Decimal(2616346)))
+
+
+def test_comparison_operator_expected_conditions(fake_config, dataset):
+    with dataset.restore():
+        table = cc_dynamodb.get_table('nps_survey')
+        assert table.delete_item(agency_id=1669, profile_id=2616346, expected={'recommend_score__eq': '1'}) is False
+        assert table.get_item(agency_id=1669, profile_id=2616346)['profile_id'] == 2616346
+
+        assert table.delete_item(agency_id=1669, profile_id=2616346,
+                                 expected={'recommend_score__eq': '1', 'recommend_score__null': True},
+                                 conditional_operator='OR') is False
+        assert table.delete_item(agency_id=1669, profile_id=2616346,
+                                 expected={'recommend_score__ne': '1', 'comment__null': True}) is True
+        assert [item['profile_id'] for item in table.scan()] == [2616347]
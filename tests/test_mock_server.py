@@ -0,0 +1,47 @@
+import pytest
+
+import cc_dynamodb
+from cc_dynamodb import mock_server
+
+
+@pytest.fixture
+def server(fake_config, dataset):
+    server = mock_server.start_server(dataset=dataset)
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def use_server(server, table_config_path):
+    """set_config() for the server, with a namespace."""
+    def use_server(namespace):
+        cc_dynamodb.set_config(table_config=table_config_path, namespace=namespace,
+                               aws_access_key_id='<KEY>', aws_secret_access_key='<SECRET>',
+                               host=server.host, port=server.port)
+    return use_server
+
+
+def test_namespaces_share_the_server_but_not_tables(use_server):
+    use_server('gw0_')
+    table = cc_dynamodb.get_table('nps_survey')
+    table.put_item(dict(agency_id=1669, profile_id=1, recommend_score='10'))
+    saved = cc_dynamodb.get_table('change_in_condition').query_2(saved_in_rdb__eq=1, time__gt=10,
+                                                               index='SavedInRDB', reverse=True)
+    assert [item['carelog_id'] for item in saved] == [5, 3]
+    assert sorted(item['profile_id'] for item in table.scan()) == [1, 2616346, 2616347]
+
+    use_server('gw1_')
+    assert sorted(item['profile_id'] for item in cc_dynamodb.get_table('nps_survey').scan()) == [2616346, 2616347]
+    with pytest.raises(cc_dynamodb.TableAlreadyExistsException):
+        cc_dynamodb.create_table('nps_survey')
+
+    use_server('gw0_')
+    mock_server.reset()
+    assert sorted(item['profile_id'] for item in table.scan()) == [2616346, 2616347]
+
+
+def test_worker_namespace(monkeypatch):
+    monkeypatch.delenv('PYTEST_XDIST_WORKER', raising=False)
+    assert mock_server.worker_namespace() == 'test_'
+    monkeypatch.setenv('PYTEST_XDIST_WORKER', 'gw3')
+    assert mock_server.worker_namespace('ci_') == 'ci_gw3_'
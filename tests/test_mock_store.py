@@ -0,0 +1,185 @@
+from decimal import Decimal
+
+import mock
+
+from cc_dynamodb.mocks import mock_query_2, TableWithQuery2
+
+
+def _raw_item(carelog_id, time, saved_in_rdb):
+    return {'carelog_id': {'N': str(carelog_id)}, 'time': {'N': str(time)},
+            'saved_in_rdb': {'N': str(saved_in_rdb)}}
+
+
+RAW_ITEMS = [_raw_item(123, 1, 0), _raw_item(125, 4, 0), _raw_item(127, 2, 0), _raw_item(129, 3, 1)]
+
+
+def _table(connection):
+    import cc_dynamodb
+    return TableWithQuery2(cc_dynamodb.get_table_name('change_in_condition'), connection=connection,
+                           **cc_dynamodb._get_table_metadata('change_in_condition'))
+
+
+def test_query_2_scans_once_per_mock(fake_config):
+    connection = mock.Mock()
+    connection.scan.return_value = {'Items': RAW_ITEMS}
+    with mock_query_2():
+        table = _table(connection)
+        first = [item['time'] for item in table.query_2(saved_in_rdb__eq=0, index='SavedInRDB')]
+        second = [item['time'] for item in table.query_2(saved_in_rdb__eq=0, time__gte=2, index='SavedInRDB',
+                                                         reverse=True)]
+        count = table.query_count(saved_in_rdb__eq=0, time__lt=4, index='SavedInRDB')
+
+    assert first == [1, 2, 4]
+    assert second == [4, 2]
+    assert count == 2
+    assert connection.scan.call_count == 1
+
+
+def _connection(failing=()):
+    """A DynamoDBConnection whose requests are answered by a mock: RAW_ITEMS for a Scan, {} otherwise."""
+    from boto.dynamodb2.exceptions import ConditionalCheckFailedException
+    from boto.dynamodb2.layer1 import DynamoDBConnection
+
+    def make_request(action, body):
+        if action in failing:
+            raise ConditionalCheckFailedException(400, 'Bad Request', body={'message': 'condition failed'})
+        return {'Items': RAW_ITEMS} if action == 'Scan' else {}
+
+    connection = DynamoDBConnection(aws_access_key_id='<KEY>', aws_secret_access_key='<SECRET>')
+    connection.make_request = mock.Mock(side_effect=make_request)
+    return connection
+
+
+def _scans(connection):
+    return sum(1 for call in connection.make_request.call_args_list if call[1]['action'] == 'Scan')
+
+
+def test_put_item_updates_the_memory_copy(fake_config):
+    connection = _connection()
+    with mock_query_2():
+        table = _table(connection)
+        assert table.query_count(saved_in_rdb__eq=1, index='SavedInRDB') == 1
+        table.put_item({'carelog_id': 123, 'time': 1, 'saved_in_rdb': 1}, overwrite=True)
+        times = [item['time'] for item in table.query_2(saved_in_rdb__eq=1, index='SavedInRDB')]
+        table.delete_item(carelog_id=129, time=3)
+        count = table.query_count(saved_in_rdb__eq=1, index='SavedInRDB')
+
+    assert times == [Decimal(1), Decimal(3)]
+    assert count == 1
+    assert _scans(connection) == 1
+
+
+def test_failed_conditional_delete_keeps_the_memory_copy(fake_config):
+    connection = _connection(failing=('DeleteItem',))
+    with mock_query_2():
+        table = _table(connection)
+        assert table.query_count(saved_in_rdb__eq=1, index='SavedInRDB') == 1
+        assert table.delete_item(carelog_id=129, time=3, expected={'saved_in_rdb__eq': 0}) is False
+        assert table.query_count(saved_in_rdb__eq=1, index='SavedInRDB') == 1
+
+
+def test_writes_outside_the_mocked_table_reload_the_memory_copy(fake_config):
+    import cc_dynamodb
+    from boto.dynamodb2.table import Table
+
+    connection = _connection()
+    # Made before mock_query_2 started, so a plain boto Table.
+    plain_table = Table(cc_dynamodb.get_table_name('change_in_condition'), connection=connection,
+                        **cc_dynamodb._get_table_metadata('change_in_condition'))
+    with mock_query_2():
+        table = _table(connection)
+        table.query_count(saved_in_rdb__eq=1, index='SavedInRDB')
+
+        with table.batch_write() as batch_table:
+            batch_table.put_item({'carelog_id': 131, 'time': 5, 'saved_in_rdb': 1})
+            # Not flushed yet: the loaded copy is still current.
+            table.query_count(saved_in_rdb__eq=1, index='SavedInRDB')
+            assert _scans(connection) == 1
+        table.query_count(saved_in_rdb__eq=1, index='SavedInRDB')
+        assert _scans(connection) == 2
+
+        connection.update_item(table.table_name, {'carelog_id': {'N': '123'}, 'time': {'N': '1'}}, {})
+        table.query_count(saved_in_rdb__eq=1, index='SavedInRDB')
+        assert _scans(connection) == 3
+
+        plain_table.put_item({'carelog_id': 123, 'time': 1, 'saved_in_rdb': 1}, overwrite=True)
+        assert table.query_count(saved_in_rdb__eq=1, index='SavedInRDB') == 2
+        assert _scans(connection) == 3
+
+
+def test_memory_table_snapshot_is_copy_on_write(fake_config):
+    from cc_dynamodb.mock_store import MemoryTable
+    from boto.dynamodb2.types import Dynamizer
+
+    original = MemoryTable('change_in_condition', decode=Dynamizer().decode)
+    for raw_item in RAW_ITEMS:
+        original.put(raw_item)
+
+    snapshot = original.snapshot()
+    assert snapshot.items is original.items
+    snapshot.put(_raw_item(131, 5, 0))
+    snapshot.delete(_raw_item(123, 1, 0))
+
+    assert snapshot.items is not original.items
+    assert [raw_item['time']['N'] for raw_item in original.query('SavedInRDB', ('EQ', [0]))] == ['1', '2', '4']
+    assert [raw_item['time']['N'] for raw_item in snapshot.query('SavedInRDB', ('EQ', [0]))] == ['2', '4', '5']
+
+
+def test_query_2_key_conditions_filters_limit_and_pages(fake_config):
+    connection = mock.Mock()
+    connection.scan.return_value = {'Items': RAW_ITEMS}
+    with mock_query_2():
+        table = _table(connection)
+        between = [item['time'] for item in table.query_2(saved_in_rdb__eq=0, time__between=(1, 3),
+                                                          index='SavedInRDB')]
+        filtered = [item['time'] for item in table.query_2(saved_in_rdb__eq=0, index='SavedInRDB',
+                                                           query_filter={'carelog_id__in': [123, 125]})]
+        paged = [item['time'] for item in table.query_2(saved_in_rdb__eq=0, index='SavedInRDB', reverse=True,
+                                                        limit=2, max_page_size=1)]
+        count = table.query_count(saved_in_rdb__eq=0, index='SavedInRDB', query_filter={'carelog_id__gt': 123})
+
+    assert between == [1, 2]
+    assert filtered == [1, 4]
+    assert paged == [4, 2]
+    assert count == 2
+
+
+def test_memory_connection_scan_pages_and_filters(fake_config):
+    import cc_dynamodb
+    from cc_dynamodb.mock_store import MemoryConnection
+
+    table_name = cc_dynamodb.get_table_name('change_in_condition')
+    connection = MemoryConnection()
+    memory_table = connection.add_table(table_name)
+    for raw_item in RAW_ITEMS:
+        memory_table.put(raw_item)
+
+    first = connection.scan(table_name, limit=2)
+    # Resuming works even when the last evaluated item is gone.
+    connection.delete_item(table_name, first['LastEvaluatedKey'])
+    second = connection.scan(table_name, limit=2, exclusive_start_key=first['LastEvaluatedKey'])
+    filtered = connection.scan(table_name, scan_filter={
+        'saved_in_rdb': {'AttributeValueList': [{'N': '1'}], 'ComparisonOperator': 'EQ'},
+        'time': {'AttributeValueList': [{'N': '1'}], 'ComparisonOperator': 'LE'},
+    }, conditional_operator='OR')
+
+    assert [raw_item['carelog_id']['N'] for raw_item in first['Items']] == ['123', '125']
+    assert first['LastEvaluatedKey'] == {'carelog_id': {'N': '125'}, 'time': {'N': '4'}}
+    assert [raw_item['carelog_id']['N'] for raw_item in second['Items']] == ['127', '129']
+    assert 'LastEvaluatedKey' not in second
+    assert [raw_item['carelog_id']['N'] for raw_item in filtered['Items']] == ['123', '129']
+    assert filtered['ScannedCount'] == 3
+
+
+def test_conditions():
+    from cc_dynamodb.mock_store import compile_condition, range_slice
+
+    assert range_slice([u'a', u'ab', u'abc', u'b'], 'BEGINS_WITH', [u'ab']) == (1, 3)
+    assert range_slice([1, 2, 3, 4], 'BETWEEN', [2, 3]) == (1, 3)
+    assert [compile_condition('BEGINS_WITH', [u'ab'])(value) for value in (u'abc', u'b', Decimal(1), None)] == \
+        [True, False, False, False]
+    assert [compile_condition('CONTAINS', [u'b'])(value) for value in (u'abc', set([u'b']), Decimal(1))] == \
+        [True, True, False]
+    assert [compile_condition('NE', [Decimal(1)])(value) for value in (Decimal(1), Decimal(2), None)] == \
+        [False, True, True]
+    assert compile_condition('NULL', [])(None)
@@ -0,0 +1,73 @@
+import mock
+import pytest
+
+from cc_dynamodb.pagination import decode_cursor, InvalidCursorException, paginated_query, paginated_scan
+
+
+def _raw_item(profile_id):
+    return {'agency_id': {'N': '1'}, 'profile_id': {'N': str(profile_id)}, 'comments': {'S': 'ok'}}
+
+
+def _fake_query(table_name, limit=None, exclusive_start_key=None, **kwargs):
+    """Profiles 0-9, at most 4 per page."""
+    start = int(exclusive_start_key['profile_id']['N']) + 1 if exclusive_start_key else 0
+    stop = min(10, start + min(limit or 4, 4))
+    response = {'Items': [_raw_item(profile_id) for profile_id in range(start, stop)]}
+    if stop < 10:
+        response['LastEvaluatedKey'] = {'agency_id': {'N': '1'}, 'profile_id': {'N': str(stop - 1)}}
+    return response
+
+
+@pytest.mark.parametrize('prefetch', [0, 2])
+@mock.patch('cc_dynamodb.get_connection')
+def test_paginated_query_reads_all_pages(mock_get_connection, prefetch, fake_config):
+    connection = mock_get_connection.return_value
+    connection.query.side_effect = _fake_query
+
+    paginator = paginated_query('nps_survey', agency_id__eq=1, attributes=['profile_id'], prefetch=prefetch)
+    profile_ids = [item['profile_id'] for item in paginator]
+
+    assert profile_ids == list(range(10))
+    assert paginator.cursor is None
+    assert connection.query.call_count == 3
+    request_kwargs = connection.query.call_args[1]
+    assert request_kwargs['attributes_to_get'] == ['profile_id']
+    assert request_kwargs['key_conditions'] == {
+        'agency_id': {'AttributeValueList': [{'N': '1'}], 'ComparisonOperator': 'EQ'}}
+
+
+@mock.patch('cc_dynamodb.get_connection')
+def test_paginated_query_limit_and_cursor(mock_get_connection, fake_config):
+    connection = mock_get_connection.return_value
+    connection.query.side_effect = _fake_query
+
+    paginator = paginated_query('nps_survey', agency_id__eq=1, limit=6)
+    assert [item['profile_id'] for item in paginator] == list(range(6))
+    # The limit is pushed down: 4 items, then the 2 remaining.
+    assert [call[1]['limit'] for call in connection.query.call_args_list] == [6, 2]
+    assert decode_cursor(paginator.cursor) == {'agency_id': {'N': '1'}, 'profile_id': {'N': '5'}}
+
+    next_page = paginated_query('nps_survey', agency_id__eq=1, limit=6, cursor=paginator.cursor)
+    assert [item['profile_id'] for item in next_page] == list(range(6, 10))
+    assert next_page.cursor is None
+
+
+@mock.patch('cc_dynamodb.get_connection')
+def test_paginated_scan_cursor_after_break(mock_get_connection, fake_config):
+    connection = mock_get_connection.return_value
+    connection.scan.side_effect = _fake_query
+
+    paginator = paginated_scan('nps_survey', page_size=4)
+    for item in paginator:
+        if item['profile_id'] == 1:
+            break
+
+    # Only key attributes go into the cursor.
+    assert decode_cursor(paginator.cursor) == {'agency_id': {'N': '1'}, 'profile_id': {'N': '1'}}
+    resumed = paginated_scan('nps_survey', cursor=paginator.cursor, prefetch=0)
+    assert [item['profile_id'] for item in resumed] == list(range(2, 10))
+
+
+def test_invalid_cursor():
+    with pytest.raises(InvalidCursorException):
+        decode_cursor('not a cursor')
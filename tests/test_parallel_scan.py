@@ -0,0 +1,50 @@
+import mock
+
+from cc_dynamodb.scan import ParallelScan
+
+
+def _raw_item(agency_id, profile_id):
+    return {'agency_id': {'N': str(agency_id)}, 'profile_id': {'N': str(profile_id)}}
+
+
+def _fake_scan(table_name, exclusive_start_key=None, segment=None, **kwargs):
+    """Two pages per segment."""
+    if exclusive_start_key is None:
+        return {'Items': [_raw_item(segment, 1)], 'LastEvaluatedKey': {'page': {'N': '1'}}}
+    return {'Items': [_raw_item(segment, 2)]}
+
+
+@mock.patch('cc_dynamodb.get_connection')
+def test_parallel_scan_reads_all_segments(mock_get_connection, fake_config):
+    mock_get_connection.return_value.scan.side_effect = _fake_scan
+    scan = ParallelScan('nps_survey', total_segments=3, pages_buffered=1)
+
+    items = sorted((item['agency_id'], item['profile_id']) for item in scan)
+
+    assert items == [(0, 1), (0, 2), (1, 1), (1, 2), (2, 1), (2, 2)]
+    assert scan.checkpoint == {'total_segments': 3, 'segments': {0: True, 1: True, 2: True}}
+
+
+@mock.patch('cc_dynamodb.get_connection')
+def test_parallel_scan_resumes_from_checkpoint(mock_get_connection, fake_config):
+    mock_get_connection.return_value.scan.side_effect = _fake_scan
+    checkpoint = {'total_segments': 2, 'segments': {'0': True, '1': {'page': {'N': '1'}}}}
+
+    items = [(item['agency_id'], item['profile_id'])
+             for item in ParallelScan('nps_survey', checkpoint=checkpoint)]
+
+    assert items == [(1, 2)]
+
+
+@mock.patch('cc_dynamodb.get_connection')
+def test_parallel_scan_iterated_again_resumes_from_checkpoint(mock_get_connection, fake_config):
+    mock_get_connection.return_value.scan.side_effect = _fake_scan
+    scan = ParallelScan('nps_survey', total_segments=1)
+
+    pages = scan.pages()
+    assert next(pages) == [_raw_item(0, 1)]
+    next(pages)  # the first page is checkpointed once the consumer asks for the next one
+    pages.close()
+
+    assert [(item['agency_id'], item['profile_id']) for item in scan] == [(0, 2)]
+    assert list(scan) == []
@@ -0,0 +1,47 @@
+import pytest
+
+from cc_dynamodb.records import decode_columns, decode_records, record_class
+
+
+RAW_ITEMS = [
+    {'carelog_id': {'N': '1'}, 'time': {'N': '1420000000.5'}, '3_pain': {'N': '2'},
+     'unconfigured': {'S': 'dropped'}},
+    {'carelog_id': {'N': '2'}, 'time': {'N': '1420000001'}, 'session_id': {'N': '7'}},
+]
+
+
+def test_decode_records(fake_config):
+    records = decode_records('change_in_condition', RAW_ITEMS)
+
+    assert type(records[0]) is record_class('change_in_condition')
+    assert records[0].carelog_id == 1
+    assert records[0]['time'] == 1420000000.5
+    assert records[0]['3_pain'] == 2
+    assert records[0].session_id is None
+    assert records[1].get('3_pain', 0) == 0
+    assert records[1].as_dict() == {'carelog_id': 2, 'time': 1420000001, 'session_id': 7}
+    with pytest.raises(AttributeError):
+        records[0].unconfigured
+
+
+def test_record_fields_start_with_keys(fake_config):
+    fields = record_class('change_in_condition').fields
+    assert fields[:4] == ('carelog_id', 'time', 'session_id', 'saved_in_rdb')
+    assert 'rdb_id' in fields
+    assert record_class('nps_survey').__name__ == 'NpsSurveyRecord'
+
+
+def test_decode_columns_as_lists(fake_config):
+    columns = decode_columns('change_in_condition', RAW_ITEMS, arrays=False)
+
+    assert columns['carelog_id'] == [1, 2]
+    assert columns['session_id'] == [None, 7]
+    assert 'unconfigured' not in columns
+
+
+def test_decode_columns_as_arrays(fake_config):
+    numpy = pytest.importorskip('numpy')
+    columns = decode_columns('change_in_condition', RAW_ITEMS)
+
+    assert columns['carelog_id'].dtype == numpy.float64
+    assert numpy.isnan(columns['session_id'][0])
@@ -0,0 +1,66 @@
+import os
+import shutil
+
+import pytest
+
+import cc_dynamodb
+from cc_dynamodb.watcher import ConfigWatcher
+
+
+@pytest.fixture
+def yaml_path(tmpdir, table_config_path):
+    """A copy of the test config, loaded with set_config()."""
+    yaml_path = str(tmpdir.join('dynamodb.yml'))
+    shutil.copy(table_config_path, yaml_path)
+    cc_dynamodb.set_config(table_config=yaml_path, namespace='dev_',
+                           aws_access_key_id='<KEY>', aws_secret_access_key='<SECRET>')
+    return yaml_path
+
+
+def _rewrite(yaml_path, old, new):
+    with open(yaml_path) as yaml_file:
+        content = yaml_file.read()
+    with open(yaml_path, 'w') as yaml_file:
+        yaml_file.write(content.replace(old, new))
+    stat = os.stat(yaml_path)
+    os.utime(yaml_path, (stat.st_atime, stat.st_mtime + 10))
+
+
+def test_reload_config_only_when_file_changed(yaml_path):
+    config = cc_dynamodb.get_config()
+
+    assert cc_dynamodb.reload_config() is None
+    assert cc_dynamodb.get_config() is config
+
+
+def test_reload_config_keeps_unchanged_tables(yaml_path):
+    cc_dynamodb._get_table_metadata('nps_survey')
+    cc_dynamodb._get_table_metadata('change_in_condition')
+    old_config = cc_dynamodb.get_config()
+
+    _rewrite(yaml_path, 'read: 15', 'read: 20')
+    assert cc_dynamodb.reload_config() == ['change_in_condition']
+
+    config = cc_dynamodb.get_config()
+    assert config is not old_config
+    assert config.namespace == 'dev_'
+    assert config.tables['nps_survey'] is old_config.tables['nps_survey']
+    assert 'metadata' in config.tables['nps_survey'].derived
+    assert config.tables['change_in_condition'].derived == {}
+    assert config.tables['change_in_condition'].indexes_by_name['SavedInRDB']['throughput']['read'] == 20
+    # The old snapshot is untouched, for callers still holding it.
+    assert old_config.tables['change_in_condition'].indexes_by_name['SavedInRDB']['throughput']['read'] == 15
+
+
+def test_watcher_keeps_config_when_file_is_invalid(yaml_path):
+    config = cc_dynamodb.get_config()
+    changes = []
+    watcher = ConfigWatcher(on_change=changes.append)
+
+    _rewrite(yaml_path, 'schemas:', 'schemas: [')
+    assert watcher.check() is None
+    assert cc_dynamodb.get_config() is config
+
+    _rewrite(yaml_path, 'schemas: [', 'schemas:')
+    assert watcher.check() == []
+    assert changes == [[]]
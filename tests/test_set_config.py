@@ -5,3 +5,74 @@ def test_success(fake_config):
     assert config.aws_access_key_id == '<KEY>'
     assert config.aws_secret_access_key == '<SECRET>'
     assert config.namespace == 'dev_'
+
+
+def test_config_is_read_only(fake_config):
+    import pytest
+    import cc_dynamodb
+
+    config = cc_dynamodb.get_config()
+    with pytest.raises(cc_dynamodb.ReadOnlyConfigError):
+        config.namespace = 'other_'
+    with pytest.raises(cc_dynamodb.ReadOnlyConfigError):
+        config.yaml['schemas']['nps_survey'] = []
+    assert cc_dynamodb.get_config() is config
+
+
+def test_config_to_dict_is_mutable_copy(fake_config):
+    import cc_dynamodb
+
+    config = cc_dynamodb.get_config().toDict()
+    config['yaml']['schemas']['nps_survey'].append({'type': 'RangeKey'})
+    assert len(cc_dynamodb.get_config().yaml['schemas']['nps_survey']) == 2
+
+
+def test_import_does_not_load_boto_or_yaml():
+    import os
+    import subprocess
+    import sys
+
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    output = subprocess.check_output([
+        sys.executable, '-c',
+        'import sys, cc_dynamodb; print(sorted(m for m in ("boto", "yaml") if m in sys.modules))'
+    ], env=env)
+    assert output.strip() == b'[]'
+
+
+def test_boto_module_attributes_are_lazy(fake_config):
+    import mock
+    import cc_dynamodb
+    from boto.dynamodb2 import fields, table, types
+    from boto.exception import JSONResponseError
+
+    assert cc_dynamodb.table is table
+    assert cc_dynamodb.types is types
+    assert cc_dynamodb.fields is fields
+    assert cc_dynamodb.JSONResponseError is JSONResponseError
+    with mock.patch('cc_dynamodb.table.Table.describe') as describe:
+        assert table.Table.describe is describe
+    with mock.patch('cc_dynamodb.get_table_name', return_value='patched'):
+        assert cc_dynamodb.get_table('nps_survey').table_name == 'patched'
+    assert cc_dynamodb.get_table('nps_survey').table_name == 'dev_nps_survey'
+
+
+def test_config_cache_is_reused_until_the_file_changes(tmpdir, table_config_path):
+    import os
+    import shutil
+    import mock
+    from cc_dynamodb import config
+
+    yaml_path = str(tmpdir.join('dynamodb.yml'))
+    cache_path = str(tmpdir.join('dynamodb.cache'))
+    shutil.copy(table_config_path, yaml_path)
+
+    with mock.patch('cc_dynamodb.config._parse_yaml', wraps=config._parse_yaml) as parse_yaml:
+        yaml_config = config.load_yaml(yaml_path, cache_path)
+        assert config.load_yaml(yaml_path, cache_path) == yaml_config
+        assert parse_yaml.call_count == 1
+
+        stat = os.stat(yaml_path)
+        os.utime(yaml_path, (stat.st_atime, stat.st_mtime + 10))
+        assert config.load_yaml(yaml_path, cache_path) == yaml_config
+        assert parse_yaml.call_count == 2
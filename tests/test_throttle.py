@@ -0,0 +1,75 @@
+import json
+
+import mock
+
+from cc_dynamodb import throttle
+
+
+def test_token_bucket_waits_when_in_debt():
+    bucket = throttle.TokenBucket(rate=10)
+    with mock.patch('cc_dynamodb.throttle.time.time', return_value=100):
+        bucket._updated = 100
+        bucket.acquire(25)
+        assert bucket.tokens == -15
+        with mock.patch('cc_dynamodb.throttle.time.sleep', side_effect=lambda seconds: bucket.adjust(-20)) as mock_sleep:
+            bucket.acquire(1)
+    assert round(mock_sleep.call_args[0][0], 3) == 1.501
+
+
+def test_limiter_is_seeded_from_config_and_adapts(fake_config):
+    throttle.enable(fraction=0.5)
+    try:
+        table_limiter = throttle.get_limiter('change_in_condition', kind='write')
+        index_limiter = throttle.get_limiter('change_in_condition', 'SavedInRDB', kind='read')
+        assert throttle.get_limiter('change_in_condition', kind='write') is table_limiter
+    finally:
+        throttle.disable()
+
+    assert table_limiter.bucket.rate == 5
+    assert index_limiter.bucket.rate == 7.5
+
+    index_limiter.after_request(charged=1, consumed=None, throttled=True)
+    assert index_limiter.bucket.rate == 3.75
+    index_limiter.after_request(charged=1, consumed=3, throttled=False)
+    assert index_limiter.bucket.rate == 3.75 + 7.5 * throttle.INCREASE_FRACTION
+    assert index_limiter.estimate > 1
+
+
+def test_instrumented_connection_charges_consumed_capacity(fake_config):
+    connection = mock.Mock(throughput_exceeded_events=0)
+    connection.make_request.return_value = {'ConsumedCapacity': {'CapacityUnits': 4}}
+    throttle.instrument(connection)
+
+    throttle.enable()
+    try:
+        connection.make_request('PutItem', json.dumps({'TableName': 'dev_nps_survey'}))
+        limiter = throttle.get_limiter('nps_survey', kind='write')
+    finally:
+        throttle.disable()
+
+    # Burst of 10 units, charged 1 up front then the other 3 consumed.
+    assert 5.9 < limiter.bucket.tokens <= 6
+    assert throttle.get_limiter('nps_survey', kind='write') is None
+
+
+def test_instrumented_connection_uses_its_own_config(fake_config, table_config_path):
+    import cc_dynamodb
+
+    config = cc_dynamodb.build_config(table_config_path, namespace='tenant_', aws_access_key_id='<KEY>',
+                                      aws_secret_access_key='<SECRET>')
+    connection = mock.Mock(throughput_exceeded_events=0)
+    connection.make_request.return_value = {'ConsumedCapacity': {'CapacityUnits': 4}}
+    throttle.instrument(connection, config)
+
+    throttle.enable()
+    try:
+        connection.make_request('PutItem', json.dumps({'TableName': 'tenant_nps_survey'}))
+        connection.make_request('PutItem', json.dumps({'TableName': 'dev_nps_survey'}))  # another namespace
+        global_limiter = throttle.get_limiter('nps_survey', kind='write')
+    finally:
+        throttle.disable()
+
+    limiter, = config.tables['nps_survey'].derived['rate_limiters'].values()
+    assert limiter is not global_limiter
+    assert 5.9 < limiter.bucket.tokens <= 6
+    assert global_limiter.bucket.tokens == 10
@@ -1,4 +1,5 @@
 import cc_dynamodb
+from cc_dynamodb.config import compile_config
 
 import mock
 from moto import mock_dynamodb2
@@ -11,6 +12,16 @@ def test_update_table_should_raise_if_table_doesnt_exist(fake_config):
         cc_dynamodb.update_table('change_in_condition')
 
 
+@mock_dynamodb2
+def test_update_table_with_default_throughput(fake_config):
+    cc_dynamodb.create_table('nps_survey').describe()
+
+    table = cc_dynamodb.update_table('nps_survey')
+
+    assert table.throughput == {'read': 10, 'write': 10}
+    assert cc_dynamodb.get_config().yaml['default_throughput'] == {'read': 10, 'write': 10}
+
+
 @mock_dynamodb2
 def test_update_table_should_not_update_if_same_throughput(fake_config):
     table = cc_dynamodb.create_table('change_in_condition')
@@ -36,8 +47,8 @@ def test_update_table_should_not_update_if_same_throughput(fake_config):
     patcher = mock.patch('cc_dynamodb.table.Table.describe')
     mock_metadata = patcher.start()
 
-    patcher = mock.patch('cc_dynamodb.table.Table.update_global_secondary_index')
-    mock_update_gsi = patcher.start()
+    patcher = mock.patch('cc_dynamodb.table.Table.update')
+    mock_update = patcher.start()
 
     patcher = mock.patch('cc_dynamodb.table.Table.create_global_secondary_index')
     mock_create_gsi = patcher.start()
@@ -48,12 +59,11 @@ def test_update_table_should_not_update_if_same_throughput(fake_config):
     mock_metadata.return_value = original_metadata
     cc_dynamodb.update_table('change_in_condition')
 
-    mock_metadata.stop()
-    mock_update_gsi.stop()
-    mock_create_gsi.stop()
-    mock_delete_gsi.stop()
+    mock.patch.stopall()
 
-    assert not mock_update_gsi.called
+    assert not mock_update.called
+    assert not mock_create_gsi.called
+    assert not mock_delete_gsi.called
 
 
 @mock_dynamodb2
@@ -91,23 +101,23 @@ def test_update_table_should_create_update_delete_gsi(fake_config):
                  {'KeyType': 'RANGE', 'AttributeName': 'time'}],
             'ItemCount': 0}]
     })
-    original_config = cc_dynamodb.get_config()
+    original_config = cc_dynamodb.get_config().toDict()
     patcher = mock.patch('cc_dynamodb.get_config')
     mock_config = patcher.start()
-    original_config.yaml['global_indexes']['change_in_condition'].append({
+    original_config['yaml']['global_indexes']['change_in_condition'].append({
         'parts': [
             {'type': 'HashKey', 'name': 'rdb_id', 'data_type': 'NUMBER'},
             {'type': 'RangeKey', 'name': 'session_id', 'data_type': 'NUMBER'}],
         'type': 'GlobalAllIndex',
         'name': 'RdbID',
     })
-    mock_config.return_value = original_config
+    mock_config.return_value = compile_config(original_config)
 
     patcher = mock.patch('cc_dynamodb.table.Table.describe')
     mock_metadata = patcher.start()
 
-    patcher = mock.patch('cc_dynamodb.table.Table.update_global_secondary_index')
-    mock_update_gsi = patcher.start()
+    patcher = mock.patch('cc_dynamodb.table.Table.update')
+    mock_update = patcher.start()
 
     patcher = mock.patch('cc_dynamodb.table.Table.create_global_secondary_index')
     mock_create_gsi = patcher.start()
@@ -118,13 +128,10 @@ def test_update_table_should_create_update_delete_gsi(fake_config):
     mock_metadata.return_value = original_metadata
     cc_dynamodb.update_table('change_in_condition', throughput={'read': 55, 'write': 44})
 
-    mock_metadata.stop()
-    mock_update_gsi.stop()
-    mock_create_gsi.stop()
-    mock_delete_gsi.stop()
-    mock_config.stop()
+    mock.patch.stopall()
 
-    mock_update_gsi.assert_called_with(global_indexes={'SavedInRDB': {'read': 15, 'write': 15}})
+    mock_update.assert_called_once_with(throughput={'read': 55, 'write': 44},
+                                        global_indexes={'SavedInRDB': {'read': 15, 'write': 15}})
     assert mock_create_gsi.called
     assert mock_create_gsi.call_args[0][0].name == 'RdbID'
     mock_delete_gsi.assert_called_with('SomeUpstreamIndex')
@@ -156,17 +163,17 @@ def test_update_table_should_update_gsi_if_no_throughput_defined(fake_config):
             'ItemCount': 0}]
     })
 
-    original_config = cc_dynamodb.get_config()
+    original_config = cc_dynamodb.get_config().toDict()
     patcher = mock.patch('cc_dynamodb.get_config')
     mock_config = patcher.start()
-    del original_config.yaml['global_indexes']['change_in_condition'][0]['throughput']
-    mock_config.return_value = original_config
+    del original_config['yaml']['global_indexes']['change_in_condition'][0]['throughput']
+    mock_config.return_value = compile_config(original_config)
 
     patcher = mock.patch('cc_dynamodb.table.Table.describe')
     mock_metadata = patcher.start()
 
-    patcher = mock.patch('cc_dynamodb.table.Table.update_global_secondary_index')
-    mock_update_gsi = patcher.start()
+    patcher = mock.patch('cc_dynamodb.table.Table.update')
+    mock_update = patcher.start()
 
     patcher = mock.patch('cc_dynamodb.table.Table.create_global_secondary_index')
     mock_create_gsi = patcher.start()
@@ -177,11 +184,64 @@ def test_update_table_should_update_gsi_if_no_throughput_defined(fake_config):
     mock_metadata.return_value = original_metadata
     cc_dynamodb.update_table('change_in_condition')
 
-    mock_metadata.stop()
-    mock_update_gsi.stop()
-    mock_create_gsi.stop()
-    mock_delete_gsi.stop()
-    mock_config.stop()
+    mock.patch.stopall()
+
+    mock_update.assert_called_once_with(throughput=None, global_indexes={'SavedInRDB': {'read': 5, 'write': 5}})
+    assert not mock_create_gsi.called
+    assert not mock_delete_gsi.called
+
+
+@mock_dynamodb2
+def test_update_table_sends_table_and_gsi_throughput_in_one_update(fake_config):
+    table = cc_dynamodb.create_table('change_in_condition')
+
+    original_metadata = table.describe()
+    original_metadata['Table'].update({
+        'GlobalSecondaryIndexes': [
+            {'IndexName': 'SavedInRDB',
+             'Projection': {'ProjectionType': 'ALL'},
+             'ProvisionedThroughput': {
+                 'WriteCapacityUnits': 10,
+                 'ReadCapacityUnits': 10,
+             },
+             'IndexStatus': 'ACTIVE',
+             'KeySchema': [
+                 {'KeyType': 'HASH', 'AttributeName': 'saved_in_rdb'},
+                 {'KeyType': 'RANGE', 'AttributeName': 'time'}]}]
+    })
+
+    with mock.patch('cc_dynamodb.table.Table.describe', return_value=original_metadata), \
+            mock.patch('cc_dynamodb.table.Table.update') as mock_update:
+        cc_dynamodb.update_table('change_in_condition', throughput={'read': 20, 'write': 20})
+        mock_update.assert_called_once_with(throughput={'read': 20, 'write': 20},
+                                            global_indexes={'SavedInRDB': {'read': 15, 'write': 15}})
+
+        mock_update.reset_mock()
+        # Unchanged table throughput is left out, DynamoDB rejects it.
+        cc_dynamodb.update_table('change_in_condition', throughput={'read': 10, 'write': 10})
+        mock_update.assert_called_once_with(throughput=None,
+                                            global_indexes={'SavedInRDB': {'read': 15, 'write': 15}})
+
+
+def test_wait_until_active_backs_off_until_active():
+    db_table = mock.Mock(table_name='dev_change_in_condition')
+    db_table.describe.side_effect = [
+        {'Table': {'TableStatus': 'UPDATING'}},
+        {'Table': {'TableStatus': 'ACTIVE', 'GlobalSecondaryIndexes': [{'IndexStatus': 'CREATING'}]}},
+        {'Table': {'TableStatus': 'ACTIVE', 'GlobalSecondaryIndexes': [{'IndexStatus': 'ACTIVE'}]}},
+    ]
+
+    with mock.patch('cc_dynamodb.time.sleep') as mock_sleep:
+        cc_dynamodb.wait_until_active(db_table)
+
+    assert [call[0][0] for call in mock_sleep.call_args_list] == [
+        cc_dynamodb.POLL_MIN_DELAY, cc_dynamodb.POLL_MIN_DELAY * 2]
+
+
+def test_wait_until_active_times_out():
+    db_table = mock.Mock(table_name='dev_change_in_condition')
+    db_table.describe.return_value = {'Table': {'TableStatus': 'UPDATING'}}
 
-    assert mock_update_gsi.called
-    mock_update_gsi.assert_called_with(global_indexes={'SavedInRDB': {'read': 5, 'write': 5}})
+    with mock.patch('cc_dynamodb.time.sleep'):
+        with pytest.raises(cc_dynamodb.UpdateTableException):
+            cc_dynamodb.wait_until_active(db_table, timeout=0)
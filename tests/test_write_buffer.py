@@ -0,0 +1,78 @@
+import gc
+import time
+import weakref
+
+import mock
+import pytest
+
+import cc_dynamodb
+from cc_dynamodb import write_buffer
+from cc_dynamodb.write_buffer import WriteBuffer, WriteBufferException
+
+
+KEY = {'agency_id': 1669, 'profile_id': 2616346}
+
+
+def _get(**key):
+    return cc_dynamodb.get_table('nps_survey').get_item(**key)
+
+
+def test_updates_to_a_key_are_merged_into_one_request(fake_config, dataset):
+    with dataset.restore():
+        with WriteBuffer('nps_survey', max_delay=60) as buffer:
+            for _ in range(10):
+                buffer.update(KEY, add={'visits': 1})
+            buffer.update(KEY, values={'recommend_score': '10'}, add={'visits': 2})
+            buffer.put({'agency_id': 1, 'profile_id': 1, 'recommend_score': '5'})
+            buffer.update({'agency_id': 1, 'profile_id': 1}, add={'visits': 1})
+            buffer.delete({'agency_id': 1669, 'profile_id': 2616347})
+            assert buffer.pending == 3
+            assert buffer.merged == 11
+
+        assert buffer.stats.requests == 2  # one BatchWriteItem, one UpdateItem
+        item = _get(**KEY)
+        assert (item['visits'], item['recommend_score'], item['comments']) == (12, '10', 'No comment')
+        assert _get(agency_id=1, profile_id=1)['visits'] == 1
+        assert cc_dynamodb.get_table('nps_survey').query_count(agency_id__eq=1669) == 1
+
+
+def test_flushes_in_the_background_after_max_delay(fake_config, dataset):
+    with dataset.restore():
+        buffer = WriteBuffer('nps_survey', max_delay=0.01)
+        buffer.update(KEY, add={'visits': 1})
+        deadline = time.time() + 5
+        while buffer.stats.items < 1 and time.time() < deadline:
+            time.sleep(0.01)
+
+        assert _get(**KEY)['visits'] == 1
+        buffer.close()
+        with pytest.raises(WriteBufferException):
+            buffer.update(KEY, add={'visits': 1})
+
+
+def test_failed_writes_are_kept_and_merged_with_newer_ones(fake_config, dataset):
+    with dataset.restore() as connection:
+        buffer = WriteBuffer('nps_survey', max_delay=60)
+        buffer.update(KEY, add={'visits': 1})
+        with mock.patch.object(connection, 'update_item', side_effect=IOError('connection reset')):
+            with pytest.raises(WriteBufferException) as exc_info:
+                buffer.flush()
+        assert list(exc_info.value.unwritten) == [(1669, 2616346)]
+
+        buffer.update(KEY, add={'visits': 2})
+        buffer.close()
+
+        assert _get(**KEY)['visits'] == 3
+
+
+def test_open_buffers_are_closed_at_exit_and_closed_ones_freed(fake_config, dataset):
+    with dataset.restore():
+        buffer = WriteBuffer('nps_survey', max_delay=60)
+        buffer.update(KEY, add={'visits': 1})
+        write_buffer._close_open_buffers()
+        assert _get(**KEY)['visits'] == 1
+
+        buffer_ref = weakref.ref(buffer)
+        del buffer
+        gc.collect()
+        assert buffer_ref() is None